@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark für die Ermittlung der Build-Umgebung.
+Vergleicht das Lesen aller hatchling-Konfigurationsdateien eines Projekts mit vielen Feature-Sets
+mit der Build-Umgebung, die die Feature-Sets erst beim Zugriff und bevorzugt aus dem Cache lädt.
+
+Aufruf: python benchmarks/bench_buildenv.py [<Anzahl Feature-Sets>] [<Wiederholungen>]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sample_project import create_sample_project
+
+from pybm import *
+from pybm.util import build_env_for, py_config_info
+
+
+PROJECT_NAME = 'benchenv'
+
+
+def eager_feature_sets(project_root: str) -> dict:
+    """
+    Liest die Konfigurationsdateien aller Feature-Sets, wie es build_env_for früher getan hat.
+    :param project_root: Root-Verzeichnis des Projekts
+    :return: Daten je Feature-Set
+    """
+    _feature_sets_path = os.path.join(project_root, 'build', 'featuresets')
+    return {_f: py_config_info(project_root, os.path.join(_feature_sets_path, _f, 'wheel', WHEEL_CFG_FILE_NAME))
+            for _f in os.listdir(_feature_sets_path)}
+
+
+def measure(func, repetitions: int) -> float:
+    """
+    :param func: zu messende Funktion ohne Parameter
+    :param repetitions: Anzahl der Wiederholungen
+    :return: kürzeste Laufzeit in Millisekunden
+    """
+    _times = []
+    for _ in range(repetitions):
+        _start = time.perf_counter()
+        func()
+        _times.append(time.perf_counter() - _start)
+    return min(_times) * 1000
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _feature_set_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    _repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as _projects_root:
+        os.environ[ENVA_PROJECTS_ROOT] = _projects_root
+        _project_root = create_sample_project(_projects_root, PROJECT_NAME, feature_sets=_feature_set_count,
+                                              modules=1, data_files=0)
+        _cache_path = os.path.join(_project_root, 'dist', CACHE_DIR_NAME)
+        _results = {'alle Feature-Sets lesen': measure(lambda: eager_feature_sets(_project_root), _repetitions),
+                    'ein Feature-Set, ohne Cache':
+                        measure(lambda: (shutil.rmtree(_cache_path, ignore_errors=True),
+                                         build_env_for(PROJECT_NAME)[PAR_FEATURE_SETS]['fs0']), _repetitions),
+                    'ein Feature-Set, mit Cache':
+                        measure(lambda: build_env_for(PROJECT_NAME)[PAR_FEATURE_SETS]['fs0'], _repetitions),
+                    'alle Feature-Sets, mit Cache':
+                        measure(lambda: dict(build_env_for(PROJECT_NAME)[PAR_FEATURE_SETS]), _repetitions)}
+    print()
+    print(f'{_feature_set_count} Feature-Sets, {_repetitions} Wiederholungen')
+    print(f'{"Variante":<30} {"Laufzeit [ms]":>14}')
+    for _name, _elapsed in _results.items():
+        print(f'{_name:<30} {_elapsed:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
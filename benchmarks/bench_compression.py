@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark für die Komprimierung der Archive in deb- und rpm-Paketen.
+Schreibt einen synthetischen data-Baum mit allen unterstützten Verfahren und Stufen als
+tar-Archiv und gibt Größe und Laufzeit je Einstellung aus.
+
+Aufruf: python benchmarks/bench_compression.py [<Anzahl Dateien>] [<Dateigröße>]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sample_project import create_data_tree
+
+from pybm import *
+from pybm.archive import compression_settings, write_tar
+
+
+SETTINGS = [
+    {CFG_ALGORITHM: COMPRESSION_NONE},
+    {CFG_ALGORITHM: COMPRESSION_GZIP, CFG_LEVEL: 1},
+    {CFG_ALGORITHM: COMPRESSION_GZIP, CFG_LEVEL: 6},
+    {CFG_ALGORITHM: COMPRESSION_GZIP, CFG_LEVEL: 9},
+    {CFG_ALGORITHM: COMPRESSION_XZ, CFG_LEVEL: 0},
+    {CFG_ALGORITHM: COMPRESSION_XZ, CFG_LEVEL: 3},
+    {CFG_ALGORITHM: COMPRESSION_XZ, CFG_LEVEL: 6},
+    {CFG_ALGORITHM: COMPRESSION_XZ, CFG_LEVEL: 9},
+    {CFG_ALGORITHM: COMPRESSION_XZ, CFG_LEVEL: 6, CFG_THREADS: 0},
+    {CFG_ALGORITHM: COMPRESSION_ZSTD, CFG_LEVEL: 3},
+    {CFG_ALGORITHM: COMPRESSION_ZSTD, CFG_LEVEL: 10},
+    {CFG_ALGORITHM: COMPRESSION_ZSTD, CFG_LEVEL: 19},
+    {CFG_ALGORITHM: COMPRESSION_ZSTD, CFG_LEVEL: 19, CFG_THREADS: 0},
+]
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    _file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16384
+    with tempfile.TemporaryDirectory() as _temp_path:
+        _data_path = os.path.join(_temp_path, 'data')
+        create_data_tree(_data_path, _files, _file_size, 0.5)
+        with open(os.path.join(_data_path, 'random.bin'), 'wb') as _f:
+            _f.write(os.urandom(_files * _file_size // 10))
+        print(f'{"Verfahren":<10} {"Stufe":>5} {"Threads":>7} {"Größe [KiB]":>12} {"Zeit [s]":>9}')
+        for _settings in SETTINGS:
+            _compression = compression_settings(_settings)
+            _archive_path = os.path.join(_temp_path, 'data.tar')
+            try:
+                _start = time.perf_counter()
+                with open(_archive_path, 'wb') as _f:
+                    write_tar(_f, _data_path, _compression)
+                _elapsed = time.perf_counter() - _start
+            except RuntimeError as _e:
+                print(f'{_compression[CFG_ALGORITHM]:<10} {_compression[CFG_LEVEL]:>5} '
+                      f'{_compression[CFG_THREADS]:>7} nicht verfügbar: {_e}')
+                continue
+            _size = os.path.getsize(_archive_path) // 1024
+            print(f'{_compression[CFG_ALGORITHM]:<10} {_compression[CFG_LEVEL]:>5} '
+                  f'{_compression[CFG_THREADS]:>7} {_size:>12} {_elapsed:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark für die Startzeit von pybm.
+Ruft die Kommandozeile für ein synthetisches Projekt wiederholt als eigenen Prozess auf, einmal ohne
+und einmal mit laufendem Build-Server, und vergleicht die Laufzeiten. Die Pakete sind nach dem ersten
+Aufruf aktuell, gemessen wird also vor allem Start, Build-Umgebung und Prüfung des Manifests.
+
+Aufruf: python benchmarks/bench_startup.py [<Anzahl Feature-Sets>] [<Aufrufe>]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from sample_project import create_sample_project
+
+from pybm import *
+
+
+PROJECT_NAME = 'benchstartup'
+
+
+def run_cli(args: list[str]) -> float:
+    """
+    Ruft die Kommandozeile von pybm als eigenen Prozess auf.
+    :param args: Argumente der Kommandozeile ohne Programmname
+    :return: Laufzeit in Sekunden
+    :raises RuntimeError: falls der Aufruf fehlschlägt
+    """
+    _start = time.perf_counter()
+    _res = subprocess.run([sys.executable, '-m', 'pybm.cli'] + args, capture_output=True, encoding='utf-8')
+    _elapsed = time.perf_counter() - _start
+    if _res.returncode != 0:
+        raise RuntimeError(f'Aufruf pybm {" ".join(args)} fehlgeschlagen: {_res.stdout}{_res.stderr}')
+    return _elapsed
+
+
+def measure(args: list[str], invocations: int) -> list[float]:
+    """
+    :param args: Argumente der Kommandozeile ohne Programmname
+    :param invocations: Anzahl der Aufrufe
+    :return: Laufzeiten der Aufrufe in Sekunden
+    """
+    return [run_cli(args) for _ in range(invocations)]
+
+
+def start_server(socket_path: str) -> subprocess.Popen:
+    """
+    Startet den Build-Server und wartet, bis er Aufrufe annimmt.
+    :param socket_path: Name und Pfad des Unix-Sockets
+    :return: Prozess des Build-Servers
+    :raises RuntimeError: falls der Build-Server nicht startet
+    """
+    _process = subprocess.Popen([sys.executable, '-m', 'pybm.cli', COMMAND_SERVE], stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            return _process
+        time.sleep(0.05)
+    _process.terminate()
+    raise RuntimeError('Build-Server nicht gestartet')
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _feature_set_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    _invocations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    _commands = [[BUILD_TYPE_DEB, PROJECT_NAME, FEATURE_SET_ALL], [BUILD_TYPE_CUSTOM, PROJECT_NAME]]
+    _results = {}
+    with tempfile.TemporaryDirectory() as _projects_root:
+        _socket_path = os.path.join(_projects_root, 'pybm.sock')
+        os.environ[ENVA_PROJECTS_ROOT] = _projects_root
+        os.environ[ENVA_SERVER_SOCKET] = _socket_path
+        create_sample_project(_projects_root, PROJECT_NAME, feature_sets=_feature_set_count)
+        for _args in _commands:
+            # erster Aufruf baut die Pakete, danach sind sie aktuell
+            run_cli(_args)
+            _cold = measure(_args, _invocations)
+            _server = start_server(_socket_path)
+            try:
+                _warm = measure(_args, _invocations)
+            finally:
+                _server.terminate()
+                _server.wait()
+            _results[' '.join(_args[:1])] = (_cold, _warm)
+    print()
+    print(f'{_feature_set_count} Feature-Sets, {_invocations} Aufrufe')
+    print(f'{"Aufruf":<14} {"ohne Server [ms]":>18} {"mit Server [ms]":>17} {"Faktor":>8}')
+    for _name, (_cold, _warm) in _results.items():
+        _cold_ms = statistics.median(_cold) * 1000
+        _warm_ms = statistics.median(_warm) * 1000
+        print(f'{_name:<14} {_cold_ms:>18.1f} {_warm_ms:>17.1f} {_cold_ms / _warm_ms:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
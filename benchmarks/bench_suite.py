@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark-Suite für die Builder von pybm.
+Erzeugt synthetische Projekte unter einem temporären PYBM_PROJECTS_ROOT, die sich in Anzahl der
+Feature-Sets, Anzahl und Größe der Dateien im data-Baum und Anteil der Dateien mit Variablen
+unterscheiden, und baut sie mit build_wheel, build_deb, build_rpm, build_custom und build_sign.
+Externe Werkzeuge (gpg, rpmbuild) werden verwendet, falls sie installiert und nutzbar sind, sonst
+durch Platzhalter ersetzt, die ihre Aufrufe protokollieren. Je Build werden Laufzeit und die
+Summen der Phasen aus --trace (z.B. staging, archive, hash) festgehalten.
+
+Die Ergebnisse können als JSON-Baseline gespeichert und mit einer früheren Baseline verglichen
+werden, z.B. vor und nach Änderungen an util.copy_customizable_file_tree:
+
+    python benchmarks/bench_suite.py --baseline vorher.json
+    python benchmarks/bench_suite.py --compare vorher.json [--threshold 10]
+
+Aufruf: python benchmarks/bench_suite.py [--scenarios <Name>,...] [--repetitions <Anzahl>]
+                                         [--baseline <Datei>] [--compare <Datei>] [--threshold <Prozent>]
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from sample_project import create_sample_project
+
+from pybm import *
+from pybm.context import BuildContext
+from pybm.trace import trace_run
+
+
+# Szenarien mit den Parametern für create_sample_project
+SCENARIOS = {
+    'basis': {'feature_sets': 2, 'data_files': 100, 'data_file_size': 4096, 'placeholder_density': 0.5},
+    'viele-dateien': {'feature_sets': 2, 'data_files': 2000, 'data_file_size': 1024, 'placeholder_density': 0.5},
+    'grosse-dateien': {'feature_sets': 1, 'data_files': 20, 'data_file_size': 2 * 1024 * 1024,
+                       'placeholder_density': 0.1},
+    'feature-sets': {'feature_sets': 8, 'data_files': 50, 'data_file_size': 4096, 'placeholder_density': 0.5},
+    'platzhalter': {'feature_sets': 2, 'data_files': 500, 'data_file_size': 8192, 'placeholder_density': 1.0},
+    'ohne-platzhalter': {'feature_sets': 2, 'data_files': 500, 'data_file_size': 8192, 'placeholder_density': 0.0},
+}
+
+# Builds je Szenario, build_rpm zusätzlich mit rpmbuild
+BUILDS = (('build_wheel', RPM_BACKEND_NATIVE), ('build_deb', RPM_BACKEND_NATIVE), ('build_rpm', RPM_BACKEND_NATIVE),
+          ('build_rpm', RPM_BACKEND_RPMBUILD), ('build_custom', RPM_BACKEND_NATIVE),
+          ('build_sign', RPM_BACKEND_NATIVE))
+
+# Platzhalter für externe Werkzeuge, sie protokollieren ihre Aufrufe in $PYBM_BENCH_CALLS
+STAND_INS = {
+    'gpg': '''#!/bin/sh
+echo "gpg $*" >> "$PYBM_BENCH_CALLS"
+while [ $# -gt 0 ]; do
+    if [ "$1" = "--output" ]; then shift; printf -- '-----BEGIN PGP SIGNATURE-----\\nPlatzhalter\\n-----END PGP SIGNATURE-----\\n' > "$1"; fi
+    shift
+done
+''',
+    'rpmbuild': '''#!/bin/sh
+echo "rpmbuild $*" >> "$PYBM_BENCH_CALLS"
+top=$(echo "$*" | sed -n 's/.*_topdir \\([^ ]*\\) .*/\\1/p')
+spec=$(basename "$(eval echo \\${$#})" .spec)
+mkdir -p "$top/RPMS/noarch" && cat "$top"/SOURCES/* > "$top/RPMS/noarch/$spec-1.noarch.rpm"
+''',
+}
+
+ENVA_BENCH_CALLS = 'PYBM_BENCH_CALLS'
+
+
+def tool_usable(tool: str) -> bool:
+    """
+    :param tool: Name des Werkzeugs
+    :return: True, falls das Werkzeug installiert ist und für die Benchmarks verwendet werden kann
+    """
+    if shutil.which(tool) is None:
+        return False
+    if tool == 'gpg':
+        # ohne geheimen Schlüssel kann gpg nicht signieren
+        _result = subprocess.run(['gpg', '--batch', '--list-secret-keys', '--with-colons'],
+                                 capture_output=True, text=True)
+        return _result.returncode == 0 and 'sec:' in _result.stdout
+    return True
+
+
+def install_stand_ins(bin_path: str) -> dict[str, str]:
+    """
+    Legt Platzhalter für alle nicht nutzbaren Werkzeuge an und stellt bin_path im PATH voran.
+    :param bin_path: Verzeichnis für die Platzhalter
+    :return: Pfad des Werkzeugs oder 'Platzhalter' je Werkzeug
+    """
+    _tools = {}
+    for _tool, _script in STAND_INS.items():
+        if tool_usable(_tool):
+            _tools[_tool] = shutil.which(_tool)
+            continue
+        _script_path = os.path.join(bin_path, _tool)
+        with open(_script_path, 'w') as _f:
+            _f.write(_script)
+        os.chmod(_script_path, 0o755)
+        _tools[_tool] = 'Platzhalter'
+    for _tool in ('xz', 'zstd'):
+        _tools[_tool] = shutil.which(_tool) or 'nicht installiert, Python-Modul'
+    os.environ['PATH'] = bin_path + os.pathsep + os.environ.get('PATH', '')
+    return _tools
+
+
+def run_build(project: str, build_type: str, rpm_backend: str, repetitions: int) -> dict:
+    """
+    Führt einen Build mehrfach aus, jeweils mit --force und Aufzeichnung der Phasen.
+    :param project: Name des Projekts
+    :param build_type: Build-Typ
+    :param rpm_backend: Backend für rpm-Pakete
+    :param repetitions: Anzahl der Wiederholungen
+    :return: kürzeste und mittlere Laufzeit in Sekunden, Summen der Phasen des schnellsten Laufs in ms
+    """
+    os.environ[ENVA_RPM_BACKEND] = rpm_backend
+    _context = BuildContext(project, force=True)
+    _feature_set = None if build_type in (BUILD_TYPE_CUSTOM, BUILD_TYPE_SIGN) else FEATURE_SET_ALL
+    _times = []
+    _best_phases = None
+    with tempfile.TemporaryDirectory() as _trace_path:
+        _trace_file_path = os.path.join(_trace_path, 'trace.json')
+        for _ in range(repetitions):
+            _output = io.StringIO()
+            _start = time.perf_counter()
+            with contextlib.redirect_stdout(_output), trace_run(_trace_file_path, [build_type, project]):
+                _context.build(build_type, _feature_set)
+            _elapsed = time.perf_counter() - _start
+            with open(_trace_file_path, 'r') as _f:
+                _summary = json.load(_f)['otherData']['summary']
+            if len(_times) == 0 or _elapsed < min(_times):
+                _best_phases = {_cat: _totals['wall_ms'] for _cat, _totals in sorted(_summary.items())
+                                if _cat not in ('run', 'build', 'env')}
+            _times.append(_elapsed)
+    return {'min_s': round(min(_times), 4), 'median_s': round(statistics.median(_times), 4),
+            'phases_ms': _best_phases}
+
+
+def run_suite(scenarios: list[str], repetitions: int) -> dict:
+    """
+    Erzeugt die Projekte der Szenarien und führt alle Builds aus.
+    :param scenarios: Namen der Szenarien
+    :param repetitions: Anzahl der Wiederholungen je Build
+    :return: Ergebnisse mit Angaben zur Umgebung
+    """
+    _results = {}
+    with tempfile.TemporaryDirectory(prefix='pybm-bench-') as _root:
+        _projects_root = os.path.join(_root, 'projects')
+        _bin_path = os.path.join(_root, 'bin')
+        os.makedirs(_projects_root)
+        os.makedirs(_bin_path)
+        os.environ[ENVA_PROJECTS_ROOT] = _projects_root
+        os.environ[ENVA_BENCH_CALLS] = os.path.join(_root, 'calls.log')
+        _tools = install_stand_ins(_bin_path)
+        for _scenario in scenarios:
+            _project = f'bench_{_scenario.replace("-", "_")}'
+            _start = time.perf_counter()
+            create_sample_project(_projects_root, _project, **SCENARIOS[_scenario])
+            print(f'Szenario {_scenario}: Projekt in {time.perf_counter() - _start:.1f}s erzeugt')
+            _builds = {}
+            for _build_type, _rpm_backend in BUILDS:
+                _name = _build_type if _rpm_backend == RPM_BACKEND_NATIVE else f'{_build_type}:{_rpm_backend}'
+                _builds[_name] = run_build(_project, _build_type, _rpm_backend, repetitions)
+                print(f'  {_name:<22} {_builds[_name]["min_s"]:>8.3f}s')
+            _results[_scenario] = {'params': SCENARIOS[_scenario], 'builds': _builds}
+        _stand_in_calls = 0
+        if os.path.isfile(os.environ[ENVA_BENCH_CALLS]):
+            with open(os.environ[ENVA_BENCH_CALLS], 'r') as _f:
+                _stand_in_calls = sum(1 for _ in _f)
+    return {'pybm': VERSION, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'repetitions': repetitions, 'tools': _tools, 'stand_in_calls': _stand_in_calls, 'scenarios': _results}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """
+    Vergleicht die Ergebnisse mit einer Baseline und zeigt die Änderungen je Build und Phase an.
+    :param baseline: Ergebnisse der Baseline
+    :param current: aktuelle Ergebnisse
+    :param threshold: Verschlechterung in Prozent, ab der ein Build als langsamer gilt
+    :return: Anzahl der langsameren Builds
+    """
+    print()
+    print(f'{"Szenario":<18} {"Build":<22} {"Baseline [s]":>12} {"aktuell [s]":>12} {"Änderung":>9}')
+    _slower = 0
+    for _scenario, _data in current['scenarios'].items():
+        _base_builds = baseline.get('scenarios', {}).get(_scenario, {}).get('builds', {})
+        for _name, _result in _data['builds'].items():
+            _base = _base_builds.get(_name)
+            if _base is None:
+                continue
+            _change = _percent(_base['min_s'], _result['min_s'])
+            _mark = ''
+            if _change > threshold:
+                _slower += 1
+                _mark = ' langsamer'
+            print(f'{_scenario:<18} {_name:<22} {_base["min_s"]:>12.3f} {_result["min_s"]:>12.3f} '
+                  f'{_change:>+8.1f}%{_mark}')
+            for _phase, _ms in _result['phases_ms'].items():
+                _base_ms = _base['phases_ms'].get(_phase)
+                if _base_ms is not None and _base_ms >= 1:
+                    print(f'{"":<18} {"  " + _phase:<22} {_base_ms / 1000:>12.3f} {_ms / 1000:>12.3f} '
+                          f'{_percent(_base_ms, _ms):>+8.1f}%')
+    if baseline.get('tools') != current['tools']:
+        print('Hinweis: Baseline wurde mit anderen Werkzeugen erstellt')
+    return _slower
+
+
+def _percent(base: float, value: float) -> float:
+    """
+    :param base: Wert der Baseline
+    :param value: aktueller Wert
+    :return: Änderung in Prozent
+    """
+    return 0.0 if base <= 0 else (value - base) / base * 100
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _parser = argparse.ArgumentParser(description='Benchmark-Suite für die Builder von pybm')
+    _parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                         help=f'Szenarien, durch Kommas getrennt, möglich sind {", ".join(SCENARIOS)}')
+    _parser.add_argument('--repetitions', type=int, default=3, help='Wiederholungen je Build')
+    _parser.add_argument('--baseline', help='Ergebnisse als JSON-Baseline in diese Datei schreiben')
+    _parser.add_argument('--compare', help='Ergebnisse mit der JSON-Baseline in dieser Datei vergleichen')
+    _parser.add_argument('--threshold', type=float, default=10.0,
+                         help='Verschlechterung in Prozent, ab der --compare mit Exit-Code 1 endet')
+    _args = _parser.parse_args()
+    _scenarios = [_s.strip() for _s in _args.scenarios.split(',') if len(_s.strip()) > 0]
+    for _scenario in _scenarios:
+        if _scenario not in SCENARIOS:
+            _parser.error(f'unbekanntes Szenario {_scenario}')
+    _baseline = None
+    if _args.compare is not None:
+        with open(_args.compare, 'r') as _f:
+            _baseline = json.load(_f)
+    _results = run_suite(_scenarios, _args.repetitions)
+    print(f'Werkzeuge: {", ".join(f"{_t} {_p}" for _t, _p in _results["tools"].items())}')
+    if _args.baseline is not None:
+        with open(_args.baseline, 'w') as _f:
+            json.dump(_results, _f, indent=1)
+        print(f'Baseline in {_args.baseline} geschrieben')
+    if _baseline is not None and compare(_baseline, _results, _args.threshold) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark für das Kopieren von Verzeichnisbäumen mit Variablen-Ersetzung.
+Vergleicht copy_customizable_file_tree mit dem früheren Verfahren, das jede Datei als Text liest,
+je Variable str.replace aufruft und Binärdateien erst am UnicodeDecodeError erkennt.
+
+Jede Variante wird mehrfach im Wechsel ausgeführt, ausgegeben wird die kürzeste Laufzeit.
+Die Laufzeit wird stark vom Anlegen der Dateien bestimmt; mit TMPDIR=/dev/shm sind die
+Ergebnisse deutlich stabiler. Mehrere Threads lohnen sich vor allem bei Projektverzeichnissen
+auf Netzlaufwerken, das Verzeichnis kann dafür mit TMPDIR gewählt werden.
+
+Aufruf: python benchmarks/bench_templates.py [<Anzahl Dateien>] [<Dateigröße>] [<Wiederholungen>]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sample_project import create_data_tree
+
+from pybm.util import copy_customizable_file_tree
+
+
+REPLACEMENTS = {'${VERSION}': '1.2.3', '${PACKAGE_NAME}': 'sample', '${INSTALL_PATH}': '/opt/sample',
+                '${WHEEL_FILE_NAME}': 'sample-1.2.3-py3-none-any.whl'}
+
+
+def legacy_copy_tree(source_path: str, target_path: str, replacements: dict):
+    """
+    Früheres Verfahren zum Kopieren eines Verzeichnisbaums mit Variablen-Ersetzung.
+    :param source_path: Quellverzeichnis
+    :param target_path: Zielverzeichnis
+    :param replacements: Daten für die Variablen-Ersetzungen
+    """
+    for _dir, _sub_dirs, _files in os.walk(source_path):
+        _target_dir = os.path.join(target_path, _dir[len(source_path):].lstrip(os.sep))
+        os.makedirs(_target_dir, mode=0o755, exist_ok=True)
+        for _file_name in _files:
+            _source_fn = os.path.join(_dir, _file_name)
+            _target_fn = os.path.join(_target_dir, _file_name)
+            try:
+                with open(_source_fn, 'r') as _f:
+                    _contents = _f.read()
+            except UnicodeDecodeError:
+                shutil.copy2(_source_fn, _target_fn)
+                continue
+            for _var, _value in replacements.items():
+                _contents = _contents.replace(_var, _value)
+            with open(_target_fn, 'w') as _f:
+                _f.write(_contents)
+            os.chmod(_target_fn, os.stat(_source_fn).st_mode)
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _files = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    _file_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16384
+    _rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    with tempfile.TemporaryDirectory() as _temp_path:
+        _data_path = os.path.join(_temp_path, 'data')
+        create_data_tree(_data_path, _files, _file_size, 0.5)
+        _variants = [('bisher', lambda _t: legacy_copy_tree(_data_path, _t, REPLACEMENTS)),
+                     ('neu', lambda _t: copy_customizable_file_tree(_data_path, _t, REPLACEMENTS)),
+                     ('neu, *.bin ausgenommen',
+                      lambda _t: copy_customizable_file_tree(_data_path, _t, REPLACEMENTS,
+                                                             {'include': [], 'exclude': ['*.bin']})),
+                     ('neu, 8 Threads',
+                      lambda _t: copy_customizable_file_tree(_data_path, _t, REPLACEMENTS, None, 8))]
+        _times = {_name: [] for _name, _copy in _variants}
+        for _round in range(_rounds):
+            for _name, _copy in _variants:
+                _target_path = os.path.join(_temp_path, 'target')
+                _start = time.perf_counter()
+                _copy(_target_path)
+                _times[_name].append(time.perf_counter() - _start)
+                shutil.rmtree(_target_path)
+        print(f'{_files} Dateien mit je ca. {_file_size} Bytes, {_rounds} Wiederholungen')
+        print(f'{"Verfahren":<24} {"Zeit [s]":>9}')
+        for _name, _elapsed in _times.items():
+            print(f'{_name:<24} {min(_elapsed):>9.3f}')
+
+if __name__ == '__main__':
+    main()
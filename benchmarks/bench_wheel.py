@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Benchmark für die Backends zum Erzeugen von Python wheels.
+Baut die wheels aller Feature-Sets eines synthetischen Projekts mit der Kommandozeile von
+hatchling und mit dem Builder im laufenden Prozess und vergleicht Laufzeiten und Ergebnisse.
+
+Aufruf: python benchmarks/bench_wheel.py [<Anzahl Feature-Sets>] [<Wiederholungen>]
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sample_project import create_sample_project
+
+from pybm import *
+from pybm.util import build_env_for
+from pybm.wheel import provide_wheel
+
+
+PROJECT_NAME = 'benchwheel'
+
+
+def run_backend(backend: str, feature_sets: list[str], repetitions: int) -> tuple[float, dict]:
+    """
+    Baut die wheels aller Feature-Sets mit dem angegebenen Backend.
+    :param backend: Backend
+    :param feature_sets: Namen der Feature-Sets
+    :param repetitions: Anzahl der Wiederholungen
+    :return: mittlere Laufzeit für alle Feature-Sets in Sekunden, SHA256-Hashes der wheels
+    """
+    os.environ[ENVA_WHEEL_BACKEND] = backend
+    _build_env = build_env_for(PROJECT_NAME)
+    _cache_path = os.path.join(_build_env[PAR_PROJECT_ROOT], 'dist', CACHE_DIR_NAME)
+    _hashes = {}
+    _elapsed = 0.0
+    with tempfile.TemporaryDirectory() as _target_path:
+        for _ in range(repetitions):
+            shutil.rmtree(_cache_path, ignore_errors=True)
+            _start = time.perf_counter()
+            for _fs in feature_sets:
+                provide_wheel(_build_env, PROJECT_NAME, _fs, _target_path)
+            _elapsed += time.perf_counter() - _start
+        for _fs in feature_sets:
+            _wheel_path = provide_wheel(_build_env, PROJECT_NAME, _fs, _target_path)
+            with open(_wheel_path, 'rb') as _f:
+                _hashes[_fs] = hashlib.file_digest(_f, 'sha256').hexdigest()
+    return _elapsed / repetitions, _hashes
+
+
+def main():
+    """
+    Hauptprogramm.
+    """
+    _feature_set_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    _repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as _projects_root:
+        os.environ[ENVA_PROJECTS_ROOT] = _projects_root
+        create_sample_project(_projects_root, PROJECT_NAME, feature_sets=_feature_set_count,
+                              data_files=0)
+        _feature_sets = sorted(build_env_for(PROJECT_NAME)[PAR_FEATURE_SETS])
+        _results = {}
+        for _backend in (WHEEL_BACKEND_CLI, WHEEL_BACKEND_NATIVE):
+            _results[_backend] = run_backend(_backend, _feature_sets, _repetitions)
+    print()
+    print(f'{len(_feature_sets)} Feature-Sets, {_repetitions} Wiederholungen')
+    print(f'{"Backend":<10} {"gesamt [s]":>12} {"je wheel [s]":>14}')
+    for _backend, (_elapsed, _hashes) in _results.items():
+        print(f'{_backend:<10} {_elapsed:>12.3f} {_elapsed / len(_feature_sets):>14.3f}')
+    _cli_hashes = _results[WHEEL_BACKEND_CLI][1]
+    _native_hashes = _results[WHEEL_BACKEND_NATIVE][1]
+    print('wheels identisch' if _cli_hashes == _native_hashes else 'wheels unterschiedlich')
+
+
+if __name__ == '__main__':
+    main()
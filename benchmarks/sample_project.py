@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Erzeugt synthetische Projekte für die Benchmarks von pybm.
+"""
+
+import os
+
+
+SPEC_TEMPLATE = '''Name: ${PACKAGE_NAME}
+Version: ${VERSION}
+Release: 1
+Summary: Synthetisches Projekt
+License: MIT
+BuildArch: noarch
+Source0: ${PACKAGE_NAME}-${VERSION}.tar.gz
+
+%description
+Synthetisches Projekt für die Benchmarks von pybm.
+
+%prep
+%setup -q
+
+%install
+mkdir -p $RPM_BUILD_ROOT
+cp -r * $RPM_BUILD_ROOT
+
+%files
+${INSTALL_PATH}
+/usr/share/${PACKAGE_NAME}
+'''
+
+
+def create_sample_project(projects_root: str, project: str, feature_sets: int = 2, modules: int = 20,
+                          data_files: int = 20, data_file_size: int = 4096,
+                          placeholder_density: float = 0.5) -> str:
+    """
+    Erzeugt ein synthetisches Projekt mit Feature-Sets unter projects_root.
+    :param projects_root: Root-Verzeichnis für Projekte
+    :param project: Name des Projekts
+    :param feature_sets: Anzahl der Feature-Sets
+    :param modules: Anzahl der Python-Module unter src
+    :param data_files: Anzahl der Dateien im data-Baum je Feature-Set und Ziel
+    :param data_file_size: ungefähre Größe einer Datei im data-Baum in Bytes
+    :param placeholder_density: Anteil der Textdateien mit Variablen, die ersetzt werden
+    :return: Root-Verzeichnis des Projekts
+    """
+    _project_root = os.path.join(projects_root, project)
+    _package_path = os.path.join(_project_root, 'src', project)
+    os.makedirs(_package_path, exist_ok=True)
+    os.makedirs(os.path.join(_project_root, 'dist'), exist_ok=True)
+    _write(os.path.join(_project_root, 'README.md'), f'# {project}\n')
+    _write(os.path.join(_package_path, '__init__.py'), "VERSION = '1.0.0'\n")
+    for _i in range(modules):
+        _write(os.path.join(_package_path, f'module{_i}.py'),
+               ''.join(f'def func{_j}():\n    return {_j}\n\n' for _j in range(50)))
+    for _i in range(feature_sets):
+        _fs_name = f'fs{_i}'
+        _package_name = f'{project}_{_fs_name}'
+        _fs_path = os.path.join(_project_root, 'build', 'featuresets', _fs_name)
+        _write(os.path.join(_fs_path, 'wheel', 'pyproject.toml'),
+               f'[project]\nname = "{_package_name}"\ndynamic = ["version"]\n'
+               f'readme = "README.md"\nrequires-python = ">=3.10"\n\n'
+               f'[build-system]\nrequires = ["hatchling"]\nbuild-backend = "hatchling.build"\n\n'
+               f'[tool.hatch.build.targets.wheel]\npackages = ["src/{project}"]\n\n'
+               f'[tool.hatch.version]\npath = "src/{project}/__init__.py"\n')
+        _write(os.path.join(_fs_path, 'deb', 'debian-binary'), '2.0\n')
+        _write(os.path.join(_fs_path, 'deb', 'control', 'control'),
+               f'Package: {project}-{_fs_name}\nVersion: ${{VERSION}}\nArchitecture: all\n'
+               f'Maintainer: pybm <pybm@localhost>\nDescription: ${{PACKAGE_NAME}}\n')
+        _write(os.path.join(_fs_path, 'rpm', 'SPECS', f'{_package_name}.spec'), SPEC_TEMPLATE)
+        _write(os.path.join(_fs_path, 'custom', f'README-{_fs_name}.txt'), f'{_package_name}\n')
+        _write(os.path.join(_fs_path, 'nsis', f'{_package_name}.nsi'),
+               f'Name "{_package_name}"\nOutFile {_package_name}-${{VERSION}}.exe\n')
+        for _target, _sub_dir in (('deb', 'data'), ('rpm', 'SOURCES')):
+            _data_path = os.path.join(_fs_path, _target, _sub_dir, 'usr', 'share', _package_name)
+            create_data_tree(_data_path, data_files, data_file_size, placeholder_density)
+    return _project_root
+
+
+def create_data_tree(target_path: str, files: int, file_size: int, placeholder_density: float,
+                     files_per_dir: int = 100):
+    """
+    Erzeugt einen Verzeichnisbaum mit Text- und Binärdateien.
+    Jede zehnte Datei ist eine Binärdatei, von den Textdateien enthält der durch
+    placeholder_density bestimmte Anteil Variablen.
+    :param target_path: Zielverzeichnis
+    :param files: Anzahl der Dateien
+    :param file_size: ungefähre Größe einer Datei in Bytes
+    :param placeholder_density: Anteil der Textdateien mit Variablen
+    :param files_per_dir: Anzahl der Dateien je Unterverzeichnis
+    """
+    _line = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n'
+    _var_line = 'Version ${VERSION} von ${PACKAGE_NAME} liegt in ${INSTALL_PATH}.\n'
+    _lines = max(1, file_size // len(_line))
+    _var_every = int(1 / placeholder_density) if placeholder_density > 0 else 0
+    for _i in range(files):
+        _dir_path = os.path.join(target_path, f'dir{_i // files_per_dir}')
+        os.makedirs(_dir_path, exist_ok=True)
+        if _i % 10 == 9:
+            with open(os.path.join(_dir_path, f'file{_i}.bin'), 'wb') as _f:
+                _f.write(bytes(_j % 251 for _j in range(file_size)))
+            continue
+        _contents = _line * _lines
+        if _var_every > 0 and _i % _var_every == 0:
+            _contents = _var_line + _contents + _var_line
+        _write(os.path.join(_dir_path, f'file{_i}.txt'), _contents)
+
+
+def _write(file_path: str, contents: str):
+    """
+    Schreibt eine Textdatei und legt fehlende Verzeichnisse an.
+    :param file_path: Name und Pfad der Datei
+    :param contents: Inhalt der Datei
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as _f:
+        _f.write(contents)
@@ -43,20 +43,100 @@ BUILD_TYPE_NSIS = 'build_nsis'
 BUILD_TYPE_SIGN = 'build_sign'
 BUILD_TYPE_CUSTOM = 'build_custom'
 
+# Befehle der Kommandozeile, die keine Build-Typen sind
+COMMAND_BATCH = 'batch'
+COMMAND_DELTA = 'delta'
+COMMAND_GC = 'gc'
+COMMAND_RELEASE = 'release'
+COMMAND_SERVE = 'serve'
+COMMAND_WATCH = 'watch'
+
 # Build-Parameter
+PAR_COMPRESSION = 'compression'
+PAR_DELTA = 'delta'
 PAR_FEATURE_SETS = 'feature-sets'
+PAR_FORCE_BUILD = 'force-build'
 PAR_PACKAGE_NAME = 'package-name'
 PAR_PROJECT_ROOT = 'project-root'
 PAR_PROJECT_VERSION = 'project-version'
+PAR_PYBM_CONFIG = 'pybm-config'
+PAR_REPRODUCIBLE = 'reproducible'
+PAR_RPM_BACKEND = 'rpm-backend'
+PAR_SOURCE_FILES = 'source-files'
+PAR_STAGING_CACHE = 'staging-cache'
+PAR_STAGING_THREADS = 'staging-threads'
+PAR_TEMPLATES = 'templates'
 PAR_TESTING_ROOT = 'testing-root'
 PAR_VENV_PATH = 'venv-path'
+PAR_WHEEL_BACKEND = 'wheel-backend'
+
+# Optionen der Kommandozeile
+OPT_FORCE = 'force'
+OPT_JOBS = 'jobs'
+OPT_MAX_AGE = 'max-age'
+OPT_MAX_SIZE = 'max-size'
+OPT_TARGETS = 'targets'
+OPT_TRACE = 'trace'
 
 # Umgebungsvariablen
+ENVA_CMD_TIMEOUT = 'PYBM_CMD_TIMEOUT'
 ENVA_NSIS_PATH = 'PYBM_NSIS_PATH'
 ENVA_PROJECTS_ROOT = 'PYBM_PROJECTS_ROOT'
+ENVA_RPM_BACKEND = 'PYBM_RPM_BACKEND'
+ENVA_SERVER_SOCKET = 'PYBM_SERVER_SOCKET'
+ENVA_SOURCE_DATE_EPOCH = 'SOURCE_DATE_EPOCH'
+ENVA_STORE_PATH = 'PYBM_STORE_PATH'
 ENVA_TESTING_ROOT = 'PYBM_TESTING_ROOT'
+ENVA_TRACE_DIR = 'PYBM_TRACE_DIR'
 ENVA_VENV_PATH = 'PYBM_VENV_PATH'
+ENVA_WHEEL_BACKEND = 'PYBM_WHEEL_BACKEND'
+
+# Ziele, z.B. für eigene Einstellungen in der pybm-Konfigurationsdatei
+TARGET_CUSTOM = 'custom'
+TARGET_DEB = 'deb'
+TARGET_NSIS = 'nsis'
+TARGET_RPM = 'rpm'
+TARGET_SIGN = 'sign'
+TARGET_WHEEL = 'wheel'
+
+# Einstellungen in der pybm-Konfigurationsdatei
+CFG_ALGORITHM = 'algorithm'
+CFG_ARTIFACTS = 'artifacts'
+CFG_ARCHIVE = 'archive'
+CFG_COMPRESSION = 'compression'
+CFG_DELTA = 'delta'
+CFG_DIGESTS = 'digests'
+CFG_EXCLUDE = 'exclude'
+CFG_INCLUDE = 'include'
+CFG_JOBS = 'jobs'
+CFG_LEVEL = 'level'
+CFG_REPRODUCIBLE = 'reproducible'
+CFG_STAGING = 'staging'
+CFG_TARGETS = 'targets'
+CFG_TEMPLATES = 'templates'
+CFG_THREADS = 'threads'
+
+# Komprimierungsverfahren
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_NONE = 'none'
+COMPRESSION_XZ = 'xz'
+COMPRESSION_ZSTD = 'zstd'
 
 # Diverses
+CACHE_DIR_NAME = '.pybm-cache'
 FEATURE_SET_ALL = 'all'
+PYBM_CFG_FILE_NAME = 'pybm.toml'
 WHEEL_CFG_FILE_NAME = 'pyproject.toml'
+
+# Build-Host und Zeitstempel für reproduzierbare Builds, der Zeitstempel gilt nur ohne SOURCE_DATE_EPOCH
+# (1980-01-01, frühester in ZIP-Archiven darstellbarer Zeitstempel)
+REPRODUCIBLE_BUILD_HOST = 'localhost'
+REPRODUCIBLE_TIMESTAMP = 315532800
+
+# Backends zum Erzeugen von Python wheels
+WHEEL_BACKEND_CLI = 'cli'
+WHEEL_BACKEND_NATIVE = 'native'
+
+# Backends zum Erzeugen von rpm-Paketen
+RPM_BACKEND_NATIVE = 'native'
+RPM_BACKEND_RPMBUILD = 'rpmbuild'
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Erzeugt komprimierte tar-Archive für die Installationspakete und ZIP-Archive.
+Unterstützt werden die Komprimierungsverfahren xz, zstd, gzip und none. xz und zstd können
+mit mehreren Threads arbeiten, dafür werden die Kommandozeilen-Programme xz bzw. zstd verwendet,
+falls sie installiert sind.
+"""
+
+import collections
+import gzip
+import io
+import lzma
+import os
+import shutil
+import stat
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from pybm import *
+from pybm.trace import count_subprocess, traced
+
+
+# Dateiendungen für die Komprimierungsverfahren
+COMPRESSION_SUFFIXES = {COMPRESSION_GZIP: '.gz', COMPRESSION_NONE: '', COMPRESSION_XZ: '.xz',
+                        COMPRESSION_ZSTD: '.zst'}
+
+# Gültige Stufen für die Komprimierungsverfahren
+COMPRESSION_LEVELS = {COMPRESSION_GZIP: range(1, 10), COMPRESSION_NONE: range(0, 1),
+                      COMPRESSION_XZ: range(0, 10), COMPRESSION_ZSTD: range(1, 23)}
+
+# Default-Stufen für die Komprimierungsverfahren
+DEFAULT_COMPRESSION_LEVELS = {COMPRESSION_GZIP: 6, COMPRESSION_NONE: 0, COMPRESSION_XZ: 6,
+                              COMPRESSION_ZSTD: 19}
+
+# Verfahren für Elemente in ZIP-Archiven
+ZIP_COMPRESSION_TYPES = {COMPRESSION_GZIP: zipfile.ZIP_DEFLATED, COMPRESSION_NONE: zipfile.ZIP_STORED,
+                         COMPRESSION_XZ: zipfile.ZIP_LZMA}
+
+# Frühester Zeitstempel, der in ZIP-Archiven dargestellt werden kann (1980-01-01)
+ZIP_MIN_TIMESTAMP = 315532800
+
+# Dateien bis zu dieser Größe werden für ZIP-Archive parallel im Voraus gelesen
+ZIP_PREFETCH_MAX_SIZE = 64 * 1024 * 1024
+
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+
+def compression_settings(settings: dict, defaults: dict = None) -> dict:
+    """
+    Prüft Einstellungen für die Komprimierung und ergänzt fehlende Werte.
+    :param settings: Einstellungen aus der pybm-Konfigurationsdatei
+    :param defaults: optional Einstellungen, die fehlende Werte liefern
+    :return: vollständige Einstellungen mit Verfahren, Stufe und Anzahl Threads
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _defaults = {} if defaults is None else defaults
+    _algorithm = settings.get(CFG_ALGORITHM, _defaults.get(CFG_ALGORITHM, COMPRESSION_XZ))
+    if _algorithm not in COMPRESSION_SUFFIXES:
+        raise RuntimeError(f'Ungültiges Komprimierungsverfahren {_algorithm}')
+    if CFG_LEVEL in settings:
+        _level = settings[CFG_LEVEL]
+    elif _defaults.get(CFG_ALGORITHM) == _algorithm and CFG_LEVEL in _defaults:
+        _level = _defaults[CFG_LEVEL]
+    else:
+        _level = DEFAULT_COMPRESSION_LEVELS[_algorithm]
+    if not isinstance(_level, int) or _level not in COMPRESSION_LEVELS[_algorithm]:
+        raise RuntimeError(f'Ungültige Komprimierungsstufe {_level} für {_algorithm}')
+    _threads = settings.get(CFG_THREADS, _defaults.get(CFG_THREADS, 1))
+    if not isinstance(_threads, int) or _threads < 0:
+        raise RuntimeError(f'Ungültige Anzahl Threads {_threads} für Komprimierung')
+    return {CFG_ALGORITHM: _algorithm, CFG_LEVEL: _level, CFG_THREADS: _threads}
+
+
+def tar_file_name(base_name: str, compression: dict) -> str:
+    """
+    :param base_name: Name des Archivs ohne Endung
+    :param compression: Einstellungen für die Komprimierung
+    :return: Dateiname für ein tar-Archiv mit angegebener Komprimierung
+    """
+    return f'{base_name}.tar{COMPRESSION_SUFFIXES[compression[CFG_ALGORITHM]]}'
+
+
+def compressed_writer(file_obj, compression: dict):
+    """
+    Liefert ein Datei-Objekt, das die hineingeschriebenen Daten komprimiert in file_obj schreibt.
+    Beim Schließen des zurückgegebenen Objekts bleibt file_obj geöffnet.
+    :param file_obj: zum Schreiben geöffnetes Datei-Objekt
+    :param compression: Einstellungen für die Komprimierung
+    :return: Datei-Objekt zum Schreiben der unkomprimierten Daten
+    :raises RuntimeError: falls das Komprimierungsverfahren nicht verfügbar ist
+    """
+    _algorithm = compression[CFG_ALGORITHM]
+    _level = compression[CFG_LEVEL]
+    _threads = compression[CFG_THREADS]
+    if _algorithm == COMPRESSION_NONE:
+        return _UnclosableWriter(file_obj)
+    if _algorithm == COMPRESSION_GZIP:
+        return gzip.GzipFile(filename='', mode='wb', compresslevel=_level, fileobj=file_obj, mtime=0)
+    if _algorithm == COMPRESSION_XZ:
+        if _threads != 1 and shutil.which('xz') is not None:
+            return _PipeWriter(['xz', f'-{_level}', f'-T{_threads}', '-c'], file_obj)
+        return lzma.LZMAFile(file_obj, 'wb', format=lzma.FORMAT_XZ, preset=_level)
+    try:
+        import zstandard
+        _compressor = zstandard.ZstdCompressor(level=_level, threads=-1 if _threads == 0 else _threads)
+        return _compressor.stream_writer(file_obj, closefd=False)
+    except ImportError:
+        pass
+    if shutil.which('zstd') is not None:
+        return _PipeWriter(['zstd', f'-{_level}', f'-T{_threads}', '-c', '-q'] +
+                           (['--ultra'] if _level > 19 else []), file_obj)
+    raise RuntimeError('zstd-Komprimierung benötigt das Python-Package zstandard oder das Programm zstd')
+
+
+def compressed_reader(file_obj, algorithm: str):
+    """
+    Liefert ein Datei-Objekt, das die aus file_obj gelesenen Daten dekomprimiert.
+    Beim Schließen des zurückgegebenen Objekts bleibt file_obj geöffnet.
+    :param file_obj: zum Lesen geöffnetes Datei-Objekt
+    :param algorithm: Komprimierungsverfahren gzip, xz oder zstd
+    :return: Datei-Objekt zum Lesen der unkomprimierten Daten
+    :raises RuntimeError: falls das Komprimierungsverfahren nicht verfügbar ist
+    """
+    if algorithm == COMPRESSION_GZIP:
+        return gzip.GzipFile(filename='', mode='rb', fileobj=file_obj)
+    if algorithm == COMPRESSION_XZ:
+        return lzma.LZMAFile(file_obj, 'rb')
+    if algorithm != COMPRESSION_ZSTD:
+        raise RuntimeError(f'Ungültiges Komprimierungsverfahren {algorithm}')
+    try:
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(file_obj, closefd=False)
+    except ImportError:
+        raise RuntimeError('Lesen von zstd-komprimierten Daten benötigt das Python-Package zstandard')
+
+
+def write_tar(file_obj, source_path: str, compression: dict, arc_root: str = '.', mtime: int = None,
+              reproducible: bool = False):
+    """
+    Schreibt einen Verzeichnisbaum als komprimiertes tar-Archiv in ein Datei-Objekt.
+    Die Elemente werden in sortierter Reihenfolge abgelegt und gehören root:root.
+    :param file_obj: Datei-Objekt, in das geschrieben wird
+    :param source_path: Verzeichnis mit den zu archivierenden Dateien
+    :param compression: Einstellungen für die Komprimierung
+    :param arc_root: Name des Verzeichnisses im Archiv, Default ./
+    :param mtime: optional Zeitstempel für alle Elemente, Default Zeitstempel der Dateien
+    :param reproducible: True, um die Zugriffsrechte mit normalized_mode zu vereinheitlichen
+    """
+    with compressed_writer(file_obj, compression) as _writer:
+        with tarfile.open(fileobj=_writer, mode='w', format=tarfile.GNU_FORMAT) as _tf:
+            _root_ti = _tf.gettarinfo(source_path, arc_root)
+            _root_ti.mode = 0o755
+            _add_tar_member(_tf, _root_ti, source_path, mtime, reproducible)
+            for _path, _arc_name in _tree_members(source_path, arc_root):
+                _add_tar_member(_tf, _tf.gettarinfo(_path, _arc_name), _path, mtime, reproducible)
+
+
+def normalized_mode(mode: int) -> int:
+    """
+    Vereinheitlicht Zugriffsrechte für reproduzierbare Builds, damit sie nicht von umask oder
+    Checkout abhängen. Verzeichnisse und ausführbare Dateien erhalten 755, symbolische Links 777,
+    alle anderen Dateien 644.
+    :param mode: Dateityp und Zugriffsrechte wie von os.stat
+    :return: Dateityp mit vereinheitlichten Zugriffsrechten
+    """
+    if stat.S_ISLNK(mode):
+        return stat.S_IFMT(mode) | 0o777
+    if stat.S_ISDIR(mode) or mode & 0o111 != 0:
+        return stat.S_IFMT(mode) | 0o755
+    return stat.S_IFMT(mode) | 0o644
+
+
+@traced('archive')
+def write_zip(zip_file_path: str, members: list[tuple[str, str]], compression: dict, mtime: int = None,
+              reproducible: bool = False):
+    """
+    Schreibt Dateien direkt aus ihren Quellverzeichnissen in ein ZIP-Archiv. Für jedes Verzeichnis
+    im Archiv wird ein eigenes Element angelegt. Die Dateien werden von mehreren Threads im Voraus
+    gelesen, alle Elemente erhalten denselben Zeitstempel. Die Anzahl Threads hat keinen Einfluss
+    auf den Inhalt des Archivs.
+    :param zip_file_path: Name und Pfad des ZIP-Archivs
+    :param members: Tupel aus Name im Archiv und Pfad der Datei, in der gewünschten Reihenfolge
+    :param compression: Einstellungen für die Komprimierung
+    :param mtime: optional Zeitstempel für alle Elemente, Default 1980-01-01
+    :param reproducible: True, um die Zugriffsrechte mit normalized_mode zu vereinheitlichen
+    :raises RuntimeError: falls das Komprimierungsverfahren für ZIP-Archive nicht unterstützt wird
+    """
+    _algorithm = compression[CFG_ALGORITHM]
+    if _algorithm not in ZIP_COMPRESSION_TYPES:
+        raise RuntimeError(f'Komprimierungsverfahren {_algorithm} wird für ZIP-Archive nicht unterstützt')
+    _date_time = time.gmtime(max(ZIP_MIN_TIMESTAMP, ZIP_MIN_TIMESTAMP if mtime is None else mtime))[:6]
+    _threads = compression[CFG_THREADS] or min(32, (os.cpu_count() or 1) + 4)
+    with zipfile.ZipFile(zip_file_path, 'w', compression=ZIP_COMPRESSION_TYPES[_algorithm],
+                         compresslevel=compression[CFG_LEVEL] if _algorithm == COMPRESSION_GZIP else None) as _zf, \
+            ThreadPoolExecutor(max_workers=_threads) as _executor:
+        _dir_names = set()
+        _pending = collections.deque()
+        for _arc_name, _file_path in members:
+            for _dir_name in _parent_dir_names(_arc_name):
+                if _dir_name not in _dir_names:
+                    _dir_names.add(_dir_name)
+                    _dir_info = zipfile.ZipInfo(_dir_name, _date_time)
+                    _dir_info.external_attr = (0o40755 << 16) | 0x10
+                    _zf.writestr(_dir_info, b'')
+            _pending.append((_arc_name, _executor.submit(_read_zip_member, _file_path)))
+            if len(_pending) > 2 * _threads:
+                _write_zip_member(_zf, *_pending.popleft(), _date_time, reproducible)
+        while len(_pending) > 0:
+            _write_zip_member(_zf, *_pending.popleft(), _date_time, reproducible)
+
+
+def _parent_dir_names(arc_name: str) -> list[str]:
+    """
+    :param arc_name: Name einer Datei im Archiv
+    :return: Namen aller übergeordneten Verzeichnisse im Archiv, jeweils mit / am Ende
+    """
+    _parts = arc_name.split('/')[:-1]
+    return ['/'.join(_parts[:_i + 1]) + '/' for _i in range(len(_parts))]
+
+
+def _read_zip_member(file_path: str) -> tuple[str, int, bytes | None]:
+    """
+    :param file_path: Name und Pfad einer Datei
+    :return: Pfad und Zugriffsrechte der Datei, Inhalt der Datei oder None für große Dateien
+    """
+    _stat = os.stat(file_path)
+    if _stat.st_size > ZIP_PREFETCH_MAX_SIZE:
+        return file_path, _stat.st_mode, None
+    with open(file_path, 'rb') as _f:
+        return file_path, _stat.st_mode, _f.read()
+
+
+def _write_zip_member(zip_file: zipfile.ZipFile, arc_name: str, read_result, date_time: tuple,
+                      reproducible: bool):
+    """
+    Schreibt eine Datei in ein ZIP-Archiv.
+    :param zip_file: ZIP-Archiv
+    :param arc_name: Name der Datei im Archiv
+    :param read_result: Future mit dem Ergebnis von _read_zip_member
+    :param date_time: Zeitstempel für das Element
+    :param reproducible: True, um die Zugriffsrechte zu vereinheitlichen
+    """
+    _file_path, _mode, _contents = read_result.result()
+    if reproducible:
+        _mode = normalized_mode(_mode)
+    _zip_info = zipfile.ZipInfo(arc_name, date_time)
+    _zip_info.compress_type = zip_file.compression
+    _zip_info.external_attr = (_mode & 0xFFFF) << 16
+    if _contents is not None:
+        zip_file.writestr(_zip_info, _contents, compresslevel=zip_file.compresslevel)
+        return
+    # ZipFile.open übernimmt die Stufe nur aus ZipInfo, ab Python 3.13 auch als compress_level verfügbar
+    _zip_info._compresslevel = zip_file.compresslevel
+    with open(_file_path, 'rb') as _source, zip_file.open(_zip_info, 'w', force_zip64=True) as _target:
+        shutil.copyfileobj(_source, _target, PIPE_BUFFER_SIZE)
+
+
+def _add_tar_member(tar_file: tarfile.TarFile, tar_info: tarfile.TarInfo, path: str, mtime: int | None,
+                    reproducible: bool):
+    """
+    Fügt ein Element mit Eigentümer root:root einem tar-Archiv hinzu.
+    :param tar_file: tar-Archiv
+    :param tar_info: Daten des Elements
+    :param path: Pfad der Datei bzw. des Verzeichnisses
+    :param mtime: Zeitstempel für das Element oder None für den Zeitstempel der Datei
+    :param reproducible: True, um die Zugriffsrechte zu vereinheitlichen
+    """
+    tar_info.uid = tar_info.gid = 0
+    tar_info.uname = tar_info.gname = 'root'
+    if reproducible:
+        _file_type = stat.S_IFDIR if tar_info.isdir() else stat.S_IFLNK if tar_info.issym() else stat.S_IFREG
+        tar_info.mode = stat.S_IMODE(normalized_mode(_file_type | tar_info.mode))
+    if mtime is not None:
+        tar_info.mtime = mtime
+    if tar_info.isreg():
+        with open(path, 'rb') as _f:
+            tar_file.addfile(tar_info, _f)
+    else:
+        tar_file.addfile(tar_info)
+
+
+def _tree_members(source_path: str, arc_path: str):
+    """
+    Liefert alle Elemente unterhalb eines Verzeichnisses in sortierter Reihenfolge,
+    Verzeichnisse vor ihrem Inhalt.
+    :param source_path: Verzeichnis
+    :param arc_path: Name des Verzeichnisses im Archiv
+    :return: Generator für Tupel aus Pfad und Name im Archiv
+    """
+    for _entry in sorted(os.scandir(source_path), key=lambda _e: _e.name):
+        _arc_name = f'{arc_path}/{_entry.name}'
+        yield _entry.path, _arc_name
+        if _entry.is_dir(follow_symlinks=False):
+            yield from _tree_members(_entry.path, _arc_name)
+
+
+class _UnclosableWriter(io.RawIOBase):
+    """
+    Datei-Objekt, das Daten unverändert weiterreicht und beim Schließen das Ziel offen lässt.
+    """
+    def __init__(self, file_obj):
+        """
+        Konstruktor.
+        :param file_obj: Datei-Objekt, in das geschrieben wird
+        """
+        super().__init__()
+        self.__file = file_obj
+        self.__pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__pos
+
+    def write(self, data) -> int:
+        _n = self.__file.write(data)
+        self.__pos += _n
+        return _n
+
+
+class _PipeWriter(io.RawIOBase):
+    """
+    Datei-Objekt, das Daten durch ein externes Komprimierungsprogramm schickt.
+    Ein Thread kopiert die Ausgabe des Programms in das Ziel.
+    """
+    def __init__(self, cmd: list[str], file_obj):
+        """
+        Konstruktor, startet das Komprimierungsprogramm.
+        :param cmd: Befehl, der von stdin liest und nach stdout schreibt
+        :param file_obj: Datei-Objekt, in das geschrieben wird
+        """
+        super().__init__()
+        self.__cmd = cmd
+        self.__file = file_obj
+        count_subprocess()
+        self.__process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.__copy_error = None
+        self.__pos = 0
+        self.__copy_thread = threading.Thread(target=self.__copy_output, daemon=True)
+        self.__copy_thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__pos
+
+    def write(self, data) -> int:
+        self.__process.stdin.write(data)
+        self.__pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.__process.stdin.close()
+            self.__copy_thread.join()
+            _rc = self.__process.wait()
+            if _rc != 0:
+                raise RuntimeError(f'{self.__cmd[0]} beendet mit Fehler {_rc}')
+            if self.__copy_error is not None:
+                raise self.__copy_error
+        finally:
+            super().close()
+
+    def __copy_output(self):
+        """
+        Kopiert die Ausgabe des Komprimierungsprogramms in das Ziel.
+        """
+        try:
+            while True:
+                _data = self.__process.stdout.read(PIPE_BUFFER_SIZE)
+                if not _data:
+                    break
+                self.__file.write(_data)
+        except OSError as _e:
+            self.__copy_error = _e
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Batch-Builds für mehrere Projekte unter PYBM_PROJECTS_ROOT.
+Die Builds aller Projekte und Feature-Sets laufen in einem gemeinsamen Prozess-Pool mit einer
+globalen Obergrenze für gleichzeitige Builds. Fehler betreffen nur das jeweilige Projekt, am Ende
+werden alle Projekte mit Status und Laufzeit angezeigt.
+"""
+
+import fnmatch
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pybm import *
+from pybm.release import STATUS_FAILED, STATUS_OK, run_step
+
+
+# Build-Typen, die für alle Feature-Sets eines Projekts in einem Schritt bauen
+PROJECT_BUILD_TYPES = (BUILD_TYPE_CUSTOM, BUILD_TYPE_NSIS, BUILD_TYPE_SIGN)
+
+# Zeichen, an denen Muster für Projektnamen erkannt werden
+GLOB_CHARACTERS = '*?['
+
+
+def discover_projects(projects_root: str, patterns: list[str]) -> list[str]:
+    """
+    Ermittelt die Projekte unter dem Root-Verzeichnis. Ein Projekt ist ein Verzeichnis mit
+    build/featuresets oder einer hatchling-Konfigurationsdatei.
+    :param projects_root: Root-Verzeichnis für Projekte
+    :param patterns: Namen oder Muster der Projekte, leer für alle Projekte
+    :return: Namen der Projekte, sortiert
+    """
+    _projects = set()
+    for _entry in os.scandir(projects_root):
+        if _entry.name.startswith('.') or not _entry.is_dir():
+            continue
+        if not (os.path.isdir(os.path.join(_entry.path, 'build', 'featuresets')) or
+                os.path.isfile(os.path.join(_entry.path, WHEEL_CFG_FILE_NAME))):
+            continue
+        if len(patterns) == 0 or any(fnmatch.fnmatchcase(_entry.name, _p) for _p in patterns):
+            _projects.add(_entry.name)
+    # explizit genannte Projekte werden immer gebaut, damit ein Fehler gemeldet wird
+    _projects.update(_p for _p in patterns if not any(_c in _p for _c in GLOB_CHARACTERS))
+    return sorted(_projects)
+
+
+def build_batch(build_type: str, patterns: list[str], build_env_provider: Callable[[str], dict],
+                force: bool, jobs: int | None):
+    """
+    Baut die angegebenen Projekte mit bis zu jobs gleichzeitig laufenden Prozessen.
+    :param build_type: Build-Typ
+    :param patterns: Namen oder Muster der Projekte, leer für alle Projekte
+    :param build_env_provider: Funktion, die die Build-Umgebung für ein Projekt liefert
+    :param force: True, um auch aktuelle Pakete neu zu bauen
+    :param jobs: maximale Anzahl gleichzeitiger Prozesse, None für die Anzahl der CPUs
+    :raises RuntimeError: falls der Build-Typ unbekannt ist, keine Projekte gefunden wurden oder
+                          der Build mindestens eines Projekts fehlgeschlagen ist
+    """
+    from pybm.cli import build_function, resolve_build_env
+    build_function(build_type)
+    _projects_root = os.getenv(ENVA_PROJECTS_ROOT)
+    if _projects_root is None or not os.path.isdir(_projects_root):
+        raise RuntimeError(f'Umgebungsvariable {ENVA_PROJECTS_ROOT} nicht gesetzt oder kein Verzeichnis')
+    _projects = discover_projects(_projects_root, patterns)
+    if len(_projects) == 0:
+        raise RuntimeError(f'Keine Projekte unter {_projects_root} gefunden')
+    print(f'Starte {build_type} für {len(_projects)} Projekt(e)')
+    _start = time.perf_counter()
+    # Status, Laufzeit und Fehlermeldungen je Projekt
+    _results = {_p: [STATUS_OK, 0.0, []] for _p in _projects}
+    _tasks = []
+    for _project in _projects:
+        try:
+            _build_env = resolve_build_env(build_env_provider, _project)
+        except BaseException as _e:
+            _results[_project][0] = STATUS_FAILED
+            _results[_project][2].append(str(_e))
+            continue
+        _build_env[PAR_FORCE_BUILD] = force
+        if build_type in PROJECT_BUILD_TYPES:
+            _tasks.append((_project, _build_env, None))
+        else:
+            _tasks.extend((_project, _build_env, _f if len(_f) > 0 else None)
+                          for _f in _build_env[PAR_FEATURE_SETS])
+    _jobs = jobs or os.cpu_count() or 1
+    if len(_tasks) > 0:
+        with ProcessPoolExecutor(max_workers=min(_jobs, len(_tasks))) as _executor:
+            _running = {_executor.submit(run_step, build_type, _build_env, _project, _fs): _project
+                        for _project, _build_env, _fs in _tasks}
+            while len(_running) > 0:
+                _done, _ = wait(_running, return_when=FIRST_COMPLETED)
+                for _future in _done:
+                    _project = _running.pop(_future)
+                    _output, _error, _elapsed = _future.result()
+                    print(_output, end='')
+                    _results[_project][1] += _elapsed
+                    if _error is not None:
+                        print(f'{_project}: {_error}')
+                        _results[_project][0] = STATUS_FAILED
+                        _results[_project][2].append(_error)
+    print_summary(_results, time.perf_counter() - _start)
+    _failed = [_p for _p, (_status, _, _) in _results.items() if _status != STATUS_OK]
+    if len(_failed) > 0:
+        raise RuntimeError(f'Build fehlgeschlagen für {len(_failed)} von {len(_projects)} Projekt(en): '
+                           f'{", ".join(_failed)}')
+
+
+def print_summary(results: dict, elapsed: float):
+    """
+    Zeigt Status, Laufzeit und Fehlermeldungen je Projekt an.
+    :param results: Status, Summe der Laufzeiten in Sekunden und Fehlermeldungen je Projekt
+    :param elapsed: Gesamtlaufzeit in Sekunden
+    """
+    _width = max(len(_p) for _p in list(results) + ['Projekt', 'Gesamt'])
+    print()
+    print(f'{"Projekt":<{_width}}  {"Status":<8} {"Dauer [s]":>10}  Fehler')
+    for _project, (_status, _project_elapsed, _errors) in results.items():
+        _message = '; '.join(_e.replace('\n', ' ') for _e in _errors)
+        print(f'{_project:<{_width}}  {_status:<8} {_project_elapsed:>10.3f}  {_message}'.rstrip())
+    print(f'{"Gesamt":<{_width}}  {"":<8} {elapsed:>10.3f}')
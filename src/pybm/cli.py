@@ -36,23 +36,41 @@
 CLI für pybm.
 """
 
+import contextlib
+import io
 import sys
+from collections.abc import Callable
 
 from pybm import *
-from pybm.deb import build_deb
-from pybm.nsis import build_nsis
-from pybm.rpm import build_rpm
-from pybm.sign import build_sign
-from pybm.util import build_env_for
-from pybm.wheel import build_wheel
-from pybm.custom import build_custom
+from pybm.server import forward_command
+from pybm.trace import trace_run, trace_span
+
+
+# Build-Typen, deren Feature-Sets gleichzeitig gebaut werden können
+PARALLEL_BUILD_TYPES = (BUILD_TYPE_WHEEL, BUILD_TYPE_DEB, BUILD_TYPE_RPM)
+
+# Default für das maximale Alter nicht mehr verwendeter Dateien im Store (30 Tage)
+DEFAULT_GC_MAX_AGE = 30 * 86400
+
+# Einheiten für Option --max-size
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Aktionen des Befehls delta
+DELTA_ACTION_APPLY = 'apply'
+DELTA_ACTION_VERIFY = 'verify'
 
 
 def show_usage():
     """
     Zeigt Aufruf-Infos an.
     """
-    print('Aufruf: pybm <Build-Typ> <Projekt> [<Feature-Set>]')
+    print('Aufruf: pybm <Build-Typ> <Projekt> [<Feature-Set>] [--jobs <Anzahl>] [--force] [--trace <Datei>]')
+    print('        pybm release <Projekt> [--targets <Ziel>,...] [--jobs <Anzahl>] [--force]')
+    print('        pybm batch <Build-Typ> [<Projekt>|<Muster> ...] [--jobs <Anzahl>] [--force]')
+    print('        pybm watch <Projekt> [<Ziel>,...] [--force]')
+    print('        pybm serve')
+    print('        pybm gc [--max-age <Tage>] [--max-size <Größe>]')
+    print('        pybm delta apply|verify <Delta> <Vorgänger> [<Zielverzeichnis>]')
     print('  Build-Typen:')
     print('    build_wheel erzeugt ein Python wheel')
     print('    build_deb erzeugt ein Debian Installationspaket')
@@ -60,6 +78,22 @@ def show_usage():
     print('    build_nsis erzeugt einen NSIS Windows-Installer')
     print('    build_custom erzeugt ein ZIP-Archiv für die manuelle Installation')
     print('    build_sign generiert eine signierte Datei mit den SHA512-Hashes')
+    print('  Optionen:')
+    print('    --jobs, -j baut bei Feature-Set all bis zu <Anzahl> Feature-Sets gleichzeitig'
+          ' (build_wheel, build_deb, build_rpm), bei release und batch bis zu <Anzahl> Builds')
+    print('    --force, -f baut auch dann neu, wenn sich seit dem letzten Build nichts geändert hat')
+    print('    --targets, -t Ziele für release, möglich sind wheel, deb, rpm, custom, nsis und sign,'
+          ' Default alle außer nsis')
+    print('    --trace schreibt Laufzeit, CPU-Zeit und I/O je Build-Phase als Chrome-Trace in die angegebene Datei')
+    print('  release erzeugt mehrere Ziele eines Projekts mit parallelen Build-Schritten')
+    print('  batch baut alle Projekte unter PYBM_PROJECTS_ROOT oder die angegebenen mit parallelen Prozessen')
+    print('  gc entfernt nicht mehr verwendete Dateien aus dem Store, die seit --max-age Tagen (Default 30)'
+          ' nicht mehr verwendet wurden oder solange der Store größer als --max-size ist (z.B. 10G)')
+    print('  delta apply setzt aus Vorgänger und Delta das neue Paket zusammen (Default im Verzeichnis des'
+          ' Vorgängers), delta verify prüft das nur')
+    print('  watch baut die Ziele eines Projekts (Default wheel) und nach jeder Änderung in src und build nur die'
+          ' betroffenen Ziele und Feature-Sets neu')
+    print('  serve startet den Build-Server, an den weitere Aufrufe weitergeleitet werden')
     print()
 
 
@@ -85,50 +119,351 @@ def check_feature_set(build_environment: dict, featureset: str = None):
             raise RuntimeError('Projekt hat keine Feature-Sets')
 
 
-def cli_main():
+def build_function(build_type: str):
     """
-    Hauptprogramm für die Kommandozeile.
+    :param build_type: Build-Typ
+    :return: Funktion, die den angegebenen Build-Typ erzeugt
+    :raises RuntimeError: falls der Build-Typ unbekannt ist
     """
-    if len(sys.argv) < 3:
-        show_usage()
-        sys.exit(1)
-    build_type = sys.argv[1].lower()
-    project = sys.argv[2]
-    try:
-        build_env = build_env_for(project)
+    # Module erst bei Bedarf importieren, damit an den Build-Server weitergeleitete Aufrufe schnell starten
+    if build_type == BUILD_TYPE_WHEEL:
+        from pybm.wheel import build_wheel
+        return build_wheel
+    if build_type == BUILD_TYPE_DEB:
+        from pybm.deb import build_deb
+        return build_deb
+    if build_type == BUILD_TYPE_RPM:
+        from pybm.rpm import build_rpm
+        return build_rpm
+    if build_type == BUILD_TYPE_CUSTOM:
+        from pybm.custom import build_custom
+        return build_custom
+    if build_type == BUILD_TYPE_NSIS:
+        from pybm.nsis import build_nsis
+        return build_nsis
+    if build_type == BUILD_TYPE_SIGN:
+        from pybm.sign import build_sign
+        return build_sign
+    raise RuntimeError(f'Unbekannter Build-Typ {build_type}')
 
-        if build_type in (BUILD_TYPE_NSIS, BUILD_TYPE_SIGN, BUILD_TYPE_CUSTOM):
-            feature_set_ignored = True
-            feature_set = FEATURE_SET_ALL
-        else:
-            feature_set_ignored = False
-            feature_set = None if len(sys.argv) == 3 else sys.argv[3].lower()
-        check_feature_set(build_env, feature_set)
-        if build_type == BUILD_TYPE_WHEEL:
-            build_func = build_wheel
-        elif build_type == BUILD_TYPE_DEB:
-            build_func = build_deb
-        elif build_type == BUILD_TYPE_RPM:
-            build_func = build_rpm
-        elif build_type == BUILD_TYPE_CUSTOM:
-            build_func = build_custom
-        elif build_type == BUILD_TYPE_NSIS:
-            build_func = build_nsis
-        elif build_type == BUILD_TYPE_SIGN:
-            build_func = build_sign
+
+def parse_options(args: list[str]) -> tuple[list[str], dict]:
+    """
+    Trennt Optionen von den übrigen Argumenten der Kommandozeile.
+    :param args: Argumente der Kommandozeile ohne Programmname
+    :return: Argumente ohne Optionen, Optionen mit ihren Werten
+    :raises RuntimeError: falls eine Option ungültig ist
+    """
+    _args = []
+    _options = {}
+    _it = iter(args)
+    for _arg in _it:
+        if _arg in ('--jobs', '-j'):
+            _value = next(_it, None)
+            if _value is None or not _value.isdigit() or int(_value) < 1:
+                raise RuntimeError(f'Option {_arg} erfordert eine positive Anzahl')
+            _options[OPT_JOBS] = int(_value)
+        elif _arg.startswith('--jobs='):
+            _value = _arg[7:]
+            if not _value.isdigit() or int(_value) < 1:
+                raise RuntimeError('Option --jobs erfordert eine positive Anzahl')
+            _options[OPT_JOBS] = int(_value)
+        elif _arg in ('--targets', '-t'):
+            _value = next(_it, None)
+            if _value is None or len(_value.strip()) == 0:
+                raise RuntimeError(f'Option {_arg} erfordert eine Liste von Zielen')
+            _options[OPT_TARGETS] = _target_list(_value)
+        elif _arg.startswith('--targets='):
+            _options[OPT_TARGETS] = _target_list(_arg[10:])
+        elif _arg == '--trace':
+            _value = next(_it, None)
+            if _value is None or len(_value) == 0:
+                raise RuntimeError('Option --trace erfordert eine Datei')
+            _options[OPT_TRACE] = _value
+        elif _arg.startswith('--trace='):
+            if len(_arg) == 8:
+                raise RuntimeError('Option --trace erfordert eine Datei')
+            _options[OPT_TRACE] = _arg[8:]
+        elif _arg in ('--max-age', '--max-size'):
+            _options[_arg[2:]] = _gc_limit(_arg, next(_it, None))
+        elif _arg.startswith('--max-age=') or _arg.startswith('--max-size='):
+            _name, _value = _arg.split('=', 1)
+            _options[_name[2:]] = _gc_limit(_name, _value)
+        elif _arg in ('--force', '-f'):
+            _options[OPT_FORCE] = True
+        elif _arg.startswith('-') and len(_arg) > 1:
+            raise RuntimeError(f'Unbekannte Option {_arg}')
         else:
-            raise RuntimeError(f'Unbekannter Build-Typ {build_type}')
-        if len(build_env[PAR_FEATURE_SETS]) == 0:
-            build_func(build_env, project)
+            _args.append(_arg)
+    return _args, _options
+
+
+def _target_list(value: str) -> list[str]:
+    """
+    :param value: durch Kommas getrennte Ziele
+    :return: Ziele in Kleinbuchstaben
+    :raises RuntimeError: falls keine Ziele angegeben sind
+    """
+    _targets = [_t.strip().lower() for _t in value.split(',') if len(_t.strip()) > 0]
+    if len(_targets) == 0:
+        raise RuntimeError('Option --targets erfordert eine Liste von Zielen')
+    return _targets
+
+
+def _gc_limit(option: str, value: str | None) -> int:
+    """
+    :param option: Name der Option, --max-age oder --max-size
+    :param value: Wert der Option, Anzahl Tage bzw. Größe mit optionaler Einheit K, M oder G
+    :return: maximales Alter in Sekunden bzw. maximale Größe in Bytes
+    :raises RuntimeError: falls der Wert ungültig ist
+    """
+    if option == '--max-age':
+        if value is None or not value.isdigit():
+            raise RuntimeError('Option --max-age erfordert eine Anzahl Tage')
+        return int(value) * 86400
+    _value = '' if value is None else value.strip().upper()
+    _factor = SIZE_UNITS.get(_value[-1:], 1)
+    if _value[-1:] in SIZE_UNITS:
+        _value = _value[:-1]
+    if not _value.isdigit():
+        raise RuntimeError('Option --max-size erfordert eine Größe, z.B. 500M oder 10G')
+    return int(_value) * _factor
+
+
+def collect_store_garbage(options: dict) -> int:
+    """
+    Entfernt nicht mehr verwendete Dateien aus dem Store.
+    :param options: Optionen mit maximalem Alter und maximaler Größe
+    :return: Exit-Code
+    """
+    from pybm.store import collect_garbage
+    try:
+        _count, _freed, _size = collect_garbage(options.get(OPT_MAX_AGE, DEFAULT_GC_MAX_AGE),
+                                                options.get(OPT_MAX_SIZE))
+    except (OSError, RuntimeError) as _e:
+        print(str(_e))
+        return 1
+    print(f'{_count} Dateien mit {_size_text(_freed)} aus dem Store entfernt, Store belegt {_size_text(_size)}')
+    return 0
+
+
+def run_delta_command(args: list[str]) -> int:
+    """
+    Setzt ein Paket aus Vorgänger und Delta zusammen oder prüft, ob das möglich ist.
+    :param args: Aktion, Delta-Datei, Vorgänger und bei apply optional Zielverzeichnis
+    :return: Exit-Code
+    """
+    _action = args[0].lower() if len(args) > 0 else None
+    if (_action not in (DELTA_ACTION_APPLY, DELTA_ACTION_VERIFY) or len(args) < 3 or
+            len(args) > (4 if _action == DELTA_ACTION_APPLY else 3)):
+        show_usage()
+        return 1
+    from pybm.delta import apply_delta, verify_delta
+    try:
+        if _action == DELTA_ACTION_APPLY:
+            _target_path = args[3] if len(args) > 3 else None
+            print(f'Paket {apply_delta(args[1], args[2], _target_path)} zusammengesetzt')
         else:
-            if feature_set_ignored or feature_set != FEATURE_SET_ALL:
-                build_func(build_env, project, feature_set)
-            else:
-                for _f in build_env[PAR_FEATURE_SETS]:
-                    build_func(build_env, project, _f)
+            print(f'Delta {args[1]} ergibt Paket {verify_delta(args[1], args[2])}')
+    except (OSError, RuntimeError) as _e:
+        print(str(_e))
+        return 1
+    return 0
+
+
+def _size_text(size: int) -> str:
+    """
+    :param size: Größe in Bytes
+    :return: Größe in der passenden Einheit
+    """
+    for _unit in ('Bytes', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.0f} {_unit}' if _unit == 'Bytes' else f'{size:.1f} {_unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+def build_feature_set(build_type: str, build_environment: dict, project: str,
+                      feature_set: str) -> tuple[str, str]:
+    """
+    Baut ein Feature-Set in einem eigenen Prozess, die Ausgaben werden gesammelt und
+    an den Aufrufer zurückgegeben.
+    :param build_type: Build-Typ
+    :param build_environment: Build-Umgebung
+    :param project: Name des Projekts
+    :param feature_set: Name des Feature-Sets
+    :return: gesammelte Ausgaben, Fehlermeldung oder None
+    """
+    _output = io.StringIO()
+    _error = None
+    with contextlib.redirect_stdout(_output):
+        try:
+            run_build(build_type, build_environment, project, feature_set)
+        except BaseException as _e:
+            _error = str(_e)
+    return _output.getvalue(), _error
+
+
+def build_feature_sets(build_type: str, build_environment: dict, project: str, jobs: int):
+    """
+    Baut alle Feature-Sets eines Projekts mit bis zu jobs gleichzeitig laufenden Prozessen.
+    Die Ausgaben werden je Feature-Set in der Reihenfolge der Feature-Sets angezeigt.
+    :param build_type: Build-Typ
+    :param build_environment: Build-Umgebung
+    :param project: Name des Projekts
+    :param jobs: maximale Anzahl gleichzeitiger Prozesse
+    :raises RuntimeError: falls der Build mindestens eines Feature-Sets fehlgeschlagen ist
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    _feature_sets = list(build_environment[PAR_FEATURE_SETS])
+    with ProcessPoolExecutor(max_workers=min(jobs, len(_feature_sets))) as _executor:
+        _futures = [_executor.submit(build_feature_set, build_type, build_environment, project, _f)
+                    for _f in _feature_sets]
+        _failed = []
+        for _f, _future in zip(_feature_sets, _futures):
+            _output, _error = _future.result()
+            print(_output, end='')
+            if _error is not None:
+                print(_error)
+                _failed.append(_f)
+    if len(_failed) > 0:
+        raise RuntimeError(f'Build fehlgeschlagen für Feature-Set(s) {", ".join(_failed)}')
+
+
+def run_command(args: list[str], build_env_provider: Callable[[str], dict] = None) -> int:
+    """
+    Führt einen Build mit den Argumenten der Kommandozeile aus.
+    :param args: Argumente der Kommandozeile ohne Programmname
+    :param build_env_provider: optional Funktion, die die Build-Umgebung für ein Projekt liefert,
+                               Default build_env_for
+    :return: Exit-Code
+    """
+    try:
+        _args, _options = parse_options(args)
+    except RuntimeError as _e:
+        print(str(_e))
+        return 1
+    if len(_args) == 1 and _args[0].lower() == COMMAND_GC:
+        return collect_store_garbage(_options)
+    if len(_args) > 0 and _args[0].lower() == COMMAND_DELTA:
+        return run_delta_command(_args[1:])
+    if len(_args) < 2:
+        show_usage()
+        return 1
+    try:
+        with trace_run(_options.get(OPT_TRACE), args):
+            execute_command(_args, _options, build_env_provider)
     except BaseException as _e:
         print(str(_e))
-        sys.exit(1)
+        return 1
+    return 0
+
+
+def execute_command(args: list[str], options: dict, build_env_provider: Callable[[str], dict] = None):
+    """
+    Führt einen Build-Typ oder Befehl aus.
+    :param args: Argumente der Kommandozeile ohne Optionen, mindestens Build-Typ und Projekt
+    :param options: Optionen mit ihren Werten
+    :param build_env_provider: optional Funktion, die die Build-Umgebung für ein Projekt liefert,
+                               Default build_env_for
+    :raises RuntimeError: falls ein Build fehlschlägt
+    """
+    build_type = args[0].lower()
+    project = args[1]
+    if build_env_provider is None:
+        from pybm.util import build_env_for
+        build_env_provider = build_env_for
+    if build_type == COMMAND_BATCH:
+        from pybm.batch import build_batch
+        build_batch(args[1].lower(), args[2:], build_env_provider, options.get(OPT_FORCE, False),
+                    options.get(OPT_JOBS))
+        return
+    if build_type == COMMAND_WATCH:
+        from pybm.watch import watch_project
+        _targets = options.get(OPT_TARGETS)
+        if _targets is None and len(args) > 2:
+            _targets = _target_list(','.join(args[2:]))
+        watch_project(build_env_provider, project, _targets, options.get(OPT_FORCE, False))
+        return
+    build_env = resolve_build_env(build_env_provider, project)
+    build_env[PAR_FORCE_BUILD] = options.get(OPT_FORCE, False)
+    if build_type == COMMAND_RELEASE:
+        if len(args) > 2:
+            raise RuntimeError('Ein Release umfasst immer alle Feature-Sets')
+        from pybm.release import build_release
+        build_release(build_env, project, options.get(OPT_TARGETS), options.get(OPT_JOBS))
+        return
+
+    if build_type in (BUILD_TYPE_NSIS, BUILD_TYPE_SIGN, BUILD_TYPE_CUSTOM):
+        feature_set_ignored = True
+        feature_set = FEATURE_SET_ALL
+    else:
+        feature_set_ignored = False
+        feature_set = None if len(args) == 2 else args[2].lower()
+    check_feature_set(build_env, feature_set)
+    # Build-Typ vor dem ersten Build prüfen
+    build_function(build_type)
+    _jobs = options.get(OPT_JOBS, 1)
+    if len(build_env[PAR_FEATURE_SETS]) == 0:
+        run_build(build_type, build_env, project)
+    else:
+        if feature_set_ignored or feature_set != FEATURE_SET_ALL:
+            run_build(build_type, build_env, project, feature_set)
+        elif _jobs > 1 and build_type in PARALLEL_BUILD_TYPES:
+            build_feature_sets(build_type, build_env, project, _jobs)
+        else:
+            for _f in build_env[PAR_FEATURE_SETS]:
+                run_build(build_type, build_env, project, _f)
+
+
+def resolve_build_env(build_env_provider: Callable[[str], dict], project: str) -> dict:
+    """
+    :param build_env_provider: Funktion, die die Build-Umgebung für ein Projekt liefert
+    :param project: Name des Projekts
+    :return: Build-Umgebung für das Projekt
+    :raises RuntimeError: falls die Build-Umgebung nicht korrekt erstellt wurde
+    """
+    with trace_span(project, 'env', project=project):
+        return build_env_provider(project)
+
+
+def run_build(build_type: str, build_environment: dict, project: str, feature_set: str = None):
+    """
+    Führt einen Build aus, bei Aufzeichnung mit --trace als eigene Phase.
+    :param build_type: Build-Typ
+    :param build_environment: Build-Umgebung
+    :param project: Name des Projekts
+    :param feature_set: optional Name des Feature-Sets
+    :raises RuntimeError: falls der Build-Typ unbekannt ist oder der Build fehlschlägt
+    """
+    _build_func = build_function(build_type)
+    with trace_span(f'{build_type} {project} {feature_set or ""}'.rstrip(), 'build', project=project,
+                    build_type=build_type, feature_set=feature_set):
+        if feature_set is None:
+            _build_func(build_environment, project)
+        else:
+            _build_func(build_environment, project, feature_set)
+
+
+def cli_main():
+    """
+    Hauptprogramm für die Kommandozeile.
+    Läuft ein Build-Server, wird der Aufruf an ihn weitergeleitet.
+    """
+    _args = sys.argv[1:]
+    if len(_args) > 0 and _args[0].lower() == COMMAND_SERVE:
+        from pybm.server import serve
+        try:
+            serve(run_command)
+        except RuntimeError as _e:
+            print(str(_e))
+            sys.exit(1)
+        return
+    # der Watch-Modus läuft bis zum Abbruch und wird daher nie an den Build-Server weitergeleitet
+    _rc = None if len(_args) > 0 and _args[0].lower() == COMMAND_WATCH else forward_command(_args)
+    if _rc is None:
+        _rc = run_command(_args)
+    sys.exit(_rc)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Schnittstelle für die Verwendung von pybm als Bibliothek, z.B. in einem Build-Orchestrator mit
+mehreren Threads oder asyncio. Ein BuildContext fasst Projekt und Build-Umgebung zusammen, alle
+Builder arbeiten mit absoluten Pfaden und ändern weder das aktuelle Verzeichnis noch Dateien im
+Projekt außerhalb von dist. Builds verschiedener Projekte und verschiedener Feature-Sets eines
+Projekts können gleichzeitig in mehreren Threads laufen.
+
+    _ctx = BuildContext('myproject', projects_root='/home/me/GITROOT')
+    await asyncio.gather(asyncio.to_thread(_ctx.build, 'build_deb', 'core', _core_log),
+                         asyncio.to_thread(_ctx.build, 'build_rpm', 'core', _rpm_log))
+"""
+
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+
+from pybm import *
+
+
+# Ziel für die Ausgaben des laufenden Builds, je Thread bzw. asyncio-Task
+_build_output = contextvars.ContextVar('pybm_build_output', default=None)
+
+_output_lock = threading.Lock()
+
+
+class BuildContext:
+    """
+    Projekt mit seiner Build-Umgebung. Die Build-Umgebung wird beim ersten Build ermittelt und von
+    allen Builds des Kontexts gemeinsam verwendet.
+    """
+
+    def __init__(self, project: str, projects_root: str = None, force: bool = False):
+        """
+        Konstruktor.
+        :param project: Name des Projekts
+        :param projects_root: optional Root-Verzeichnis für Projekte, Default aus Umgebungsvariable
+                              PYBM_PROJECTS_ROOT
+        :param force: True, um auch dann neu zu bauen, wenn sich seit dem letzten Build nichts geändert hat
+        """
+        self.project = project
+        self.projects_root = None if projects_root is None else os.path.abspath(projects_root)
+        self.force = force
+        self.__lock = threading.Lock()
+        self.__build_environment = None
+
+    @property
+    def build_environment(self) -> dict:
+        """
+        :return: Build-Umgebung des Projekts
+        :raises RuntimeError: falls die Build-Umgebung nicht korrekt erstellt wurde
+        """
+        with self.__lock:
+            if self.__build_environment is None:
+                from pybm.util import build_env_for
+                _build_env = build_env_for(self.project, self.projects_root)
+                _build_env[PAR_FORCE_BUILD] = self.force
+                self.__build_environment = _build_env
+            return self.__build_environment
+
+    def feature_sets(self) -> list[str]:
+        """
+        :return: Namen der Feature-Sets des Projekts, leer für Projekte ohne Feature-Sets
+        """
+        return [_f for _f in self.build_environment[PAR_FEATURE_SETS] if len(_f) > 0]
+
+    def build(self, build_type: str, feature_set: str = None, output=None):
+        """
+        Führt einen Build aus. Bei Feature-Set all werden alle Feature-Sets nacheinander gebaut,
+        build_custom, build_nsis und build_sign umfassen immer alle Feature-Sets.
+        :param build_type: Build-Typ, z.B. build_deb
+        :param feature_set: Name des Feature-Sets, all oder None für Projekte ohne Feature-Sets
+        :param output: optional Datei-Objekt für die Ausgaben dieses Builds, Default sys.stdout
+        :raises RuntimeError: falls Build-Typ oder Feature-Set ungültig sind oder der Build fehlschlägt
+        """
+        from pybm.batch import PROJECT_BUILD_TYPES
+        from pybm.cli import build_function, check_feature_set, run_build
+        _build_type = build_type.lower()
+        build_function(_build_type)
+        _build_env = self.build_environment
+        with build_output(output):
+            if _build_type in PROJECT_BUILD_TYPES:
+                run_build(_build_type, _build_env, self.project, FEATURE_SET_ALL)
+                return
+            _feature_set = None if feature_set is None else feature_set.lower()
+            check_feature_set(_build_env, _feature_set)
+            if _feature_set == FEATURE_SET_ALL:
+                for _f in _build_env[PAR_FEATURE_SETS]:
+                    run_build(_build_type, _build_env, self.project, _f or None)
+            else:
+                run_build(_build_type, _build_env, self.project, _feature_set)
+
+
+@contextlib.contextmanager
+def build_output(output):
+    """
+    Leitet die Ausgaben des laufenden Threads bzw. asyncio-Tasks in ein Datei-Objekt um. Anders als
+    contextlib.redirect_stdout betrifft die Umleitung keine anderen Threads.
+    :param output: Datei-Objekt für die Ausgaben, None für keine Umleitung
+    """
+    if output is None:
+        yield
+        return
+    with _output_lock:
+        if not isinstance(sys.stdout, _OutputDispatcher):
+            sys.stdout = _OutputDispatcher(sys.stdout)
+    _token = _build_output.set(output)
+    try:
+        yield
+    finally:
+        _build_output.reset(_token)
+
+
+class _OutputDispatcher:
+    """
+    Ersatz für sys.stdout, der jede Ausgabe an das Ziel des aktuellen Kontexts weiterreicht.
+    """
+
+    def __init__(self, stream):
+        """
+        Konstruktor.
+        :param stream: bisheriges sys.stdout, Ziel für Ausgaben ohne Umleitung
+        """
+        self.__stream = stream
+
+    def write(self, data: str) -> int:
+        return (_build_output.get() or self.__stream).write(data)
+
+    def flush(self):
+        (_build_output.get() or self.__stream).flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.__stream, name)
@@ -37,13 +37,14 @@ Erzeugt ein ZIP-Archiv für eine manuelle Installation.
 """
 
 import os
-import shutil
 import tempfile
 import zipfile
 
 from pybm import *
-from pybm.util import wheel_file_name
-from pybm.wheel import build_wheel
+from pybm.archive import write_zip
+from pybm.manifest import input_fingerprint, is_up_to_date, record_build
+from pybm.util import archive_compression, archive_mtime, reproducible_build
+from pybm.wheel import provide_wheel, wheel_input_paths
 
 
 def build_custom(build_environment: dict, project: str, feature_set: str = None):
@@ -57,35 +58,60 @@ def build_custom(build_environment: dict, project: str, feature_set: str = None)
     _dist_path = os.path.join(_project_root, 'dist')
     _project_version = next(iter(build_environment[PAR_FEATURE_SETS].values()))[PAR_PROJECT_VERSION]
     _archive_file_name = f'{project}-{_project_version}-custom.zip'
-    with tempfile.TemporaryDirectory() as _temp_path:
-        _target_path = os.path.join(_temp_path, f'{project}-{_project_version}')
-        os.mkdir(_target_path)
-        for _fs_name, _fs_data in build_environment[PAR_FEATURE_SETS].items():
-            if len(_fs_name) == 0:
-                _feature_path = os.path.join(_project_root, 'build')
-            else:
-                _feature_path = os.path.join(_project_root, 'build', 'featuresets', str(_fs_name))
-            # Wheel erzeugen
-            _wheel_file_name = wheel_file_name(build_environment, _fs_name)
-            build_wheel(build_environment, project, _fs_name)
-            shutil.move(os.path.join(_dist_path, _wheel_file_name), _target_path)
-            # Zusatzdaten kopieren
-            _custom_data_path = os.path.join(_feature_path, 'custom')
-            for _path, _dirs, _files in os.walk(_custom_data_path):
+    _archive_file_path = os.path.join(_dist_path, _archive_file_name)
+    # Build überspringen, falls sich seit dem letzten Build nichts geändert hat
+    _input_paths = []
+    for _fs_name in build_environment[PAR_FEATURE_SETS]:
+        _feature_path = _feature_set_path(_project_root, _fs_name)
+        _input_paths.extend(_p for _p in wheel_input_paths(build_environment, _fs_name or None)
+                            if _p not in _input_paths)
+        _input_paths.extend([os.path.join(_feature_path, 'custom'),
+                             os.path.join(_feature_path, 'deb', 'data')])
+    _compression = archive_compression(build_environment, TARGET_CUSTOM)
+    _mtime = archive_mtime(build_environment)
+    _reproducible = reproducible_build(build_environment)
+    _fingerprint = input_fingerprint(build_environment, TARGET_CUSTOM, None, _input_paths,
+                                     {'compression': _compression, 'mtime': _mtime,
+                                      'reproducible': _reproducible})
+    if is_up_to_date(build_environment, TARGET_CUSTOM, None, _fingerprint):
+        print(f'ZIP-Archiv {_archive_file_name} ist aktuell, Build übersprungen')
+        return
+    # Dateien aller Feature-Sets sammeln, bei gleichen Namen gilt die zuletzt gefundene Datei
+    _archive_root = f'{project}-{_project_version}'
+    _members = {}
+    for _fs_name in build_environment[PAR_FEATURE_SETS]:
+        _feature_path = _feature_set_path(_project_root, _fs_name)
+        # Wheel aus dem Cache holen
+        _wheel_file_path = provide_wheel(build_environment, project, _fs_name)
+        _members[os.path.basename(_wheel_file_path)] = _wheel_file_path
+        # Zusatzdaten
+        for _data_path in (os.path.join(_feature_path, 'custom'), os.path.join(_feature_path, 'deb', 'data')):
+            for _path, _dirs, _files in os.walk(_data_path):
                 for _file in _files:
-                    _file_path = os.path.join(_path, _file)
-                    shutil.copy2(str(_file_path), _target_path)
-            _aux_root_path = os.path.join(_feature_path, 'deb', 'data')
-            for _path, _dirs, _files in os.walk(_aux_root_path):
-                for _file in _files:
-                    _file_path = os.path.join(_path, _file)
-                    shutil.copy2(str(_file_path), _target_path)
-        # ZIP-Archiv erzeugen
-        _archive_file_path = os.path.join(_dist_path, _archive_file_name)
-        with zipfile.ZipFile(_archive_file_path, 'w') as _zf:
-            for _path, _dirs, _files in os.walk(_temp_path):
-                _arc_path = _path[len(_temp_path):]
-                _zf.write(_path, _arc_path)
-                for _file in _files:
-                    _zf.write(str(os.path.join(_path, _file)), str(os.path.join(_arc_path, _file)))
-        print(f'ZIP-Archiv {_archive_file_name} erstellt.')
+                    _members[_file] = os.path.join(_path, _file)
+    # ZIP-Archiv direkt aus den Quelldateien erzeugen
+    _fd, _temp_file_path = tempfile.mkstemp(prefix=f'.{_archive_file_name}.', dir=_dist_path)
+    os.close(_fd)
+    try:
+        write_zip(_temp_file_path, [(f'{_archive_root}/{_name}', _members[_name]) for _name in sorted(_members)],
+                  _compression, _mtime, _reproducible)
+        os.chmod(_temp_file_path, 0o644)
+        os.replace(_temp_file_path, _archive_file_path)
+    except (OSError, zipfile.BadZipFile) as _e:
+        raise RuntimeError(f'Konnte ZIP-Archiv {_archive_file_name} nicht erzeugen: {_e}')
+    finally:
+        if os.path.exists(_temp_file_path):
+            os.remove(_temp_file_path)
+    record_build(build_environment, TARGET_CUSTOM, None, _fingerprint, [_archive_file_path])
+    print(f'ZIP-Archiv {_archive_file_name} erstellt.')
+
+
+def _feature_set_path(project_root: str, feature_set: str) -> str:
+    """
+    :param project_root: Root-Verzeichnis des Projekts
+    :param feature_set: Name des Feature-Sets, leer für Projekte ohne Feature-Sets
+    :return: Build-Verzeichnis des Feature-Sets
+    """
+    if len(feature_set) == 0:
+        return os.path.join(project_root, 'build')
+    return os.path.join(project_root, 'build', 'featuresets', str(feature_set))
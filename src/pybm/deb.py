@@ -34,19 +34,31 @@
 
 """
 Erzeugt Debian Installations-Pakete.
+Die Pakete werden vollständig in Python erzeugt: control- und data-Archiv werden per tarfile
+direkt in die ar-Datei des Pakets geschrieben, alle Elemente gehören root:root.
 """
 
+import io
+import lzma
 import os
-import shutil
+import tarfile
 import tempfile
+import time
 
 from pybm import *
-from pybm.util import copy_customizable_file, copy_customizable_file_tree, shell_cmd, wheel_file_name
-from pybm.wheel import build_wheel
+from pybm.archive import tar_file_name, write_tar
+from pybm.delta import create_deltas
+from pybm.manifest import input_fingerprint, is_up_to_date, record_build
+from pybm.trace import traced
+from pybm.util import archive_compression, archive_mtime, copy_customizable_file, remove_stale_wheels, \
+    reproducible_build, reset_directory, stage_customizable_file_tree, staging_path, wheel_file_name
+from pybm.wheel import provide_wheel, wheel_input_paths
 
 
-CONTROL_ARCHIVE_FILE_NAME = 'control.tar.xz'
-DATA_ARCHIVE_FILE_NAME = 'data.tar.xz'
+AR_MAGIC = b'!<arch>\n'
+AR_MEMBER_MAGIC = b'`\n'
+CONTROL_ARCHIVE_BASE_NAME = 'control'
+DATA_ARCHIVE_BASE_NAME = 'data'
 PACKAGE_VERSION_FILE_NAME = 'debian-binary'
 
 
@@ -85,55 +97,165 @@ def build_deb(build_environment: dict, project: str, feature_set: str = None):
     # Variablen-Ersetzungen
     _var_replacements = {'${VERSION}': _project_version, '${PACKAGE_NAME}': _package_name,
                          '${WHEEL_FILE_NAME}': _wheel_file_name, '${INSTALL_PATH}': _install_path}
-    # data-Archiv erzeugen
-    with tempfile.TemporaryDirectory() as _temp_path:
-        # Python-Wheel erzeugen und in /opt/<project> ablegen
-        build_wheel(build_environment, project, feature_set)
-        _target_wheel_path = os.path.join(_temp_path, 'opt', project)
+    _deb_package_name = f'{_package_name}-{_project_version}.deb'.replace('_', '-')
+    _deb_file_path = os.path.join(_dist_path, _deb_package_name)
+    _compression = archive_compression(build_environment, TARGET_DEB)
+    _mtime = archive_mtime(build_environment)
+    _reproducible = reproducible_build(build_environment)
+    # Build überspringen, falls sich seit dem letzten Build nichts geändert hat
+    _input_paths = wheel_input_paths(build_environment, feature_set)
+    _input_paths.append(os.path.join(_feature_path, 'deb'))
+    _fingerprint = input_fingerprint(build_environment, TARGET_DEB, feature_set, _input_paths,
+                                     {'replacements': _var_replacements, 'compression': _compression,
+                                      'mtime': _mtime, 'reproducible': _reproducible,
+                                      'templates': build_environment[PAR_TEMPLATES],
+                                      'delta': build_environment[PAR_DELTA]})
+    if is_up_to_date(build_environment, TARGET_DEB, feature_set, _fingerprint):
+        print(f'Debian Installationspaket {_deb_package_name} ist aktuell, Build übersprungen')
+        return
+    with staging_path(build_environment, TARGET_DEB, feature_set) as _staging_path:
+        _data_path = os.path.join(_staging_path, DATA_ARCHIVE_BASE_NAME)
+        _control_path = os.path.join(_staging_path, CONTROL_ARCHIVE_BASE_NAME)
+        reset_directory(_control_path)
+        # Python-Wheel aus dem Cache in /opt/<project> ablegen
+        _target_wheel_path = os.path.join(_data_path, 'opt', project)
         os.makedirs(_target_wheel_path, mode=0o755, exist_ok=True)
-        shutil.move(os.path.join(_dist_path, _wheel_file_name), _target_wheel_path)
+        remove_stale_wheels(_target_wheel_path, _wheel_file_name)
+        provide_wheel(build_environment, project, feature_set, _target_wheel_path)
         # projektspezifische Daten kopieren
-        copy_customizable_file_tree(_source_data_path, _temp_path, _var_replacements)
-        _data_elements = os.listdir(_temp_path)
-        os.chdir(_temp_path)
-        _cmd = ['tar', '-cJf', DATA_ARCHIVE_FILE_NAME]
-        _cmd.extend(_data_elements)
-        _rc = shell_cmd(_cmd)
-        if _rc != 0:
-            raise RuntimeError(f'Konnte data-Archiv für {project} nicht erzeugen')
-        shutil.copy(os.path.join(_temp_path, DATA_ARCHIVE_FILE_NAME), _dist_path)
-    # control-Archiv erzeugen
-    with tempfile.TemporaryDirectory() as _temp_path:
+        stage_customizable_file_tree(build_environment, _source_data_path, _data_path, _var_replacements)
         # Steuerdateien kopieren
         for _f in os.listdir(_source_control_path):
-            copy_customizable_file(_source_control_path, _f, _temp_path, _var_replacements)
-        # control-Archiv erzeugen
-        _control_elements = os.listdir(_temp_path)
-        os.chdir(_temp_path)
-        _cmd = ['tar', '-cJf', CONTROL_ARCHIVE_FILE_NAME]
-        _cmd.extend(_control_elements)
-        _rc = shell_cmd(_cmd)
-        if _rc != 0:
-            raise RuntimeError(f'Konnte control-Archiv für {project} nicht erzeugen')
-        shutil.copy(os.path.join(_temp_path, CONTROL_ARCHIVE_FILE_NAME), _dist_path)
-    # Debian-Package-Version kopieren
-    shutil.copy(_ver_file, _dist_path)
-    # deb-Datei erzeugen
-    _deb_package_name = f'{_package_name}-{_project_version}.deb'.replace('_', '-')
-    os.chdir(_dist_path)
-    _cmd = ['ar', 'cvr', _deb_package_name, PACKAGE_VERSION_FILE_NAME]
-    _rc = shell_cmd(_cmd)
-    if _rc != 0:
-        raise RuntimeError(f'Konnte Debian-Installationspaket für {project} nicht erzeugen')
-    _cmd = ['ar', 'vr', _deb_package_name, CONTROL_ARCHIVE_FILE_NAME]
-    _rc = shell_cmd(_cmd)
-    if _rc != 0:
-        raise RuntimeError(f'Konnte Debian-Installationspaket für {project} nicht erzeugen')
-    _cmd = ['ar', 'vr', _deb_package_name, DATA_ARCHIVE_FILE_NAME]
-    _rc = shell_cmd(_cmd)
-    if _rc != 0:
-        raise RuntimeError(f'Konnte Debian-Installationspaket für {project} nicht erzeugen')
-    os.remove(os.path.join(_dist_path, CONTROL_ARCHIVE_FILE_NAME))
-    os.remove(os.path.join(_dist_path, DATA_ARCHIVE_FILE_NAME))
-    os.remove(os.path.join(_dist_path, PACKAGE_VERSION_FILE_NAME))
+            copy_customizable_file(_source_control_path, _f, _control_path, _var_replacements)
+        # deb-Datei erzeugen
+        try:
+            write_deb(_deb_file_path, _ver_file, _control_path, _data_path, _compression, _mtime,
+                      _reproducible)
+        except (OSError, tarfile.TarError, lzma.LZMAError) as _e:
+            raise RuntimeError(f'Konnte Debian-Installationspaket für {project} nicht erzeugen: {_e}')
     print(f'Debian Installationspaket {_deb_package_name} erstellt.')
+    _delta_file_paths = create_deltas(build_environment, TARGET_DEB, [_deb_file_path], _compression)
+    record_build(build_environment, TARGET_DEB, feature_set, _fingerprint, [_deb_file_path] + _delta_file_paths)
+
+
+@traced('archive')
+def write_deb(deb_file_path: str, version_file_path: str, control_path: str, data_path: str,
+              compression: dict, mtime: int = None, reproducible: bool = False):
+    """
+    Schreibt ein Debian-Paket. Die Paketdatei wird zunächst unter temporärem Namen im
+    Zielverzeichnis erzeugt und erst nach erfolgreichem Abschluss umbenannt.
+    :param deb_file_path: Name und Pfad der Paketdatei
+    :param version_file_path: Name und Pfad der Datei mit der Version des Paketformats
+    :param control_path: Verzeichnis mit den Steuerdateien
+    :param data_path: Verzeichnis mit den zu installierenden Dateien
+    :param compression: Einstellungen für die Komprimierung von control- und data-Archiv
+    :param mtime: optional Zeitstempel für alle Elemente des Pakets, Default Zeitstempel der Dateien
+    :param reproducible: True, um die Zugriffsrechte in control- und data-Archiv zu vereinheitlichen
+    """
+    _ar_mtime = int(time.time()) if mtime is None else mtime
+    with open(version_file_path, 'rb') as _f:
+        _version_data = _f.read()
+    _target_path = os.path.dirname(os.path.abspath(deb_file_path))
+    _fd, _temp_file_path = tempfile.mkstemp(prefix='.', suffix='.deb', dir=_target_path)
+    try:
+        with os.fdopen(_fd, 'wb') as _deb_file:
+            _ar = ArWriter(_deb_file)
+            _ar.add(PACKAGE_VERSION_FILE_NAME, _version_data, _ar_mtime)
+            with _ar.member(tar_file_name(CONTROL_ARCHIVE_BASE_NAME, compression), _ar_mtime) as _member:
+                write_tar(_member, control_path, compression, mtime=mtime, reproducible=reproducible)
+            with _ar.member(tar_file_name(DATA_ARCHIVE_BASE_NAME, compression), _ar_mtime) as _member:
+                write_tar(_member, data_path, compression, mtime=mtime, reproducible=reproducible)
+        os.chmod(_temp_file_path, 0o644)
+        os.replace(_temp_file_path, deb_file_path)
+    except BaseException:
+        os.remove(_temp_file_path)
+        raise
+
+
+class ArWriter:
+    """
+    Schreibt Archive im Format von ar, wie es für Debian-Pakete verwendet wird.
+    """
+    def __init__(self, file_obj):
+        """
+        Konstruktor, schreibt den Header des Archivs.
+        :param file_obj: zum Schreiben geöffnetes, seekable Datei-Objekt
+        """
+        self.__file = file_obj
+        self.__file.write(AR_MAGIC)
+
+    def add(self, name: str, data: bytes, mtime: int, mode: int = 0o100644):
+        """
+        Fügt ein Element mit bekanntem Inhalt hinzu.
+        :param name: Name des Elements
+        :param data: Inhalt des Elements
+        :param mtime: Zeitstempel des Elements
+        :param mode: Dateimodus des Elements
+        """
+        self.__file.write(_ar_member_header(name, mtime, mode, len(data)))
+        self.__file.write(data)
+        if len(data) % 2 != 0:
+            self.__file.write(b'\n')
+
+    def member(self, name: str, mtime: int, mode: int = 0o100644):
+        """
+        Fügt ein Element hinzu, dessen Inhalt in das zurückgegebene Datei-Objekt gestreamt wird.
+        Die Größe wird nach dem Schließen im Header des Elements nachgetragen.
+        :param name: Name des Elements
+        :param mtime: Zeitstempel des Elements
+        :param mode: Dateimodus des Elements
+        :return: Context-Manager mit dem Datei-Objekt für den Inhalt
+        """
+        return _ArMemberStream(self.__file, name, mtime, mode)
+
+
+class _ArMemberStream(io.RawIOBase):
+    """
+    Datei-Objekt für den Inhalt eines ar-Elements.
+    """
+    def __init__(self, file_obj, name: str, mtime: int, mode: int):
+        """
+        Konstruktor, schreibt einen Header mit vorläufiger Größe.
+        :param file_obj: Datei-Objekt des Archivs
+        :param name: Name des Elements
+        :param mtime: Zeitstempel des Elements
+        :param mode: Dateimodus des Elements
+        """
+        super().__init__()
+        self.__file = file_obj
+        self.__name = name
+        self.__mtime = mtime
+        self.__mode = mode
+        self.__header_pos = file_obj.tell()
+        self.__file.write(_ar_member_header(name, mtime, mode, 0))
+        self.__size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        _n = self.__file.write(data)
+        self.__size += _n
+        return _n
+
+    def close(self):
+        if not self.closed:
+            _end_pos = self.__file.tell()
+            self.__file.seek(self.__header_pos)
+            self.__file.write(_ar_member_header(self.__name, self.__mtime, self.__mode, self.__size))
+            self.__file.seek(_end_pos)
+            if self.__size % 2 != 0:
+                self.__file.write(b'\n')
+        super().close()
+
+
+def _ar_member_header(name: str, mtime: int, mode: int, size: int) -> bytes:
+    """
+    :param name: Name des Elements
+    :param mtime: Zeitstempel des Elements
+    :param mode: Dateimodus des Elements
+    :param size: Größe des Elements in Bytes
+    :return: Header eines ar-Elements, Eigentümer ist immer root
+    """
+    _header = f'{name:<16}{mtime:<12}{0:<6}{0:<6}{mode:<8o}{size:<10}'.encode('ascii')
+    return _header + AR_MEMBER_MAGIC
@@ -0,0 +1,820 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Erzeugt Delta-Pakete zwischen aufeinanderfolgenden Versionen von Debian- und rpm-Paketen und
+setzt aus dem Vorgänger und dem Delta das neue Paket wieder zusammen.
+Wie bei debdelta werden die komprimierten Archive in den Paketen (control- und data-Archiv bzw.
+rpm-Payload) vor dem Vergleich entpackt und beim Zusammensetzen wieder komprimiert. Das ist nur
+möglich, wenn die erneute Komprimierung genau die Daten im Paket ergibt; das wird beim Erzeugen
+des Deltas geprüft, andernfalls wird das Archiv unverändert verglichen.
+Der Vergleich arbeitet wie rsync mit Blöcken fester Größe aus dem Vorgänger, die über eine
+rollierende Adler-32-Prüfsumme im neuen Paket gesucht werden. Vorgänger und neues Paket werden
+dabei nur gestreamt gelesen, im Speicher liegen die Prüfsummen der Blöcke.
+"""
+
+import hashlib
+import io
+import json
+import lzma
+import math
+import os
+import re
+import struct
+import tempfile
+import zlib
+
+from pybm import *
+from pybm.archive import DEFAULT_COMPRESSION_LEVELS, compressed_reader, compressed_writer
+from pybm.trace import traced
+
+
+DELTA_SUFFIX = '.delta'
+DELTA_MAGIC = b'PYBMDLT1'
+
+# Befehle im Datenstrom eines Deltas: Kopie aus dem Vorgänger, neue Daten, Ende eines Abschnitts
+OP_COPY = b'C'
+OP_LITERAL = b'L'
+OP_END = b'E'
+OP_COPY_FORMAT = '>QQ'
+OP_LITERAL_FORMAT = '>I'
+
+# Blockgröße für den Vergleich, bei großen Vorgängern wird sie auf die nächste Zweierpotenz
+# erhöht, mit der höchstens DELTA_MAX_BLOCKS Prüfsummen im Speicher liegen
+DELTA_MIN_BLOCK_SIZE = 1024
+DELTA_MAX_BLOCKS = 1 << 18
+
+# Nach so vielen Bytes ohne Übereinstimmung wird nur noch an jeder SPARSE_SEARCH_STEP-ten Position
+# gesucht; die Schrittweite ist teilerfremd zur Blockgröße, eine längere Übereinstimmung wird deshalb
+# nach wenigen Blöcken wieder gefunden
+DENSE_SEARCH_SIZE = 65536
+SPARSE_SEARCH_STEP = 61
+
+# neue Daten werden in Stücken bis zu dieser Größe in das Delta geschrieben
+LITERAL_CHUNK_SIZE = 65536
+READ_SIZE = 1024 * 1024
+ADLER_MOD = 65521
+
+# Kennungen komprimierter Daten am Anfang eines Archivs
+COMPRESSION_MAGICS = {COMPRESSION_GZIP: b'\x1f\x8b', COMPRESSION_XZ: b'\xfd7zXZ\x00',
+                      COMPRESSION_ZSTD: b'\x28\xb5\x2f\xfd'}
+
+# Dateinamen von Debian- und rpm-Paketen mit Name, Version (ggf. mit Release) und Endung
+PACKAGE_FILE_NAME_PATTERNS = [re.compile(r'^(?P<name>.+)-(?P<version>\d[^-]*)(?P<suffix>\.deb)$'),
+                              re.compile(r'^(?P<name>.+)-(?P<version>\d[^-]*-[^-]+)(?P<suffix>\.\w+\.rpm)$')]
+
+AR_MAGIC = b'!<arch>\n'
+AR_HEADER_SIZE = 60
+RPM_LEAD_MAGIC = b'\xed\xab\xee\xdb'
+RPM_LEAD_SIZE = 96
+RPM_HEADER_MAGIC = b'\x8e\xad\xe8'
+
+KEY_ALGORITHM = 'algorithm'
+KEY_BLOCK_SIZE = 'block-size'
+KEY_EXPANDED_SIZE = 'expanded-size'
+KEY_LEVEL = 'level'
+KEY_NAME = 'name'
+KEY_NEW = 'new'
+KEY_OFFSET = 'offset'
+KEY_OLD = 'old'
+KEY_SEGMENTS = 'segments'
+KEY_SHA256 = 'sha256'
+KEY_SIZE = 'size'
+KEY_SOURCE = 'source'
+
+
+def create_deltas(build_environment: dict, target: str, package_file_paths: list[str],
+                  compression: dict) -> list[str]:
+    """
+    Erzeugt im dist-Verzeichnis Deltas der angegebenen Pakete zu ihren Vorgängern, falls in der
+    pybm-Konfigurationsdatei für das Ziel eingestellt. Vorgänger werden im dist-Verzeichnis und
+    im eingestellten Archiv-Verzeichnis gesucht. Ein Delta, das nicht kleiner als das Paket ist,
+    wird verworfen.
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, deb oder rpm
+    :param package_file_paths: Namen und Pfade der neuen Pakete
+    :param compression: Einstellungen, mit denen die Archive der Pakete komprimiert wurden
+    :return: Namen und Pfade der erzeugten Deltas
+    :raises RuntimeError: falls ein Delta nicht erzeugt werden konnte
+    """
+    _settings = build_environment[PAR_DELTA]
+    if target not in _settings[CFG_TARGETS]:
+        return []
+    _search_paths = [os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist')]
+    if _settings[CFG_ARCHIVE] is not None:
+        _search_paths.append(_settings[CFG_ARCHIVE])
+    _delta_file_paths = []
+    for _package_file_path in package_file_paths:
+        _package_name = os.path.basename(_package_file_path)
+        _previous_file_path = previous_package(_package_file_path, _search_paths)
+        if _previous_file_path is None:
+            print(f'Kein Vorgänger für {_package_name} gefunden, kein Delta erzeugt')
+            continue
+        _delta_file_path = f'{_package_file_path}{DELTA_SUFFIX}'
+        try:
+            _delta_size = write_delta(_previous_file_path, _package_file_path, _delta_file_path, compression)
+        except (OSError, lzma.LZMAError) as _e:
+            raise RuntimeError(f'Konnte Delta für {_package_name} nicht erzeugen: {_e}')
+        _package_size = os.path.getsize(_package_file_path)
+        if _delta_size >= _package_size:
+            os.remove(_delta_file_path)
+            print(f'Delta für {_package_name} ist nicht kleiner als das Paket, verworfen')
+            continue
+        print(f'Delta {os.path.basename(_delta_file_path)} zu {os.path.basename(_previous_file_path)} erstellt, '
+              f'{100 * _delta_size / max(_package_size, 1):.1f}% des Pakets')
+        _delta_file_paths.append(_delta_file_path)
+    return _delta_file_paths
+
+
+def previous_package(package_file_path: str, search_paths: list[str]) -> str | None:
+    """
+    Sucht die höchste Version eines Pakets, die älter als das angegebene Paket ist.
+    :param package_file_path: Name und Pfad des Pakets
+    :param search_paths: Verzeichnisse, in denen gesucht wird
+    :return: Name und Pfad des Vorgängers oder None, falls es keinen gibt
+    """
+    _match = _package_file_name_match(os.path.basename(package_file_path))
+    if _match is None:
+        return None
+    _version_key = _package_version_key(_match.group('version'))
+    _previous = None
+    for _search_path in search_paths:
+        if not os.path.isdir(_search_path):
+            continue
+        for _entry in os.scandir(_search_path):
+            _candidate = _package_file_name_match(_entry.name)
+            if (_candidate is None or _candidate.group('name') != _match.group('name') or
+                    _candidate.group('suffix') != _match.group('suffix') or not _entry.is_file()):
+                continue
+            _candidate_key = _package_version_key(_candidate.group('version'))
+            if _candidate_key < _version_key and (_previous is None or _candidate_key > _previous[0]):
+                _previous = (_candidate_key, _entry.path)
+    return None if _previous is None else _previous[1]
+
+
+@traced('delta')
+def write_delta(old_file_path: str, new_file_path: str, delta_file_path: str, compression: dict) -> int:
+    """
+    Schreibt das Delta zwischen zwei Versionen eines Pakets. Die Datei wird zunächst unter
+    temporärem Namen im Zielverzeichnis erzeugt und erst nach erfolgreichem Abschluss umbenannt.
+    :param old_file_path: Name und Pfad des Vorgängers
+    :param new_file_path: Name und Pfad des neuen Pakets
+    :param delta_file_path: Name und Pfad der Delta-Datei
+    :param compression: Einstellungen, mit denen die Archive im neuen Paket komprimiert wurden
+    :return: Größe des Deltas in Bytes
+    """
+    _target_path = os.path.dirname(os.path.abspath(delta_file_path))
+    with tempfile.TemporaryFile() as _expanded_file:
+        _source = _expand_source(old_file_path, _package_sections(old_file_path), _expanded_file)
+        _old_size = os.path.getsize(old_file_path)
+        _block_size = max(DELTA_MIN_BLOCK_SIZE,
+                          1 << (math.ceil((_old_size + _expanded_file.tell()) / DELTA_MAX_BLOCKS) - 1).bit_length())
+        _index = _block_index(old_file_path, _expanded_file, _block_size)
+        _segments = _target_segments(new_file_path, compression)
+        _header = {KEY_OLD: _file_info(old_file_path), KEY_NEW: _file_info(new_file_path),
+                   KEY_BLOCK_SIZE: _block_size, KEY_SOURCE: _source, KEY_SEGMENTS: _segments}
+        _header_data = json.dumps(_header).encode('utf-8')
+        _fd, _temp_file_path = tempfile.mkstemp(prefix='.', suffix=DELTA_SUFFIX, dir=_target_path)
+        try:
+            with os.fdopen(_fd, 'wb') as _delta_file:
+                _delta_file.write(DELTA_MAGIC)
+                _delta_file.write(struct.pack('>I', len(_header_data)))
+                _delta_file.write(_header_data)
+                with open(new_file_path, 'rb') as _new_file, lzma.LZMAFile(_delta_file, 'wb') as _ops:
+                    _encoder = _DeltaEncoder(_index, _block_size, _ops)
+                    for _segment in _segments:
+                        _reader = _SectionReader(_new_file, _segment[KEY_OFFSET], _segment[KEY_SIZE])
+                        if _segment[KEY_ALGORITHM] is None:
+                            _encoder.encode(_reader)
+                        else:
+                            with compressed_reader(_reader, _segment[KEY_ALGORITHM]) as _expanded:
+                                _encoder.encode(_expanded)
+                _delta_size = _delta_file.tell()
+            os.chmod(_temp_file_path, 0o644)
+            os.replace(_temp_file_path, delta_file_path)
+        except BaseException:
+            os.remove(_temp_file_path)
+            raise
+    return _delta_size
+
+
+def apply_delta(delta_file_path: str, old_file_path: str, target_path: str = None) -> str:
+    """
+    Setzt aus Vorgänger und Delta das neue Paket zusammen und prüft es anhand des im Delta
+    gespeicherten Hashs. Die Paketdatei wird erst nach erfolgreicher Prüfung unter ihrem Namen abgelegt.
+    :param delta_file_path: Name und Pfad der Delta-Datei
+    :param old_file_path: Name und Pfad des Vorgängers
+    :param target_path: optional Zielverzeichnis, Default Verzeichnis des Vorgängers
+    :return: Name und Pfad des neuen Pakets
+    :raises RuntimeError: falls das Delta nicht zum Vorgänger passt oder fehlerhaft ist
+    """
+    _target_path = os.path.dirname(os.path.abspath(old_file_path)) if target_path is None else target_path
+    with open(delta_file_path, 'rb') as _delta_file:
+        _header = _read_header(_delta_file, delta_file_path)
+        _new_file_path = os.path.join(_target_path, os.path.basename(_header[KEY_NEW][KEY_NAME]))
+        _fd, _temp_file_path = tempfile.mkstemp(prefix='.', dir=_target_path)
+        try:
+            with os.fdopen(_fd, 'wb') as _new_file:
+                _reconstruct(_delta_file, delta_file_path, _header, old_file_path, _new_file)
+            os.chmod(_temp_file_path, 0o644)
+            os.replace(_temp_file_path, _new_file_path)
+        except BaseException:
+            os.remove(_temp_file_path)
+            raise
+    return _new_file_path
+
+
+def verify_delta(delta_file_path: str, old_file_path: str) -> str:
+    """
+    Prüft, ob sich aus Vorgänger und Delta das neue Paket zusammensetzen lässt, ohne es zu schreiben.
+    :param delta_file_path: Name und Pfad der Delta-Datei
+    :param old_file_path: Name und Pfad des Vorgängers
+    :return: Dateiname des neuen Pakets
+    :raises RuntimeError: falls das Delta nicht zum Vorgänger passt oder fehlerhaft ist
+    """
+    with open(delta_file_path, 'rb') as _delta_file:
+        _header = _read_header(_delta_file, delta_file_path)
+        _reconstruct(_delta_file, delta_file_path, _header, old_file_path, None)
+    return _header[KEY_NEW][KEY_NAME]
+
+
+def _reconstruct(delta_file, delta_file_path: str, header: dict, old_file_path: str, new_file):
+    """
+    Setzt das neue Paket zusammen und vergleicht Größe und Hash mit den Angaben im Delta.
+    :param delta_file: Delta-Datei, positioniert hinter dem Header
+    :param delta_file_path: Name und Pfad der Delta-Datei für Fehlermeldungen
+    :param header: Header des Deltas
+    :param old_file_path: Name und Pfad des Vorgängers
+    :param new_file: zum Schreiben geöffnete Datei für das neue Paket oder None, um nur zu prüfen
+    :raises RuntimeError: falls das Delta nicht zum Vorgänger passt oder fehlerhaft ist
+    """
+    _delta_name = os.path.basename(delta_file_path)
+    _old_info = _file_info(old_file_path)
+    if _old_info[KEY_SIZE] != header[KEY_OLD][KEY_SIZE] or _old_info[KEY_SHA256] != header[KEY_OLD][KEY_SHA256]:
+        raise RuntimeError(f'Delta {_delta_name} gehört nicht zu {os.path.basename(old_file_path)}, '
+                           f'erwartet wird {header[KEY_OLD][KEY_NAME]}')
+    _output = _HashingWriter(new_file)
+    try:
+        with tempfile.TemporaryFile() as _expanded_file, open(old_file_path, 'rb') as _old_file, \
+                lzma.LZMAFile(delta_file, 'rb') as _ops:
+            _expand_sections(_old_file, header[KEY_SOURCE], _expanded_file)
+            _source = _DeltaSource(_old_file, _old_info[KEY_SIZE], _expanded_file)
+            for _segment in header[KEY_SEGMENTS]:
+                if _segment[KEY_ALGORITHM] is None:
+                    _apply_ops(_ops, _source, _output, _delta_name)
+                    continue
+                _compression = {CFG_ALGORITHM: _segment[KEY_ALGORITHM], CFG_LEVEL: _segment[KEY_LEVEL],
+                                CFG_THREADS: 1}
+                with compressed_writer(_output, _compression) as _writer:
+                    _apply_ops(_ops, _source, _writer, _delta_name)
+    except (OSError, EOFError, lzma.LZMAError, zlib.error, struct.error) as _e:
+        raise RuntimeError(f'Konnte Delta {_delta_name} nicht anwenden: {_e}')
+    if _output.tell() != header[KEY_NEW][KEY_SIZE] or _output.hexdigest() != header[KEY_NEW][KEY_SHA256]:
+        raise RuntimeError(f'Aus Delta {_delta_name} zusammengesetztes Paket {header[KEY_NEW][KEY_NAME]} '
+                           f'stimmt nicht mit dem Original überein')
+
+
+def _apply_ops(ops, source, writer, delta_name: str):
+    """
+    Führt die Befehle eines Abschnitts aus dem Datenstrom des Deltas aus.
+    :param ops: Datenstrom mit den Befehlen
+    :param source: Daten des Vorgängers
+    :param writer: Datei-Objekt für den Inhalt des Abschnitts
+    :param delta_name: Name der Delta-Datei für Fehlermeldungen
+    :raises RuntimeError: falls der Datenstrom fehlerhaft ist
+    """
+    _copy_size = struct.calcsize(OP_COPY_FORMAT)
+    _literal_size = struct.calcsize(OP_LITERAL_FORMAT)
+    while True:
+        _op = ops.read(1)
+        if _op == OP_END:
+            return
+        if _op == OP_COPY:
+            _offset, _length = struct.unpack(OP_COPY_FORMAT, _read_exact(ops, _copy_size, delta_name))
+            source.copy(_offset, _length, writer)
+        elif _op == OP_LITERAL:
+            _length, = struct.unpack(OP_LITERAL_FORMAT, _read_exact(ops, _literal_size, delta_name))
+            writer.write(_read_exact(ops, _length, delta_name))
+        else:
+            raise RuntimeError(f'Delta {delta_name} ist fehlerhaft oder unvollständig')
+
+
+def _read_exact(file_obj, size: int, delta_name: str) -> bytes:
+    """
+    :param file_obj: Datei-Objekt
+    :param size: Anzahl Bytes
+    :param delta_name: Name der Delta-Datei für Fehlermeldungen
+    :return: genau size gelesene Bytes
+    :raises RuntimeError: falls die Datei vorher endet
+    """
+    _data = file_obj.read(size)
+    if len(_data) != size:
+        raise RuntimeError(f'Delta {delta_name} ist unvollständig')
+    return _data
+
+
+def _read_header(delta_file, delta_file_path: str) -> dict:
+    """
+    :param delta_file: zum Lesen geöffnete Delta-Datei
+    :param delta_file_path: Name und Pfad der Delta-Datei für Fehlermeldungen
+    :return: Header des Deltas, die Datei ist danach hinter dem Header positioniert
+    :raises RuntimeError: falls die Datei kein Delta ist
+    """
+    _delta_name = os.path.basename(delta_file_path)
+    if delta_file.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+        raise RuntimeError(f'{_delta_name} ist kein Delta von pybm')
+    _header_size, = struct.unpack('>I', _read_exact(delta_file, 4, _delta_name))
+    try:
+        return json.loads(_read_exact(delta_file, _header_size, _delta_name).decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise RuntimeError(f'Delta {_delta_name} ist fehlerhaft')
+
+
+def _file_info(file_path: str) -> dict:
+    """
+    :param file_path: Name und Pfad einer Datei
+    :return: Dateiname, Größe und SHA256-Hash der Datei
+    """
+    _hash = hashlib.sha256()
+    with open(file_path, 'rb') as _f:
+        while _data := _f.read(READ_SIZE):
+            _hash.update(_data)
+    return {KEY_NAME: os.path.basename(file_path), KEY_SIZE: os.path.getsize(file_path),
+            KEY_SHA256: _hash.hexdigest()}
+
+
+def _package_file_name_match(file_name: str) -> re.Match | None:
+    """
+    :param file_name: Dateiname
+    :return: Treffer mit Name, Version und Endung, falls der Dateiname zu einem Paket gehört
+    """
+    for _pattern in PACKAGE_FILE_NAME_PATTERNS:
+        _match = _pattern.match(file_name)
+        if _match is not None:
+            return _match
+    return None
+
+
+def _package_version_key(version: str) -> list[tuple]:
+    """
+    :param version: Version eines Pakets, z.B. 1.10.2-1
+    :return: Schlüssel, der Versionen numerisch nach ihren Bestandteilen sortiert
+    """
+    return [(0, int(_p), '') if _p.isdigit() else (1, 0, _p) for _p in re.findall(r'\d+|[^\d.\-_~+]+', version)]
+
+
+def _package_sections(file_path: str) -> list[tuple[int, int, str | None]]:
+    """
+    Zerlegt ein Paket in komprimierte Archive und die übrigen Daten. Debian-Pakete enthalten
+    control- und data-Archiv als Elemente einer ar-Datei, bei rpm-Paketen folgt die Payload
+    auf Lead, Signatur und Header.
+    :param file_path: Name und Pfad des Pakets
+    :return: lückenlos aufeinander folgende Abschnitte mit Offset, Größe und Komprimierungsverfahren,
+             None für nicht komprimierte Daten
+    """
+    _file_size = os.path.getsize(file_path)
+    _archives = []
+    with open(file_path, 'rb') as _f:
+        _magic = _f.read(len(AR_MAGIC))
+        if _magic == AR_MAGIC:
+            _pos = len(AR_MAGIC)
+            while _pos + AR_HEADER_SIZE <= _file_size:
+                _f.seek(_pos)
+                _header = _f.read(AR_HEADER_SIZE)
+                try:
+                    _size = int(_header[48:58].decode('ascii'))
+                except (UnicodeDecodeError, ValueError):
+                    break
+                _archives.append((_pos + AR_HEADER_SIZE, min(_size, _file_size - _pos - AR_HEADER_SIZE)))
+                _pos += AR_HEADER_SIZE + _size + _size % 2
+        elif _magic.startswith(RPM_LEAD_MAGIC):
+            _pos = RPM_LEAD_SIZE
+            for _padded in (True, False):
+                _f.seek(_pos)
+                _header = _f.read(16)
+                if len(_header) < 16 or _header[:3] != RPM_HEADER_MAGIC:
+                    return [(0, _file_size, None)]
+                _count, _size = struct.unpack('>II', _header[8:])
+                _pos += 16 + 16 * _count + _size
+                if _padded:
+                    _pos += -_pos % 8
+            _archives.append((_pos, _file_size - _pos))
+        _sections = []
+        _pos = 0
+        for _offset, _size in _archives:
+            _f.seek(_offset)
+            _algorithm = _compression_algorithm(_f.read(8))
+            if _algorithm is None or _size <= 0:
+                continue
+            if _offset > _pos:
+                _sections.append((_pos, _offset - _pos, None))
+            _sections.append((_offset, _size, _algorithm))
+            _pos = _offset + _size
+    if _file_size > _pos:
+        _sections.append((_pos, _file_size - _pos, None))
+    return _sections
+
+
+def _compression_algorithm(data: bytes) -> str | None:
+    """
+    :param data: erste Bytes eines Archivs
+    :return: Komprimierungsverfahren des Archivs oder None, falls es nicht komprimiert ist
+    """
+    for _algorithm, _magic in COMPRESSION_MAGICS.items():
+        if data.startswith(_magic):
+            return _algorithm
+    return None
+
+
+def _expand_source(file_path: str, sections: list[tuple[int, int, str | None]], expanded_file) -> list[dict]:
+    """
+    Entpackt die komprimierten Archive des Vorgängers. Archive, die sich nicht entpacken lassen,
+    werden nur unverändert verglichen.
+    :param file_path: Name und Pfad des Vorgängers
+    :param sections: Abschnitte des Vorgängers
+    :param expanded_file: temporäre Datei, an die die entpackten Daten angehängt werden
+    :return: Beschreibung der entpackten Archive für den Header des Deltas
+    """
+    _source = []
+    with open(file_path, 'rb') as _f:
+        for _offset, _size, _algorithm in sections:
+            if _algorithm is None:
+                continue
+            _start = expanded_file.tell()
+            try:
+                with compressed_reader(_SectionReader(_f, _offset, _size), _algorithm) as _reader:
+                    while _data := _reader.read(READ_SIZE):
+                        expanded_file.write(_data)
+            except (RuntimeError, OSError, EOFError, lzma.LZMAError, zlib.error):
+                expanded_file.seek(_start)
+                expanded_file.truncate()
+                continue
+            _source.append({KEY_OFFSET: _offset, KEY_SIZE: _size, KEY_ALGORITHM: _algorithm,
+                            KEY_EXPANDED_SIZE: expanded_file.tell() - _start})
+    return _source
+
+
+def _expand_sections(old_file, source: list[dict], expanded_file):
+    """
+    Entpackt die im Header des Deltas angegebenen Archive des Vorgängers.
+    :param old_file: zum Lesen geöffneter Vorgänger
+    :param source: Beschreibung der entpackten Archive aus dem Header des Deltas
+    :param expanded_file: temporäre Datei für die entpackten Daten
+    :raises RuntimeError: falls ein Archiv nicht die erwartete Größe hat
+    """
+    for _section in source:
+        _start = expanded_file.tell()
+        _reader = _SectionReader(old_file, _section[KEY_OFFSET], _section[KEY_SIZE])
+        with compressed_reader(_reader, _section[KEY_ALGORITHM]) as _expanded:
+            while _data := _expanded.read(READ_SIZE):
+                expanded_file.write(_data)
+        if expanded_file.tell() - _start != _section[KEY_EXPANDED_SIZE]:
+            raise RuntimeError(f'Archiv an Position {_section[KEY_OFFSET]} im Vorgänger hat nicht '
+                               f'die erwartete Größe')
+
+
+def _block_index(old_file_path: str, expanded_file, block_size: int) -> dict[int, list[tuple[bytes, int]]]:
+    """
+    Ermittelt die Prüfsummen aller Blöcke des Vorgängers und seiner entpackten Archive.
+    :param old_file_path: Name und Pfad des Vorgängers
+    :param expanded_file: temporäre Datei mit den entpackten Archiven
+    :param block_size: Blockgröße
+    :return: Adler-32-Prüfsumme -> Liste aus BLAKE2b-Hash und Offset der Blöcke
+    """
+    _index = {}
+    _base = 0
+    with open(old_file_path, 'rb') as _old_file:
+        for _f in (_old_file, expanded_file):
+            _f.seek(0)
+            _offset = _base
+            while len(_block := _f.read(block_size)) == block_size:
+                _strong = hashlib.blake2b(_block, digest_size=8).digest()
+                _entries = _index.setdefault(zlib.adler32(_block), [])
+                if all(_s != _strong for _s, _o in _entries):
+                    _entries.append((_strong, _offset))
+                _offset += block_size
+            _base = _f.seek(0, os.SEEK_END)
+    return _index
+
+
+def _target_segments(file_path: str, compression: dict) -> list[dict]:
+    """
+    Zerlegt das neue Paket in Abschnitte. Komprimierte Archive werden nur dann entpackt
+    verglichen, wenn ihre erneute Komprimierung genau dieselben Daten ergibt.
+    :param file_path: Name und Pfad des neuen Pakets
+    :param compression: Einstellungen, mit denen die Archive komprimiert wurden
+    :return: Abschnitte mit Offset, Größe, Komprimierungsverfahren und -stufe
+    """
+    _segments = []
+    with open(file_path, 'rb') as _f:
+        for _offset, _size, _algorithm in _package_sections(file_path):
+            _level = None
+            if _algorithm is not None:
+                _level = compression[CFG_LEVEL] if compression[CFG_ALGORITHM] == _algorithm \
+                    else DEFAULT_COMPRESSION_LEVELS[_algorithm]
+                if not _recompresses(_f, _offset, _size, _algorithm, _level):
+                    _algorithm = _level = None
+            if _algorithm is None and len(_segments) > 0 and _segments[-1][KEY_ALGORITHM] is None:
+                _segments[-1][KEY_SIZE] += _size
+                continue
+            _segments.append({KEY_OFFSET: _offset, KEY_SIZE: _size, KEY_ALGORITHM: _algorithm, KEY_LEVEL: _level})
+    return _segments
+
+
+def _recompresses(file_obj, offset: int, size: int, algorithm: str, level: int) -> bool:
+    """
+    :param file_obj: zum Lesen geöffnetes Paket
+    :param offset: Offset des Archivs
+    :param size: Größe des Archivs
+    :param algorithm: Komprimierungsverfahren
+    :param level: Komprimierungsstufe
+    :return: True, falls das entpackte Archiv mit einem Thread komprimiert genau die Daten im Paket ergibt
+    """
+    _original = _HashingWriter(None)
+    _reader = _SectionReader(file_obj, offset, size)
+    while _data := _reader.read(READ_SIZE):
+        _original.write(_data)
+    _recompressed = _HashingWriter(None)
+    try:
+        with compressed_reader(_SectionReader(file_obj, offset, size), algorithm) as _expanded, \
+                compressed_writer(_recompressed, {CFG_ALGORITHM: algorithm, CFG_LEVEL: level,
+                                                  CFG_THREADS: 1}) as _writer:
+            while _data := _expanded.read(READ_SIZE):
+                _writer.write(_data)
+    except (RuntimeError, OSError, EOFError, lzma.LZMAError, zlib.error):
+        return False
+    return _recompressed.tell() == _original.tell() and _recompressed.hexdigest() == _original.hexdigest()
+
+
+class _DeltaEncoder:
+    """
+    Schreibt die Befehle, mit denen Abschnitte des neuen Pakets aus den Blöcken des Vorgängers
+    und neuen Daten zusammengesetzt werden.
+    """
+    def __init__(self, index: dict, block_size: int, ops):
+        """
+        Konstruktor.
+        :param index: Prüfsummen der Blöcke des Vorgängers
+        :param block_size: Blockgröße
+        :param ops: Datei-Objekt für den Datenstrom mit den Befehlen
+        """
+        self.__index = index
+        self.__block_size = block_size
+        self.__ops = ops
+        self.__copy = None
+
+    def encode(self, reader):
+        """
+        Vergleicht einen Abschnitt des neuen Pakets mit dem Vorgänger und schreibt die Befehle
+        für den Abschnitt. Bei übereinstimmenden Blöcken wird um einen Block weitergerückt,
+        sonst um ein Byte mit rollierender Adler-32-Prüfsumme, nach DENSE_SEARCH_SIZE Bytes ohne
+        Übereinstimmung um SPARSE_SEARCH_STEP Bytes.
+        :param reader: Datei-Objekt mit dem Inhalt des Abschnitts
+        """
+        _index = self.__index
+        _block_size = self.__block_size
+        _buf = bytearray()
+        _pos = 0
+        # Beginn der noch nicht geschriebenen neuen Daten im Puffer
+        _literal = 0
+        _unmatched = 0
+        _eof = False
+        _weak = None
+        _a = _b = 0
+        while True:
+            if len(_buf) - _pos <= _block_size and not _eof:
+                if _pos > _literal:
+                    self.__literal(_buf[_literal:_pos])
+                del _buf[:_pos]
+                _pos = _literal = 0
+                _data = reader.read(READ_SIZE)
+                if _data:
+                    _buf += _data
+                else:
+                    _eof = True
+                continue
+            if len(_buf) - _pos < _block_size:
+                break
+            if _weak is None:
+                _weak = zlib.adler32(_buf[_pos:_pos + _block_size])
+                _a = _weak & 0xffff
+                _b = _weak >> 16
+            _entries = _index.get(_weak)
+            if _entries is not None:
+                _offset = self.__match(_entries, _buf[_pos:_pos + _block_size])
+                if _offset is not None:
+                    if _pos > _literal:
+                        self.__literal(_buf[_literal:_pos])
+                    self.__add_copy(_offset)
+                    _pos += _block_size
+                    _literal = _pos
+                    _unmatched = 0
+                    _weak = None
+                    continue
+            _end = min(len(_buf) - _block_size, _literal + LITERAL_CHUNK_SIZE)
+            if _pos >= _end:
+                if _pos - _literal < LITERAL_CHUNK_SIZE:
+                    break
+                self.__literal(_buf[_literal:_pos])
+                _literal = _pos
+                continue
+            if _unmatched >= DENSE_SEARCH_SIZE:
+                _step = min(SPARSE_SEARCH_STEP, _end - _pos)
+                _pos += _step
+                _unmatched += _step
+                _weak = None
+                continue
+            # bis zum nächsten Kandidaten, zum Ende des Puffers oder zur maximalen Größe neuer Daten weiterrücken
+            _end = min(_end, _pos + DENSE_SEARCH_SIZE - _unmatched)
+            _start = _pos
+            while True:
+                _out = _buf[_pos]
+                _a = (_a - _out + _buf[_pos + _block_size]) % ADLER_MOD
+                _b = (_b - _block_size * _out + _a - 1) % ADLER_MOD
+                _weak = (_b << 16) | _a
+                _pos += 1
+                if _pos >= _end or _weak in _index:
+                    break
+            _unmatched += _pos - _start
+        if len(_buf) > _literal:
+            self.__literal(_buf[_literal:])
+        self.__flush_copy()
+        self.__ops.write(OP_END)
+
+    def __match(self, entries: list[tuple[bytes, int]], block: bytes) -> int | None:
+        """
+        :param entries: Blöcke des Vorgängers mit passender Adler-32-Prüfsumme
+        :param block: Block des neuen Pakets
+        :return: Offset des übereinstimmenden Blocks im Vorgänger, bevorzugt direkt hinter der
+                 letzten Kopie, oder None
+        """
+        _strong = hashlib.blake2b(block, digest_size=8).digest()
+        _offsets = [_o for _s, _o in entries if _s == _strong]
+        if len(_offsets) == 0:
+            return None
+        if self.__copy is not None and sum(self.__copy) in _offsets:
+            return sum(self.__copy)
+        return _offsets[0]
+
+    def __add_copy(self, offset: int):
+        """
+        Fügt eine Kopie eines Blocks hinzu, direkt aufeinander folgende Blöcke werden zusammengefasst.
+        :param offset: Offset des Blocks im Vorgänger
+        """
+        if self.__copy is not None and sum(self.__copy) == offset:
+            self.__copy = (self.__copy[0], self.__copy[1] + self.__block_size)
+            return
+        self.__flush_copy()
+        self.__copy = (offset, self.__block_size)
+
+    def __flush_copy(self):
+        """
+        Schreibt die zusammengefasste Kopie.
+        """
+        if self.__copy is not None:
+            self.__ops.write(OP_COPY + struct.pack(OP_COPY_FORMAT, *self.__copy))
+            self.__copy = None
+
+    def __literal(self, data: bytes):
+        """
+        Schreibt neue Daten.
+        :param data: Daten
+        """
+        self.__flush_copy()
+        self.__ops.write(OP_LITERAL + struct.pack(OP_LITERAL_FORMAT, len(data)))
+        self.__ops.write(data)
+
+
+class _DeltaSource:
+    """
+    Daten des Vorgängers, auf die sich die Kopien im Delta beziehen: die Paketdatei selbst,
+    gefolgt von den entpackten Archiven.
+    """
+    def __init__(self, old_file, old_size: int, expanded_file):
+        """
+        Konstruktor.
+        :param old_file: zum Lesen geöffneter Vorgänger
+        :param old_size: Größe des Vorgängers
+        :param expanded_file: temporäre Datei mit den entpackten Archiven
+        """
+        self.__old_file = old_file
+        self.__old_size = old_size
+        self.__expanded_file = expanded_file
+
+    def copy(self, offset: int, length: int, writer):
+        """
+        Kopiert Daten des Vorgängers.
+        :param offset: Offset der Daten
+        :param length: Anzahl Bytes
+        :param writer: Datei-Objekt, in das kopiert wird
+        :raises RuntimeError: falls die Daten außerhalb des Vorgängers liegen
+        """
+        while length > 0:
+            if offset < self.__old_size:
+                _f = self.__old_file
+                _f.seek(offset)
+                _data = _f.read(min(length, READ_SIZE, self.__old_size - offset))
+            else:
+                _f = self.__expanded_file
+                _f.seek(offset - self.__old_size)
+                _data = _f.read(min(length, READ_SIZE))
+            if len(_data) == 0:
+                raise RuntimeError('Kopie im Delta liegt außerhalb des Vorgängers')
+            writer.write(_data)
+            offset += len(_data)
+            length -= len(_data)
+
+
+class _SectionReader(io.RawIOBase):
+    """
+    Datei-Objekt zum Lesen eines Abschnitts einer Datei.
+    """
+    def __init__(self, file_obj, offset: int, size: int):
+        """
+        Konstruktor.
+        :param file_obj: zum Lesen geöffnete Datei
+        :param offset: Offset des Abschnitts
+        :param size: Größe des Abschnitts
+        """
+        super().__init__()
+        self.__file = file_obj
+        self.__pos = offset
+        self.__end = offset + size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        _n = min(len(buffer), self.__end - self.__pos)
+        if _n <= 0:
+            return 0
+        self.__file.seek(self.__pos)
+        _data = self.__file.read(_n)
+        buffer[:len(_data)] = _data
+        self.__pos += len(_data)
+        return len(_data)
+
+
+class _HashingWriter(io.RawIOBase):
+    """
+    Datei-Objekt, das Größe und SHA256-Hash der Daten ermittelt und sie optional weiterreicht.
+    """
+    def __init__(self, file_obj):
+        """
+        Konstruktor.
+        :param file_obj: Datei-Objekt, in das geschrieben wird, oder None
+        """
+        super().__init__()
+        self.__file = file_obj
+        self.__hash = hashlib.sha256()
+        self.__pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__pos
+
+    def write(self, data) -> int:
+        if self.__file is not None:
+            self.__file.write(data)
+        self.__hash.update(data)
+        self.__pos += len(data)
+        return len(data)
+
+    def hexdigest(self) -> str:
+        """
+        :return: Hash der geschriebenen Daten
+        """
+        return self.__hash.hexdigest()
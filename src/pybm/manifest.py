@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Manifest für inkrementelle Builds.
+Für jedes Ziel und Feature-Set wird unter dist/.pybm-cache/manifest festgehalten, mit welchen
+Eingabedateien und Einstellungen die Build-Ergebnisse erzeugt wurden. Sind Eingaben und
+Ergebnisse unverändert, kann der Build übersprungen werden.
+Hashes von Eingabedateien werden nur neu berechnet, wenn sich Größe oder Zeitstempel geändert haben.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from pybm import *
+from pybm.store import store_file
+from pybm.trace import traced
+
+
+MANIFEST_SUBDIR = 'manifest'
+KEY_INPUTS = 'inputs'
+KEY_OUTPUTS = 'outputs'
+KEY_SETTINGS = 'settings'
+IGNORED_DIRS = {'__pycache__'}
+
+
+@traced('manifest')
+def input_fingerprint(build_environment: dict, target: str, feature_set: str | None,
+                      input_paths: list[str], settings: dict) -> dict:
+    """
+    Ermittelt den aktuellen Stand der Eingaben eines Builds.
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, z.B. deb
+    :param feature_set: Name des Feature-Sets oder None
+    :param input_paths: Dateien und Verzeichnisse, von denen das Build-Ergebnis abhängt
+    :param settings: Einstellungen und Variablen-Ersetzungen, von denen das Build-Ergebnis abhängt
+    :return: Stand der Eingaben
+    """
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    _previous_inputs = _load_record(build_environment, target, feature_set).get(KEY_INPUTS, {})
+    _inputs = {}
+    for _path in input_paths:
+        if os.path.isdir(_path):
+            _file_paths = []
+            for _dir, _sub_dirs, _files in os.walk(_path):
+                _sub_dirs[:] = [_d for _d in _sub_dirs if _d not in IGNORED_DIRS]
+                _file_paths.extend(os.path.join(_dir, _f) for _f in _files)
+        elif os.path.isfile(_path):
+            _file_paths = [_path]
+        else:
+            _inputs[os.path.relpath(_path, _project_root)] = None
+            continue
+        for _file_path in _file_paths:
+            _rel_path = os.path.relpath(_file_path, _project_root)
+            _inputs[_rel_path] = file_state(_file_path, _previous_inputs.get(_rel_path))
+    _settings = dict(settings)
+    _settings['pybm'] = VERSION
+    return {KEY_INPUTS: _inputs, KEY_SETTINGS: json.loads(json.dumps(_settings, sort_keys=True))}
+
+
+def is_up_to_date(build_environment: dict, target: str, feature_set: str | None,
+                  fingerprint: dict) -> bool:
+    """
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, z.B. deb
+    :param feature_set: Name des Feature-Sets oder None
+    :param fingerprint: aktueller Stand der Eingaben
+    :return: True, falls Eingaben und Build-Ergebnisse seit dem letzten Build unverändert sind
+    """
+    if build_environment.get(PAR_FORCE_BUILD, False):
+        return False
+    _record = _load_record(build_environment, target, feature_set)
+    if len(_record) == 0 or _record.get(KEY_SETTINGS) != fingerprint[KEY_SETTINGS]:
+        return False
+    if _digests(_record.get(KEY_INPUTS, {})) != _digests(fingerprint[KEY_INPUTS]):
+        return False
+    _outputs = _record.get(KEY_OUTPUTS, {})
+    if len(_outputs) == 0:
+        return False
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    for _rel_path, _state in _outputs.items():
+        _file_path = os.path.join(_project_root, _rel_path)
+        if not os.path.isfile(_file_path) or file_state(_file_path, _state)[2] != _state[2]:
+            return False
+    return True
+
+
+def record_build(build_environment: dict, target: str, feature_set: str | None, fingerprint: dict,
+                 output_paths: list[str]):
+    """
+    Hält Eingaben und Ergebnisse eines erfolgreichen Builds im Manifest fest und legt die
+    Ergebnisse im Store ab.
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, z.B. deb
+    :param feature_set: Name des Feature-Sets oder None
+    :param fingerprint: Stand der Eingaben vor dem Build
+    :param output_paths: Namen und Pfade der erzeugten Dateien
+    """
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    # Ergebnisse im Store ablegen, die Dateien mit den Hashes werden bei jedem Build überschrieben
+    if target != TARGET_SIGN:
+        for _p in output_paths:
+            store_file(_p)
+    _record = dict(fingerprint)
+    _record[KEY_OUTPUTS] = {os.path.relpath(_p, _project_root): file_state(_p, None)
+                            for _p in output_paths}
+    _manifest_path = os.path.join(_project_root, 'dist', CACHE_DIR_NAME, MANIFEST_SUBDIR)
+    os.makedirs(_manifest_path, mode=0o755, exist_ok=True)
+    _fd, _temp_file_path = tempfile.mkstemp(prefix='.', dir=_manifest_path)
+    with os.fdopen(_fd, 'w') as _f:
+        json.dump(_record, _f, indent=1, sort_keys=True)
+    os.replace(_temp_file_path, _record_file_path(build_environment, target, feature_set))
+
+
+def file_state(file_path: str, previous_state: list | None) -> list:
+    """
+    :param file_path: Name und Pfad einer Datei
+    :param previous_state: zuletzt festgehaltener Stand der Datei oder None
+    :return: Größe, Zeitstempel in ns und SHA256-Hash der Datei; der Hash wird aus dem
+             vorherigen Stand übernommen, falls Größe und Zeitstempel unverändert sind
+    """
+    _stat = os.stat(file_path)
+    if previous_state is not None and previous_state[0] == _stat.st_size \
+            and previous_state[1] == _stat.st_mtime_ns:
+        return [_stat.st_size, _stat.st_mtime_ns, previous_state[2]]
+    with open(file_path, 'rb') as _f:
+        _digest = hashlib.file_digest(_f, 'sha256').hexdigest()
+    return [_stat.st_size, _stat.st_mtime_ns, _digest]
+
+
+def _record_file_path(build_environment: dict, target: str, feature_set: str | None) -> str:
+    """
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, z.B. deb
+    :param feature_set: Name des Feature-Sets oder None
+    :return: Name und Pfad der Manifest-Datei für Ziel und Feature-Set
+    """
+    _file_name = f'{target}.json' if not feature_set else f'{target}-{feature_set}.json'
+    return os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist', CACHE_DIR_NAME, MANIFEST_SUBDIR,
+                        _file_name)
+
+
+def _load_record(build_environment: dict, target: str, feature_set: str | None) -> dict:
+    """
+    :param build_environment: Build-Umgebung
+    :param target: Ziel, z.B. deb
+    :param feature_set: Name des Feature-Sets oder None
+    :return: Manifest-Eintrag des letzten Builds, leer falls keiner existiert oder er unlesbar ist
+    """
+    try:
+        with open(_record_file_path(build_environment, target, feature_set), 'r') as _f:
+            return json.load(_f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _digests(inputs: dict) -> dict:
+    """
+    :param inputs: Stand von Eingabedateien
+    :return: Hashes der Eingabedateien, None für nicht existierende Dateien
+    """
+    return {_p: None if _s is None else _s[2] for _p, _s in inputs.items()}
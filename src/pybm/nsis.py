@@ -42,60 +42,81 @@ import shutil
 import tempfile
 
 from pybm import *
-from pybm.util import copy_customizable_file_tree, shell_cmd, wheel_file_name
-from pybm.wheel import build_wheel
+from pybm.store import store_file
+from pybm.util import copy_customizable_file_tree, link_or_copy_file, shell_cmds
+from pybm.wheel import provide_wheel
 
 
 NSIS_COMPILER_EXE = 'makensis.exe'
+NSIS_COMPILER_LINUX = 'makensis'
+NSIS_OUTPUT_SUBDIR = '.output'
 OUTFILE_PATTERN = re.compile(r'OutFile\s+(.*?)$', re.DOTALL|re.MULTILINE|re.IGNORECASE)
 
 
 def build_nsis(build_environment: dict, project: str, _feature_set: str):
     """
     Erzeugt einen Installer für Projekt und Feature in <Projekt-Root>/dist.
+    Die nsi-Dateien werden gleichzeitig übersetzt, jede mit eigenem Ausgabeverzeichnis. Die Anzahl
+    gleichzeitiger Übersetzungen wird in der pybm-Konfigurationsdatei unter [nsis] jobs eingestellt.
     :param build_environment: Build-Environment
     :param project: Name des Projekts
     :param _feature_set: Name des Feature-Sets, immer 'all'
     """
     _project_root = build_environment[PAR_PROJECT_ROOT]
     _dist_path = os.path.join(_project_root, 'dist')
-    _cur_path = os.getcwd()
-    _installer_files = []
+    _jobs = nsis_jobs(build_environment[PAR_PYBM_CONFIG].get(TARGET_NSIS, {}))
     with tempfile.TemporaryDirectory() as _temp_path:
         _temp_data_path = os.path.join(_temp_path, 'data')
         os.mkdir(_temp_data_path, mode=0o755)
-        # Daten für den/die Installer zusammenstellen
+        # Daten für den/die Installer zusammenstellen, das wheel jedes Feature-Sets wird einmal abgelegt
         for _fs_name, _fs_data in build_environment[PAR_FEATURE_SETS].items():
             _project_version = _fs_data[PAR_PROJECT_VERSION]
             _var_replacements = {'${VERSION}': _project_version}
-            # Python-Wheel erzeugen und in data ablegen
-            _wheel_file_name = wheel_file_name(build_environment, _fs_name)
-            build_wheel(build_environment, project, _fs_name)
-            shutil.move(os.path.join(_dist_path, _wheel_file_name), _temp_data_path)
+            # Python-Wheel aus dem Cache in data ablegen
+            provide_wheel(build_environment, project, _fs_name, _temp_data_path)
             # projektspezifische Daten kopieren
             if len(_fs_name) == 0:
                 _source_path = os.path.join(_project_root, 'build', 'nsis')
             else:
                 _source_path = os.path.join(_project_root, 'build', 'featuresets', _fs_name, 'nsis')
-            copy_customizable_file_tree(str(_source_path), _temp_path, _var_replacements)
-        # Installer erstellen
+            copy_customizable_file_tree(str(_source_path), _temp_path, _var_replacements,
+                                        build_environment[PAR_TEMPLATES],
+                                        build_environment[PAR_STAGING_THREADS])
+        # Installer erstellen, OutFile wird in das Ausgabeverzeichnis der nsi-Datei umgelenkt
         _mk_nsis = nsis_compiler()
-        os.chdir(_temp_path)
-        for _f in os.listdir('.'):
+        _installer_files = {}
+        _cmds = []
+        for _f in sorted(os.listdir(_temp_path)):
             if not _f.endswith('.nsi'):
                 continue
-            _installer_files.append(read_outfile(os.path.join(_temp_path, _f)))
-            _cmd = [_mk_nsis, _f]
-            _rc = shell_cmd(_cmd)
-            if _rc != 0:
-                raise RuntimeError(f'Build NSIS-Installer {project} fehlgeschlagen')
-        # Installer ins dist-Verzeichnis kopieren
-        for _f in _installer_files:
-            shutil.copy(os.path.join(_temp_path, _f), _dist_path)
-        os.chdir(_cur_path)
+            _output_path = os.path.join(_temp_path, NSIS_OUTPUT_SUBDIR, _f.removesuffix('.nsi'))
+            os.makedirs(_output_path, mode=0o755)
+            _out_file = read_outfile(os.path.join(_temp_path, _f))
+            _installer_files[_f] = os.path.join(_output_path, os.path.basename(_out_file.replace('\\', '/')))
+            _cmds.append([_mk_nsis, _f, f'-XOutFile "{_installer_files[_f]}"'])
+        _rcs = shell_cmds(_cmds, cwd=_temp_path, prefixes=[f'{TARGET_NSIS} {_f}' for _f in _installer_files],
+                          jobs=_jobs)
+        _failed = [_f for _f, _rc in zip(_installer_files, _rcs) if _rc != 0]
+        if len(_failed) > 0:
+            raise RuntimeError(f'Build NSIS-Installer {project} fehlgeschlagen für {", ".join(_failed)}')
+        # Installer ins dist-Verzeichnis übernehmen und im Store ablegen
+        for _installer_file in _installer_files.values():
+            store_file(link_or_copy_file(_installer_file, _dist_path))
     print(f'NSIS windows-Installer erstellt.')
 
 
+def nsis_jobs(settings: dict) -> int:
+    """
+    :param settings: Abschnitt [nsis] der pybm-Konfigurationsdatei
+    :return: maximale Anzahl gleichzeitig übersetzter nsi-Dateien, Default 0 für eine je CPU
+    :raises RuntimeError: falls die Einstellung ungültig ist
+    """
+    _jobs = settings.get(CFG_JOBS, 0)
+    if not isinstance(_jobs, int) or _jobs < 0:
+        raise RuntimeError(f'Ungültige Anzahl {_jobs} für gleichzeitige NSIS-Builds')
+    return _jobs or os.cpu_count() or 1
+
+
 def read_outfile(nsi_file_path: str) -> str:
     """
     :param nsi_file_path: Name und Pfad der nsi-Datei zum Erzeugen des Installers
@@ -106,21 +127,28 @@ def read_outfile(nsi_file_path: str) -> str:
         _m = OUTFILE_PATTERN.search(_contents)
         if not _m:
             raise RuntimeError(f'OutFile in nsi-Datei {nsi_file_path} nicht gefunden')
-        return _m.group(1).strip()
+        return _m.group(1).strip().strip('"')
 
 
 def nsis_compiler() -> str:
     """
+    Sucht den NSIS-Compiler im Verzeichnis aus Umgebungsvariable PYBM_NSIS_PATH, sonst im PATH
+    (z.B. makensis aus dem Paket nsis unter Linux) und in den Standard-Verzeichnissen unter Windows.
     :return: Executable des NSIS-Compilers inkl. Pfad
     """
     _nsis_path = os.environ.get(ENVA_NSIS_PATH)
     if _nsis_path is not None:
         if not os.path.isdir(_nsis_path):
             raise RuntimeError(f'Umgebungsvariable {ENVA_NSIS_PATH} zeigt auf nicht existierendes Verzeichnis')
-        _nsis_exe = os.path.join(_nsis_path, NSIS_COMPILER_EXE)
-        if not os.path.isfile(_nsis_exe):
-            raise RuntimeError(f'NSIS Compiler {_nsis_exe} nicht gefunden')
-        return _nsis_exe
+        for _name in (NSIS_COMPILER_EXE, NSIS_COMPILER_LINUX):
+            _nsis_exe = os.path.join(_nsis_path, _name)
+            if os.path.isfile(_nsis_exe):
+                return _nsis_exe
+        raise RuntimeError(f'NSIS Compiler in {_nsis_path} nicht gefunden')
+    for _name in (NSIS_COMPILER_LINUX, NSIS_COMPILER_EXE):
+        _nsis_exe = shutil.which(_name)
+        if _nsis_exe is not None:
+            return _nsis_exe
     _nsis_exe = f'C:\\Program Files (x86)\\NSIS\\{NSIS_COMPILER_EXE}'
     if os.path.isfile(_nsis_exe):
         return _nsis_exe
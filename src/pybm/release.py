@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Release-Build mehrerer Ziele eines Projekts in einem Aufruf.
+Die Build-Schritte bilden einen Abhängigkeitsgraphen: zuerst die wheels je Feature-Set, dann die
+Pakete je Ziel und Feature-Set, die Signatur zuletzt. Jeder Schritt läuft in einem eigenen Prozess,
+sobald die Schritte, von denen er abhängt, erfolgreich beendet sind. Die wheels werden über den
+wheel-Cache mit den Paket-Buildern geteilt.
+"""
+
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pybm import *
+from pybm.trace import trace_span
+
+
+# Ziele, die ein Release enthalten kann, in der Reihenfolge der Ausführung
+RELEASE_TARGETS = (TARGET_WHEEL, TARGET_DEB, TARGET_RPM, TARGET_CUSTOM, TARGET_NSIS, TARGET_SIGN)
+
+# Ziele eines Releases, falls keine angegeben werden
+DEFAULT_RELEASE_TARGETS = (TARGET_WHEEL, TARGET_DEB, TARGET_RPM, TARGET_CUSTOM, TARGET_SIGN)
+
+# Ziele, die je Feature-Set gebaut werden
+FEATURE_SET_TARGETS = (TARGET_WHEEL, TARGET_DEB, TARGET_RPM)
+
+# Ziele, die die wheels der Feature-Sets benötigen
+WHEEL_TARGETS = (TARGET_WHEEL, TARGET_DEB, TARGET_RPM, TARGET_CUSTOM, TARGET_NSIS)
+
+# Build-Typ je Ziel
+TARGET_BUILD_TYPES = {TARGET_WHEEL: BUILD_TYPE_WHEEL, TARGET_DEB: BUILD_TYPE_DEB, TARGET_RPM: BUILD_TYPE_RPM,
+                      TARGET_CUSTOM: BUILD_TYPE_CUSTOM, TARGET_NSIS: BUILD_TYPE_NSIS,
+                      TARGET_SIGN: BUILD_TYPE_SIGN}
+
+# Schritt, der das wheel eines Feature-Sets nur im Cache bereitstellt
+STEP_PROVIDE_WHEEL = 'provide_wheel'
+
+# Status der Schritte
+STATUS_FAILED = 'Fehler'
+STATUS_OK = 'ok'
+STATUS_SKIPPED = 'übersprungen'
+
+
+class ReleaseStep:
+    """
+    Schritt eines Release-Builds.
+    """
+
+    def __init__(self, name: str, build_type: str, feature_set: str | None, dependencies: list[str]):
+        """
+        Konstruktor.
+        :param name: Name des Schritts, z.B. deb:core
+        :param build_type: Build-Typ oder STEP_PROVIDE_WHEEL
+        :param feature_set: Name des Feature-Sets, None für Schritte über alle Feature-Sets
+        :param dependencies: Namen der Schritte, die vorher erfolgreich beendet sein müssen
+        """
+        self.name = name
+        self.build_type = build_type
+        self.feature_set = feature_set
+        self.dependencies = dependencies
+
+
+def release_targets(targets: list[str] | None) -> list[str]:
+    """
+    :param targets: Ziele aus der Kommandozeile, None für die Default-Ziele
+    :return: gültige Ziele ohne Duplikate in der Reihenfolge der Ausführung
+    :raises RuntimeError: falls ein Ziel unbekannt ist
+    """
+    if targets is None:
+        return list(DEFAULT_RELEASE_TARGETS)
+    for _target in targets:
+        if _target not in RELEASE_TARGETS:
+            raise RuntimeError(f'Unbekanntes Ziel {_target}, möglich sind {", ".join(RELEASE_TARGETS)}')
+    return [_t for _t in RELEASE_TARGETS if _t in targets]
+
+
+def release_plan(build_environment: dict, targets: list[str]) -> dict[str, ReleaseStep]:
+    """
+    Ermittelt die Schritte eines Release-Builds.
+    :param build_environment: Build-Umgebung
+    :param targets: Ziele des Releases
+    :return: Schritte nach Namen, jeder Schritt steht hinter den Schritten, von denen er abhängt
+    """
+    _steps = {}
+    _feature_sets = [_f if len(_f) > 0 else None for _f in build_environment[PAR_FEATURE_SETS]]
+    _wheel_steps = {}
+    if any(_t in WHEEL_TARGETS for _t in targets):
+        _build_type = BUILD_TYPE_WHEEL if TARGET_WHEEL in targets else STEP_PROVIDE_WHEEL
+        for _fs in _feature_sets:
+            _step = ReleaseStep(_step_name(TARGET_WHEEL, _fs), _build_type, _fs, [])
+            _steps[_step.name] = _step
+            _wheel_steps[_fs] = _step.name
+    for _target in targets:
+        if _target in (TARGET_WHEEL, TARGET_SIGN):
+            continue
+        if _target in FEATURE_SET_TARGETS:
+            for _fs in _feature_sets:
+                _step = ReleaseStep(_step_name(_target, _fs), TARGET_BUILD_TYPES[_target], _fs,
+                                    [_wheel_steps[_fs]])
+                _steps[_step.name] = _step
+        else:
+            _step = ReleaseStep(_target, TARGET_BUILD_TYPES[_target], None, list(_wheel_steps.values()))
+            _steps[_step.name] = _step
+    if TARGET_SIGN in targets:
+        # die Signatur umfasst alle Dateien in dist und kommt deshalb zuletzt
+        _steps[TARGET_SIGN] = ReleaseStep(TARGET_SIGN, BUILD_TYPE_SIGN, None, list(_steps))
+    return _steps
+
+
+def build_release(build_environment: dict, project: str, targets: list[str] | None, jobs: int | None):
+    """
+    Baut die angegebenen Ziele eines Projekts mit bis zu jobs gleichzeitig laufenden Prozessen.
+    Die Ausgaben eines Schritts werden angezeigt, sobald er beendet ist, zum Schluss eine Tabelle
+    mit Status und Laufzeit je Schritt.
+    :param build_environment: Build-Umgebung
+    :param project: Name des Projekts
+    :param targets: Ziele des Releases, None für die Default-Ziele
+    :param jobs: maximale Anzahl gleichzeitiger Prozesse, None für die Anzahl der CPUs
+    :raises RuntimeError: falls ein Ziel unbekannt ist oder mindestens ein Schritt fehlgeschlagen ist
+    """
+    _steps = release_plan(build_environment, release_targets(targets))
+    _jobs = jobs or os.cpu_count() or 1
+    print(f'Erzeuge Release für Projekt {project} mit {len(_steps)} Schritten')
+    _start = time.perf_counter()
+    _results = {}
+    _pending = dict(_steps)
+    _running = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(_jobs, len(_steps)))) as _executor:
+        while len(_pending) > 0 or len(_running) > 0:
+            for _name, _step in list(_pending.items()):
+                _states = [_results.get(_d, (None, None))[0] for _d in _step.dependencies]
+                if any(_s in (STATUS_FAILED, STATUS_SKIPPED) for _s in _states):
+                    _results[_name] = (STATUS_SKIPPED, None)
+                    del _pending[_name]
+                elif all(_s == STATUS_OK for _s in _states):
+                    _future = _executor.submit(run_step, _step.build_type, build_environment, project,
+                                               _step.feature_set)
+                    _running[_future] = _name
+                    del _pending[_name]
+            if len(_running) == 0:
+                break
+            _done, _ = wait(_running, return_when=FIRST_COMPLETED)
+            for _future in _done:
+                _name = _running.pop(_future)
+                _output, _error, _elapsed = _future.result()
+                print(_output, end='')
+                if _error is not None:
+                    print(f'{_name}: {_error}')
+                _results[_name] = (STATUS_OK if _error is None else STATUS_FAILED, _elapsed)
+    print_timing_table(_steps, _results, time.perf_counter() - _start)
+    _failed = [_n for _n, (_status, _) in _results.items() if _status != STATUS_OK]
+    if len(_failed) > 0:
+        raise RuntimeError(f'Release fehlgeschlagen, nicht erstellt: {", ".join(_failed)}')
+
+
+def run_step(build_type: str, build_environment: dict, project: str,
+             feature_set: str | None) -> tuple[str, str | None, float]:
+    """
+    Führt einen Schritt des Release-Builds in einem eigenen Prozess aus, die Ausgaben werden
+    gesammelt und an den Aufrufer zurückgegeben.
+    :param build_type: Build-Typ oder STEP_PROVIDE_WHEEL
+    :param build_environment: Build-Umgebung
+    :param project: Name des Projekts
+    :param feature_set: Name des Feature-Sets oder None
+    :return: gesammelte Ausgaben, Fehlermeldung oder None, Laufzeit in Sekunden
+    """
+    from pybm.cli import run_build
+    _output = io.StringIO()
+    _error = None
+    _start = time.perf_counter()
+    with contextlib.redirect_stdout(_output):
+        try:
+            if build_type == STEP_PROVIDE_WHEEL:
+                from pybm.wheel import provide_wheel
+                with trace_span(f'{build_type} {project} {feature_set or ""}'.rstrip(), 'build',
+                                project=project, build_type=build_type, feature_set=feature_set):
+                    provide_wheel(build_environment, project, feature_set)
+            else:
+                run_build(build_type, build_environment, project, feature_set)
+        except BaseException as _e:
+            _error = str(_e)
+    return _output.getvalue(), _error, time.perf_counter() - _start
+
+
+def print_timing_table(steps: dict[str, ReleaseStep], results: dict, elapsed: float):
+    """
+    Zeigt Status und Laufzeit je Schritt an.
+    :param steps: Schritte nach Namen
+    :param results: Status und Laufzeit in Sekunden je Schritt
+    :param elapsed: Gesamtlaufzeit in Sekunden
+    """
+    _width = max(len(_n) for _n in list(steps) + ['Schritt', 'Gesamt'])
+    print()
+    print(f'{"Schritt":<{_width}}  {"Status":<12} {"Dauer [s]":>10}')
+    for _name in steps:
+        _status, _step_elapsed = results.get(_name, (STATUS_SKIPPED, None))
+        _duration = '-' if _step_elapsed is None else f'{_step_elapsed:.3f}'
+        print(f'{_name:<{_width}}  {_status:<12} {_duration:>10}')
+    print(f'{"Gesamt":<{_width}}  {"":<12} {elapsed:>10.3f}')
+
+
+def _step_name(target: str, feature_set: str | None) -> str:
+    """
+    :param target: Ziel
+    :param feature_set: Name des Feature-Sets oder None
+    :return: Name des Schritts für Ziel und Feature-Set
+    """
+    return target if feature_set is None else f'{target}:{feature_set}'
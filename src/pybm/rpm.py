@@ -34,20 +34,151 @@
 
 """
 Erzeugt RedHat Installations-Pakete.
+Pakete werden standardmäßig direkt in Python geschrieben (Lead, Signatur, Header und cpio-Payload).
+Alternativ wird rpmbuild mit einem eigenen, temporären _topdir je Build aufgerufen.
 """
 
+import glob
+import hashlib
+import io
+import lzma
 import os
-import re
 import shutil
-import subprocess
+import socket
+import stat
+import struct
+import tarfile
 import tempfile
+import time
 
 from pybm import *
-from pybm.util import copy_customizable_file, copy_customizable_file_tree, shell_cmd, wheel_file_name
-from pybm.wheel import build_wheel
+from pybm.archive import compressed_writer, normalized_mode, tar_file_name, write_tar
+from pybm.delta import create_deltas
+from pybm.manifest import input_fingerprint, is_up_to_date, record_build
+from pybm.rpmspec import RPMSENSE_EQUAL, RPMSENSE_LESS, RpmSpec, parse_spec
+from pybm.trace import traced
+from pybm.util import STAGING_STATE_SUFFIX, archive_compression, archive_mtime, copy_customizable_file, \
+    link_or_copy_file, remove_stale_wheels, reproducible_build, reset_directory, shell_cmd, \
+    stage_customizable_file_tree, staging_path, wheel_file_name
+from pybm.wheel import provide_wheel, wheel_input_paths
 
 
 RPM_WORK_SUBDIRS = ['BUILD', 'RPMS', 'SOURCES', 'SPECS', 'SRPMS', 'tmp']
+STAGING_SUBDIR = 'stage'
+
+# I/O-Typen von rpm für die Komprimierungsverfahren
+RPM_PAYLOAD_IO = {COMPRESSION_GZIP: 'gzdio', COMPRESSION_NONE: 'ufdio', COMPRESSION_XZ: 'xzdio',
+                  COMPRESSION_ZSTD: 'zstdio'}
+
+# Namen der Komprimierungsverfahren im Header, None für unkomprimierte Payload
+RPM_PAYLOAD_COMPRESSORS = {COMPRESSION_GZIP: 'gzip', COMPRESSION_NONE: None, COMPRESSION_XZ: 'xz',
+                           COMPRESSION_ZSTD: 'zstd'}
+
+# Lead
+RPM_LEAD_MAGIC = b'\xed\xab\xee\xdb'
+RPM_LEAD_FORMAT = '>4sBBhh66shh16x'
+RPM_OS_LINUX = 1
+RPM_SIGTYPE_HEADERSIG = 5
+
+# Header
+RPM_HEADER_MAGIC = b'\x8e\xad\xe8\x01\x00\x00\x00\x00'
+RPM_INT16_TYPE = 3
+RPM_INT32_TYPE = 4
+RPM_STRING_TYPE = 6
+RPM_BIN_TYPE = 7
+RPM_STRING_ARRAY_TYPE = 8
+RPM_I18NSTRING_TYPE = 9
+RPM_TYPE_ALIGNMENT = {RPM_INT16_TYPE: 2, RPM_INT32_TYPE: 4}
+REGION_TAG_COUNT = 16
+
+# Tags der Signatur
+RPMTAG_HEADERSIGNATURES = 62
+RPMSIGTAG_SHA1 = 269
+RPMSIGTAG_SHA256 = 273
+RPMSIGTAG_SIZE = 1000
+RPMSIGTAG_MD5 = 1004
+RPMSIGTAG_PAYLOADSIZE = 1007
+
+# Tags des Headers
+RPMTAG_HEADERIMMUTABLE = 63
+RPMTAG_HEADERI18NTABLE = 100
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_EPOCH = 1003
+RPMTAG_SUMMARY = 1004
+RPMTAG_DESCRIPTION = 1005
+RPMTAG_BUILDTIME = 1006
+RPMTAG_BUILDHOST = 1007
+RPMTAG_SIZE = 1009
+RPMTAG_LICENSE = 1014
+RPMTAG_GROUP = 1016
+RPMTAG_URL = 1020
+RPMTAG_OS = 1021
+RPMTAG_ARCH = 1022
+RPMTAG_FILESIZES = 1028
+RPMTAG_FILEMODES = 1030
+RPMTAG_FILERDEVS = 1033
+RPMTAG_FILEMTIMES = 1034
+RPMTAG_FILEDIGESTS = 1035
+RPMTAG_FILELINKTOS = 1036
+RPMTAG_FILEFLAGS = 1037
+RPMTAG_FILEUSERNAME = 1039
+RPMTAG_FILEGROUPNAME = 1040
+RPMTAG_SOURCERPM = 1044
+RPMTAG_FILEVERIFYFLAGS = 1045
+RPMTAG_PROVIDENAME = 1047
+RPMTAG_REQUIREFLAGS = 1048
+RPMTAG_REQUIRENAME = 1049
+RPMTAG_REQUIREVERSION = 1050
+RPMTAG_CONFLICTFLAGS = 1053
+RPMTAG_CONFLICTNAME = 1054
+RPMTAG_CONFLICTVERSION = 1055
+RPMTAG_RPMVERSION = 1064
+RPMTAG_OBSOLETENAME = 1090
+RPMTAG_FILEDEVICES = 1095
+RPMTAG_FILEINODES = 1096
+RPMTAG_FILELANGS = 1097
+RPMTAG_PROVIDEFLAGS = 1112
+RPMTAG_PROVIDEVERSION = 1113
+RPMTAG_OBSOLETEFLAGS = 1114
+RPMTAG_OBSOLETEVERSION = 1115
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_BASENAMES = 1117
+RPMTAG_DIRNAMES = 1118
+RPMTAG_PAYLOADFORMAT = 1124
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+RPMTAG_PAYLOADFLAGS = 1126
+RPMTAG_FILEDIGESTALGO = 5011
+RPMTAG_ENCODING = 5062
+RPMTAG_PAYLOADDIGEST = 5092
+RPMTAG_PAYLOADDIGESTALGO = 5093
+
+# Tags für Scriptlets, jeweils Skript und Interpreter
+RPM_SCRIPT_TAGS = {'pre': (1023, 1085), 'post': (1024, 1086), 'preun': (1025, 1087), 'postun': (1026, 1088),
+                   'pretrans': (1151, 1153), 'posttrans': (1152, 1154)}
+
+# Tags für Abhängigkeiten, jeweils Name, Flags und Version
+RPM_DEPENDENCY_TAGS = {'conflicts': (RPMTAG_CONFLICTNAME, RPMTAG_CONFLICTFLAGS, RPMTAG_CONFLICTVERSION),
+                       'obsoletes': (RPMTAG_OBSOLETENAME, RPMTAG_OBSOLETEFLAGS, RPMTAG_OBSOLETEVERSION),
+                       'provides': (RPMTAG_PROVIDENAME, RPMTAG_PROVIDEFLAGS, RPMTAG_PROVIDEVERSION),
+                       'requires': (RPMTAG_REQUIRENAME, RPMTAG_REQUIREFLAGS, RPMTAG_REQUIREVERSION)}
+
+# Flags für Abhängigkeiten von Interpretern der Scriptlets und von Fähigkeiten von rpm
+RPMSENSE_INTERP = 1 << 8
+RPMSENSE_SCRIPTS = {'pre': 1 << 9, 'post': 1 << 10, 'preun': 1 << 11, 'postun': 1 << 12}
+RPMSENSE_RPMLIB = 1 << 24
+RPMLIB_REQUIREMENTS = [('rpmlib(CompressedFileNames)', '3.0.4-1'), ('rpmlib(FileDigests)', '4.6.0-1'),
+                       ('rpmlib(PayloadFilesHavePrefix)', '4.0-1')]
+RPMLIB_PAYLOAD_REQUIREMENTS = {COMPRESSION_XZ: ('rpmlib(PayloadIsXz)', '5.2-1'),
+                               COMPRESSION_ZSTD: ('rpmlib(PayloadIsZstd)', '5.4.18-1')}
+
+# Hash-Verfahren SHA256 für Dateien und Payload
+PGPHASHALGO_SHA256 = 8
+
+CPIO_MAGIC = b'070701'
+CPIO_TRAILER = 'TRAILER!!!'
+COPY_BUFFER_SIZE = 1024 * 1024
 
 
 def build_rpm(build_environment: dict, project: str, feature_set: str = None):
@@ -77,75 +208,492 @@ def build_rpm(build_environment: dict, project: str, feature_set: str = None):
                                        'SPECS')
     _project_version = _feature_data[PAR_PROJECT_VERSION]
     _package_name = _feature_data[PAR_PACKAGE_NAME]
-    _assembly_path = rpm_top_dir()
+    _backend = build_environment[PAR_RPM_BACKEND]
     _project_dir = f'{_package_name}-{_project_version}'
     _rpm_proj_dir = f'{project}-{_project_version}-root'
-    _rpm_build_root = os.path.join(_assembly_path, 'tmp', _rpm_proj_dir)
-    # Variablen-Ersetzungen
+    _compression = archive_compression(build_environment, TARGET_RPM)
+    _mtime = archive_mtime(build_environment)
+    _reproducible = reproducible_build(build_environment)
+    _archive_file_name = tar_file_name(_project_dir, _compression)
+    # Variablen-Ersetzungen, ${RPM_BUILD_ROOT} wird erst im Arbeitsverzeichnis des Builds festgelegt
     _var_replacements = {'${VERSION}': _project_version, '${PACKAGE_NAME}': _package_name,
                          '${WHEEL_FILE_NAME}': _wheel_file_name, '${INSTALL_PATH}': _install_path,
-                         '${RPM_BUILD_ROOT}': _rpm_build_root}
-    # Arbeitsverzeichnis leeren
-    shutil.rmtree(_assembly_path)
-    os.mkdir(_assembly_path)
-    for _sub_dir in RPM_WORK_SUBDIRS:
-        os.mkdir(os.path.join(_assembly_path, _sub_dir))
-    # Archiv mit den Projekt-Dateien erzeugen
-    with tempfile.TemporaryDirectory() as _temp_path:
-        _archive_project_root = os.path.join(_temp_path, _project_dir)
-        _archive_file_name = f'{_project_dir}.tar.gz'
-        os.mkdir(_archive_project_root, mode=0o755)
-        # Python-Wheel erzeugen und in /opt/<project> ablegen
-        build_wheel(build_environment, project, feature_set)
-        _target_wheel_path = os.path.join(_archive_project_root, 'opt', project)
+                         '${SOURCE_ARCHIVE}': _archive_file_name}
+    # Build überspringen, falls sich seit dem letzten Build nichts geändert hat
+    _input_paths = wheel_input_paths(build_environment, feature_set)
+    _input_paths.append(os.path.join(_feature_path, 'rpm'))
+    _fingerprint = input_fingerprint(build_environment, TARGET_RPM, feature_set, _input_paths,
+                                     {'replacements': _var_replacements, 'compression': _compression,
+                                      'templates': build_environment[PAR_TEMPLATES], 'backend': _backend,
+                                      'mtime': _mtime, 'reproducible': _reproducible,
+                                      'delta': build_environment[PAR_DELTA]})
+    if is_up_to_date(build_environment, TARGET_RPM, feature_set, _fingerprint):
+        print(f'rpm Installationspaket für {_project_dir} ist aktuell, Build übersprungen')
+        return
+    # eigenes Arbeitsverzeichnis je Build, damit mehrere Builds gleichzeitig laufen können; im Watch-Modus
+    # bleibt es erhalten, damit ${RPM_BUILD_ROOT} gleich bleibt und die Dateien abgeglichen werden können
+    with staging_path(build_environment, TARGET_RPM, feature_set, 'pybm-rpm-') as _top_dir:
+        for _sub_dir in RPM_WORK_SUBDIRS:
+            reset_directory(os.path.join(_top_dir, _sub_dir))
+        _var_replacements['${RPM_BUILD_ROOT}'] = os.path.join(_top_dir, 'tmp', _rpm_proj_dir)
+        # Dateien des Pakets zusammenstellen, Dateien früherer Versionen entfernen
+        _staging_root = os.path.join(_top_dir, STAGING_SUBDIR, _project_dir)
+        os.makedirs(_staging_root, mode=0o755, exist_ok=True)
+        for _entry in os.scandir(os.path.join(_top_dir, STAGING_SUBDIR)):
+            if _entry.name in (_project_dir, f'{_project_dir}{STAGING_STATE_SUFFIX}'):
+                continue
+            if _entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(_entry.path)
+            else:
+                os.remove(_entry.path)
+        # Python-Wheel aus dem Cache in /opt/<project> ablegen
+        _target_wheel_path = os.path.join(_staging_root, 'opt', project)
         os.makedirs(_target_wheel_path, mode=0o755, exist_ok=True)
-        shutil.move(os.path.join(_dist_path, _wheel_file_name), _target_wheel_path)
+        remove_stale_wheels(_target_wheel_path, _wheel_file_name)
+        provide_wheel(build_environment, project, feature_set, _target_wheel_path)
         # projektspezifische Daten kopieren
-        copy_customizable_file_tree(_source_data_path, _archive_project_root, _var_replacements)
-        os.chdir(_temp_path)
-        _cmd = ['tar', '-czf', _archive_file_name, _project_dir]
-        _rc = shell_cmd(_cmd)
-        if _rc != 0:
-            raise RuntimeError(f'Konnte Archiv für {project} nicht erzeugen')
-        _archive_target_path = os.path.join(_assembly_path, 'SOURCES')
-        shutil.copy(os.path.join(_temp_path, _archive_file_name), _archive_target_path)
-    # Steuerdateien kopieren
-    _spec_target_path = os.path.join(_assembly_path, 'SPECS')
-    for _f in os.listdir(_spec_data_path):
-        copy_customizable_file(_spec_data_path, _f, _spec_target_path, _var_replacements)
-    # rpm-Paket erstellen
-    _cmd = ['rpmbuild', '-bb', os.path.join(_spec_target_path, f'{_package_name}.spec')]
-    _rc = shell_cmd(_cmd)
-    if _rc != 0:
-        raise RuntimeError(f'Build rpm-Paket {project} fehlgeschlagen')
-    _rpms_path = os.path.join(_assembly_path, 'RPMS', 'noarch')
-    _dist_path = os.path.join(_project_root, 'dist')
-    for _f in os.listdir(_rpms_path):
-        shutil.copy(os.path.join(_rpms_path, _f), _dist_path)
+        stage_customizable_file_tree(build_environment, _source_data_path, _staging_root, _var_replacements)
+        # Steuerdateien kopieren
+        _spec_target_path = os.path.join(_top_dir, 'SPECS')
+        for _f in os.listdir(_spec_data_path):
+            copy_customizable_file(_spec_data_path, _f, _spec_target_path, _var_replacements)
+        _spec_file_path = os.path.join(_spec_target_path, f'{_package_name}.spec')
+        # rpm-Paket erstellen
+        if _backend == RPM_BACKEND_NATIVE:
+            _spec = parse_spec(_spec_file_path)
+            _rpm_file_path = os.path.join(_dist_path, rpm_file_name(_spec))
+            try:
+                write_rpm(_rpm_file_path, _spec, _staging_root, _compression, _mtime, _reproducible)
+            except (OSError, lzma.LZMAError) as _e:
+                raise RuntimeError(f'Konnte rpm-Paket für {project} nicht erzeugen: {_e}')
+            _rpm_file_paths = [_rpm_file_path]
+        else:
+            _rpm_file_paths = _run_rpmbuild(_top_dir, _staging_root, _spec_file_path, _archive_file_name,
+                                            _compression, _dist_path, _mtime, _reproducible)
     print(f'rpm Installationspaket erstellt.')
+    _delta_file_paths = create_deltas(build_environment, TARGET_RPM, _rpm_file_paths, _compression)
+    record_build(build_environment, TARGET_RPM, feature_set, _fingerprint, _rpm_file_paths + _delta_file_paths)
 
 
-def rpm_top_dir() -> str:
+@traced('archive')
+def _run_rpmbuild(top_dir: str, staging_root: str, spec_file_path: str, archive_file_name: str,
+                  compression: dict, dist_path: str, mtime: int | None, reproducible: bool) -> list[str]:
     """
-    :return: Root-Verzeichnis für rpmbuild
+    Erzeugt ein rpm-Paket mit rpmbuild. Bei reproduzierbaren Builds werden Build-Zeit und
+    Zeitstempel der Dateien über SOURCE_DATE_EPOCH und die entsprechenden Makros festgelegt.
+    :param top_dir: Arbeitsverzeichnis des Builds, wird als _topdir an rpmbuild übergeben
+    :param staging_root: Verzeichnis mit den Dateien des Pakets
+    :param spec_file_path: Name und Pfad der spec-Datei
+    :param archive_file_name: Name des Quellarchivs in SOURCES
+    :param compression: Einstellungen für die Komprimierung
+    :param dist_path: dist-Verzeichnis des Projekts
+    :param mtime: Zeitstempel für alle Dateien und den Build oder None
+    :param reproducible: True für einen reproduzierbaren Build
+    :return: Namen und Pfade der erzeugten rpm-Pakete im dist-Verzeichnis
+    :raises RuntimeError: falls rpmbuild fehlschlägt
     """
-    _top_dir = os.path.expanduser('~/rpmbuild')
+    _archive_file_path = os.path.join(top_dir, 'SOURCES', archive_file_name)
     try:
-        with open(os.path.expanduser('~/.rpmmacros'), 'r') as _f:
-            _contents = _f.read().split(os.linesep)
-            for _line in _contents:
-                if _line.startswith('%_topdir '):
-                    _value = _line[9:].strip()
-                    _cmds = re.findall(r'(%\(.*\))', _value)
-                    for _cmd in _cmds:
-                        _os_cmd = _cmd[2:-1]
-                        _res = subprocess.run([_os_cmd], shell=True, capture_output=True,
-                                              encoding='utf-8')
-                        if _res.returncode != 0:
-                            raise RuntimeError()
-                        _value = _value.replace(_cmd, _res.stdout.strip())
-                    _top_dir = _value
-                    break
-    except (OSError, RuntimeError) as _e:
-        print(_e)
-    return _top_dir
+        with open(_archive_file_path, 'wb') as _archive_file:
+            write_tar(_archive_file, staging_root, compression, os.path.basename(staging_root), mtime, reproducible)
+    except (OSError, tarfile.TarError, lzma.LZMAError) as _e:
+        raise RuntimeError(f'Konnte Archiv {archive_file_name} nicht erzeugen: {_e}')
+    _cmd = ['rpmbuild', '-bb', '--define', f'_topdir {top_dir}',
+            '--define', f'_binary_payload {binary_payload(compression)}']
+    _env = None
+    if reproducible:
+        _cmd.extend(['--define', f'_buildhost {REPRODUCIBLE_BUILD_HOST}',
+                     '--define', 'use_source_date_epoch_as_buildtime 1',
+                     '--define', 'clamp_mtime_to_source_epoch 1'])
+        _env = {ENVA_SOURCE_DATE_EPOCH: str(mtime)}
+    _cmd.append(spec_file_path)
+    _rc = shell_cmd(_cmd, prefix=TARGET_RPM, env=_env)
+    if _rc != 0:
+        raise RuntimeError(f'Build rpm-Paket {os.path.basename(spec_file_path)} fehlgeschlagen')
+    _rpms_path = os.path.join(top_dir, 'RPMS', 'noarch')
+    _rpm_file_paths = []
+    for _f in os.listdir(_rpms_path):
+        _rpm_file_paths.append(link_or_copy_file(os.path.join(_rpms_path, _f), dist_path))
+    return _rpm_file_paths
+
+
+def binary_payload(compression: dict) -> str:
+    """
+    :param compression: Einstellungen für die Komprimierung
+    :return: Wert für das rpm-Makro _binary_payload
+    """
+    _algorithm = compression[CFG_ALGORITHM]
+    _threads = compression[CFG_THREADS]
+    _io = RPM_PAYLOAD_IO[_algorithm]
+    if _algorithm == COMPRESSION_NONE:
+        return f'w.{_io}'
+    _threads_spec = '' if _threads == 1 else f'T{_threads}'
+    return f'w{compression[CFG_LEVEL]}{_threads_spec}.{_io}'
+
+
+def rpm_file_name(spec: RpmSpec) -> str:
+    """
+    :param spec: Inhalt der spec-Datei
+    :return: Name der rpm-Datei für ein noarch-Paket
+    """
+    return f'{spec.name()}-{spec.version()}-{spec.release()}.noarch.rpm'
+
+
+@traced('archive')
+def write_rpm(rpm_file_path: str, spec: RpmSpec, root_path: str, compression: dict, mtime: int = None,
+              reproducible: bool = False):
+    """
+    Schreibt ein noarch rpm-Paket mit den in der spec-Datei unter %files aufgeführten Dateien.
+    Die Payload wird in einem Durchgang über die Dateien erzeugt, dabei werden auch die Hashes
+    der Dateien berechnet. Die Paketdatei wird zunächst unter temporärem Namen im Zielverzeichnis
+    erzeugt und erst nach erfolgreichem Abschluss umbenannt.
+    :param rpm_file_path: Name und Pfad der Paketdatei
+    :param spec: Inhalt der spec-Datei
+    :param root_path: Verzeichnis, das dem Root-Verzeichnis der Zielmaschine entspricht
+    :param compression: Einstellungen für die Komprimierung der Payload
+    :param mtime: optional Zeitstempel für alle Dateien und den Build, Default Zeitstempel der Dateien
+                  bzw. aktuelle Zeit
+    :param reproducible: True, um Zugriffsrechte ohne %attr zu vereinheitlichen und einen festen
+                         Build-Host einzutragen
+    :raises RuntimeError: falls eine Datei aus %files fehlt oder das Paket zu groß ist
+    """
+    _files = _file_entries(spec, root_path, mtime, reproducible)
+    _target_path = os.path.dirname(rpm_file_path)
+    with tempfile.TemporaryFile(dir=_target_path) as _payload_file:
+        _payload = _DigestWriter(_payload_file, hashlib.sha256())
+        with compressed_writer(_payload, compression) as _writer:
+            _payload_size = _write_cpio(_writer, _files)
+        if _payload_size > 0xFFFFFFFF or _payload.tell() > 0xFFFFFFFF:
+            raise RuntimeError(f'rpm-Paket {os.path.basename(rpm_file_path)} ist größer als 4 GiB')
+        _header = _header_blob(_main_header_entries(spec, _files, compression, _payload.hexdigest(), mtime,
+                                                    reproducible),
+                               RPMTAG_HEADERIMMUTABLE)
+        _signature = _signature_blob(_header, bytes(16), _payload.tell(), _payload_size)
+        _fd, _temp_file_path = tempfile.mkstemp(prefix=f'.{os.path.basename(rpm_file_path)}.', dir=_target_path)
+        try:
+            with os.fdopen(_fd, 'wb') as _f:
+                _f.write(_lead(spec))
+                _f.write(_signature)
+                _f.write(_header)
+                _md5 = hashlib.md5(_header)
+                _payload_file.seek(0)
+                while _data := _payload_file.read(COPY_BUFFER_SIZE):
+                    _md5.update(_data)
+                    _f.write(_data)
+                # Signatur mit MD5-Hash über Header und Payload, ihre Größe bleibt unverändert
+                _f.seek(struct.calcsize(RPM_LEAD_FORMAT))
+                _f.write(_signature_blob(_header, _md5.digest(), _payload.tell(), _payload_size))
+            os.chmod(_temp_file_path, 0o644)
+            os.replace(_temp_file_path, rpm_file_path)
+        finally:
+            if os.path.exists(_temp_file_path):
+                os.remove(_temp_file_path)
+
+
+def _file_entries(spec: RpmSpec, root_path: str, mtime: int | None, reproducible: bool) -> list[dict]:
+    """
+    Ermittelt die Dateien des Pakets. Verzeichnisse ohne %dir werden mit ihrem gesamten Inhalt
+    übernommen, Pfade können Platzhalter wie * enthalten.
+    :param spec: Inhalt der spec-Datei
+    :param root_path: Verzeichnis, das dem Root-Verzeichnis der Zielmaschine entspricht
+    :param mtime: Zeitstempel für alle Dateien oder None für die Zeitstempel der Dateien
+    :param reproducible: True, um Zugriffsrechte ohne %attr zu vereinheitlichen
+    :return: Dateien nach Pfad sortiert mit Pfad im Paket und im Dateisystem, Zugriffsrechten,
+             Eigentümer, Gruppe, Flags, Größe und Zeitstempel
+    :raises RuntimeError: falls eine Datei aus %files fehlt
+    """
+    _entries = {}
+    for _path, _flags, _is_dir, _mode, _user, _group in spec.files:
+        _source_paths = sorted(glob.glob(glob.escape(root_path) + _path)) if glob.has_magic(_path) \
+            else [root_path + _path]
+        _source_paths = [_p for _p in _source_paths if os.path.lexists(_p)]
+        if len(_source_paths) == 0:
+            raise RuntimeError(f'Datei {_path} aus %files nicht gefunden')
+        for _source_path in _source_paths:
+            _tree = [_source_path]
+            if not _is_dir and os.path.isdir(_source_path) and not os.path.islink(_source_path):
+                for _dir, _sub_dirs, _file_names in os.walk(_source_path):
+                    _tree.extend(os.path.join(_dir, _n) for _n in _sub_dirs + _file_names)
+            for _p in _tree:
+                _rpm_path = '/' + os.path.relpath(_p, root_path).replace(os.sep, '/')
+                if _rpm_path not in _entries:
+                    _entries[_rpm_path] = _file_entry(_rpm_path, _p, _flags, _mode, _user, _group, mtime,
+                                                             reproducible)
+    return [_entries[_p] for _p in sorted(_entries)]
+
+
+def _file_entry(rpm_path: str, source_path: str, flags: int, mode: int | None, user: str | None,
+                group: str | None, mtime: int | None, reproducible: bool) -> dict:
+    """
+    :param rpm_path: Pfad der Datei auf der Zielmaschine
+    :param source_path: Pfad der Datei im Dateisystem
+    :param flags: Flags aus %files
+    :param mode: Zugriffsrechte aus %attr oder None
+    :param user: Eigentümer aus %attr oder None für root
+    :param group: Gruppe aus %attr oder None für root
+    :param mtime: Zeitstempel oder None für den Zeitstempel der Datei
+    :param reproducible: True, um Zugriffsrechte ohne %attr zu vereinheitlichen
+    :return: Daten der Datei für Header und Payload
+    """
+    _stat = os.lstat(source_path)
+    if mode is not None:
+        _mode = stat.S_IFMT(_stat.st_mode) | mode
+    else:
+        _mode = normalized_mode(_stat.st_mode) if reproducible else _stat.st_mode
+    _link_to = os.readlink(source_path) if stat.S_ISLNK(_stat.st_mode) else ''
+    if stat.S_ISREG(_stat.st_mode):
+        _size = _stat.st_size
+    else:
+        _size = len(_link_to.encode('utf-8'))
+    return {'path': rpm_path, 'source': source_path, 'mode': _mode, 'user': user or 'root',
+            'group': group or 'root', 'flags': flags, 'size': _size, 'link_to': _link_to,
+            'mtime': int(_stat.st_mtime) if mtime is None else mtime, 'digest': ''}
+
+
+def _write_cpio(writer, files: list[dict]) -> int:
+    """
+    Schreibt die Dateien als cpio-Archiv im newc-Format und berechnet dabei die SHA256-Hashes
+    der regulären Dateien.
+    :param writer: Datei-Objekt, in das geschrieben wird
+    :param files: Dateien des Pakets, erhalten die Hashes
+    :return: Größe des cpio-Archivs
+    """
+    _size = 0
+    for _ino, _file in enumerate(files, start=1):
+        _nlink = 2 if stat.S_ISDIR(_file['mode']) else 1
+        _size += _write_cpio_header(writer, _ino, _file['mode'], _nlink, _file['mtime'], _file['size'],
+                                    f'.{_file["path"]}')
+        if stat.S_ISREG(_file['mode']):
+            _hash = hashlib.sha256()
+            _written = 0
+            with open(_file['source'], 'rb') as _f:
+                while _data := _f.read(COPY_BUFFER_SIZE):
+                    _hash.update(_data)
+                    writer.write(_data)
+                    _written += len(_data)
+            if _written != _file['size']:
+                raise RuntimeError(f'Datei {_file["source"]} wurde während des Builds verändert')
+            _file['digest'] = _hash.hexdigest()
+        elif stat.S_ISLNK(_file['mode']):
+            writer.write(_file['link_to'].encode('utf-8'))
+        _size += _file['size'] + _write_padding(writer, _file['size'])
+    return _size + _write_cpio_header(writer, 0, 0, 1, 0, 0, CPIO_TRAILER)
+
+
+def _write_cpio_header(writer, ino: int, mode: int, nlink: int, mtime: int, size: int, name: str) -> int:
+    """
+    Schreibt den Header eines Elements im cpio-Archiv.
+    :param writer: Datei-Objekt, in das geschrieben wird
+    :param ino: Inode-Nummer
+    :param mode: Typ und Zugriffsrechte
+    :param nlink: Anzahl Links
+    :param mtime: Zeitstempel
+    :param size: Größe der Daten
+    :param name: Name des Elements
+    :return: Anzahl geschriebener Bytes
+    """
+    _name = name.encode('utf-8') + b'\0'
+    _fields = (ino, mode, 0, 0, nlink, mtime, size, 0, 0, 0, 0, len(_name), 0)
+    _header = CPIO_MAGIC + ''.join(f'{_v:08x}' for _v in _fields).encode('ascii') + _name
+    writer.write(_header)
+    return len(_header) + _write_padding(writer, len(_header))
+
+
+def _write_padding(writer, length: int) -> int:
+    """
+    Füllt ein Element im cpio-Archiv auf ein Vielfaches von 4 Bytes auf.
+    :param writer: Datei-Objekt, in das geschrieben wird
+    :param length: Länge des Elements
+    :return: Anzahl geschriebener Bytes
+    """
+    _padding = -length % 4
+    writer.write(bytes(_padding))
+    return _padding
+
+
+def _main_header_entries(spec: RpmSpec, files: list[dict], compression: dict, payload_digest: str,
+                         mtime: int | None, reproducible: bool) -> list[tuple]:
+    """
+    :param spec: Inhalt der spec-Datei
+    :param files: Dateien des Pakets
+    :param compression: Einstellungen für die Komprimierung der Payload
+    :param payload_digest: SHA256-Hash der komprimierten Payload
+    :param mtime: Zeitstempel des Builds oder None für die aktuelle Zeit
+    :param reproducible: True für einen festen Build-Host
+    :return: Einträge des Headers als Tupel aus Tag, Typ und Wert
+    """
+    _tags = spec.tags
+    _algorithm = compression[CFG_ALGORITHM]
+    _evr = f'{spec.version()}-{spec.release()}'
+    if 'epoch' in _tags:
+        _evr = f'{_tags["epoch"]}:{_evr}'
+    _entries = [(RPMTAG_HEADERI18NTABLE, RPM_STRING_ARRAY_TYPE, ['C']),
+                (RPMTAG_NAME, RPM_STRING_TYPE, spec.name()),
+                (RPMTAG_VERSION, RPM_STRING_TYPE, spec.version()),
+                (RPMTAG_RELEASE, RPM_STRING_TYPE, spec.release()),
+                (RPMTAG_SUMMARY, RPM_I18NSTRING_TYPE, [_tags['summary']]),
+                (RPMTAG_DESCRIPTION, RPM_I18NSTRING_TYPE, [spec.description]),
+                (RPMTAG_BUILDTIME, RPM_INT32_TYPE, [int(time.time()) if mtime is None else mtime]),
+                (RPMTAG_BUILDHOST, RPM_STRING_TYPE,
+                 REPRODUCIBLE_BUILD_HOST if reproducible else socket.gethostname()),
+                (RPMTAG_SIZE, RPM_INT32_TYPE, [sum(_f['size'] for _f in files)]),
+                (RPMTAG_LICENSE, RPM_STRING_TYPE, _tags['license']),
+                (RPMTAG_GROUP, RPM_I18NSTRING_TYPE, [_tags.get('group', 'Unspecified')]),
+                (RPMTAG_OS, RPM_STRING_TYPE, 'linux'),
+                (RPMTAG_ARCH, RPM_STRING_TYPE, 'noarch'),
+                (RPMTAG_SOURCERPM, RPM_STRING_TYPE, f'{spec.name()}-{spec.version()}-{spec.release()}.src.rpm'),
+                (RPMTAG_RPMVERSION, RPM_STRING_TYPE, f'pybm {VERSION}'),
+                (RPMTAG_PAYLOADFORMAT, RPM_STRING_TYPE, 'cpio'),
+                (RPMTAG_ENCODING, RPM_STRING_TYPE, 'utf-8'),
+                (RPMTAG_PAYLOADDIGEST, RPM_STRING_ARRAY_TYPE, [payload_digest]),
+                (RPMTAG_PAYLOADDIGESTALGO, RPM_INT32_TYPE, [PGPHASHALGO_SHA256])]
+    if 'epoch' in _tags:
+        _entries.append((RPMTAG_EPOCH, RPM_INT32_TYPE, [int(_tags['epoch'])]))
+    if 'url' in _tags:
+        _entries.append((RPMTAG_URL, RPM_STRING_TYPE, _tags['url']))
+    if RPM_PAYLOAD_COMPRESSORS[_algorithm] is not None:
+        _entries.append((RPMTAG_PAYLOADCOMPRESSOR, RPM_STRING_TYPE, RPM_PAYLOAD_COMPRESSORS[_algorithm]))
+        _entries.append((RPMTAG_PAYLOADFLAGS, RPM_STRING_TYPE, str(compression[CFG_LEVEL])))
+    # Scriptlets
+    _requires = list(spec.dependencies['requires'])
+    for _script, (_prog, _body) in spec.scripts.items():
+        _script_tag, _prog_tag = RPM_SCRIPT_TAGS[_script]
+        if len(_body) > 0:
+            _entries.append((_script_tag, RPM_STRING_TYPE, _body))
+        _entries.append((_prog_tag, RPM_STRING_TYPE, _prog))
+        if _script in RPMSENSE_SCRIPTS:
+            _requires.append((_prog, RPMSENSE_INTERP | RPMSENSE_SCRIPTS[_script], ''))
+    # Abhängigkeiten
+    _rpmlib_requirements = list(RPMLIB_REQUIREMENTS)
+    if _algorithm in RPMLIB_PAYLOAD_REQUIREMENTS:
+        _rpmlib_requirements.append(RPMLIB_PAYLOAD_REQUIREMENTS[_algorithm])
+    _requires.extend((_n, RPMSENSE_RPMLIB | RPMSENSE_LESS | RPMSENSE_EQUAL, _v) for _n, _v in _rpmlib_requirements)
+    _dependencies = dict(spec.dependencies)
+    _dependencies['requires'] = _requires
+    _dependencies['provides'] = spec.dependencies['provides'] + [(spec.name(), RPMSENSE_EQUAL, _evr)]
+    for _kind, (_name_tag, _flags_tag, _version_tag) in RPM_DEPENDENCY_TAGS.items():
+        _deps = _dependencies[_kind]
+        if len(_deps) > 0:
+            _entries.append((_name_tag, RPM_STRING_ARRAY_TYPE, [_d[0] for _d in _deps]))
+            _entries.append((_flags_tag, RPM_INT32_TYPE, [_d[1] for _d in _deps]))
+            _entries.append((_version_tag, RPM_STRING_ARRAY_TYPE, [_d[2] for _d in _deps]))
+    # Dateien
+    if len(files) > 0:
+        _dir_names = []
+        _dir_indexes = []
+        for _file in files:
+            _dir_name = _file['path'][:_file['path'].rindex('/') + 1]
+            if len(_dir_names) == 0 or _dir_names[-1] != _dir_name:
+                if _dir_name not in _dir_names:
+                    _dir_names.append(_dir_name)
+            _dir_indexes.append(_dir_names.index(_dir_name))
+        _entries.extend([
+            (RPMTAG_FILESIZES, RPM_INT32_TYPE, [_f['size'] for _f in files]),
+            (RPMTAG_FILEMODES, RPM_INT16_TYPE, [_f['mode'] for _f in files]),
+            (RPMTAG_FILERDEVS, RPM_INT16_TYPE, [0] * len(files)),
+            (RPMTAG_FILEMTIMES, RPM_INT32_TYPE, [_f['mtime'] for _f in files]),
+            (RPMTAG_FILEDIGESTS, RPM_STRING_ARRAY_TYPE, [_f['digest'] for _f in files]),
+            (RPMTAG_FILELINKTOS, RPM_STRING_ARRAY_TYPE, [_f['link_to'] for _f in files]),
+            (RPMTAG_FILEFLAGS, RPM_INT32_TYPE, [_f['flags'] for _f in files]),
+            (RPMTAG_FILEUSERNAME, RPM_STRING_ARRAY_TYPE, [_f['user'] for _f in files]),
+            (RPMTAG_FILEGROUPNAME, RPM_STRING_ARRAY_TYPE, [_f['group'] for _f in files]),
+            (RPMTAG_FILEVERIFYFLAGS, RPM_INT32_TYPE, [0xFFFFFFFF] * len(files)),
+            (RPMTAG_FILEDEVICES, RPM_INT32_TYPE, [1] * len(files)),
+            (RPMTAG_FILEINODES, RPM_INT32_TYPE, list(range(1, len(files) + 1))),
+            (RPMTAG_FILELANGS, RPM_STRING_ARRAY_TYPE, [''] * len(files)),
+            (RPMTAG_DIRINDEXES, RPM_INT32_TYPE, _dir_indexes),
+            (RPMTAG_BASENAMES, RPM_STRING_ARRAY_TYPE, [_f['path'][_f['path'].rindex('/') + 1:] for _f in files]),
+            (RPMTAG_DIRNAMES, RPM_STRING_ARRAY_TYPE, _dir_names),
+            (RPMTAG_FILEDIGESTALGO, RPM_INT32_TYPE, [PGPHASHALGO_SHA256])])
+    return _entries
+
+
+def _signature_blob(header: bytes, md5_digest: bytes, payload_size: int, uncompressed_payload_size: int) -> bytes:
+    """
+    :param header: Header des Pakets
+    :param md5_digest: MD5-Hash über Header und Payload
+    :param payload_size: Größe der komprimierten Payload
+    :param uncompressed_payload_size: Größe der unkomprimierten Payload
+    :return: Signatur des Pakets, auf ein Vielfaches von 8 Bytes aufgefüllt
+    """
+    _entries = [(RPMSIGTAG_SHA1, RPM_STRING_TYPE, hashlib.sha1(header).hexdigest()),
+                (RPMSIGTAG_SHA256, RPM_STRING_TYPE, hashlib.sha256(header).hexdigest()),
+                (RPMSIGTAG_SIZE, RPM_INT32_TYPE, [len(header) + payload_size]),
+                (RPMSIGTAG_MD5, RPM_BIN_TYPE, md5_digest),
+                (RPMSIGTAG_PAYLOADSIZE, RPM_INT32_TYPE, [uncompressed_payload_size])]
+    _blob = _header_blob(_entries, RPMTAG_HEADERSIGNATURES)
+    return _blob + bytes(-len(_blob) % 8)
+
+
+def _header_blob(entries: list[tuple], region_tag: int) -> bytes:
+    """
+    Erzeugt einen Header mit unveränderlicher Region über alle Einträge.
+    :param entries: Einträge als Tupel aus Tag, Typ und Wert
+    :param region_tag: Tag der Region, 62 für die Signatur, 63 für den Header
+    :return: Header
+    """
+    _index = []
+    _data = bytearray()
+    for _tag, _type, _value in sorted(entries, key=lambda _e: _e[0]):
+        _data.extend(bytes(-len(_data) % RPM_TYPE_ALIGNMENT.get(_type, 1)))
+        _offset = len(_data)
+        if _type == RPM_STRING_TYPE:
+            _data.extend(_value.encode('utf-8') + b'\0')
+            _count = 1
+        elif _type in (RPM_STRING_ARRAY_TYPE, RPM_I18NSTRING_TYPE):
+            _data.extend(b''.join(_v.encode('utf-8') + b'\0' for _v in _value))
+            _count = len(_value)
+        elif _type == RPM_BIN_TYPE:
+            _data.extend(_value)
+            _count = len(_value)
+        else:
+            _data.extend(struct.pack(f'>{len(_value)}{"H" if _type == RPM_INT16_TYPE else "I"}', *_value))
+            _count = len(_value)
+        _index.append(struct.pack('>IIiI', _tag, _type, _offset, _count))
+    _index_count = len(_index) + 1
+    _region = struct.pack('>IIiI', region_tag, RPM_BIN_TYPE, len(_data), REGION_TAG_COUNT)
+    _data.extend(struct.pack('>IIiI', region_tag, RPM_BIN_TYPE, -_index_count * 16, REGION_TAG_COUNT))
+    return RPM_HEADER_MAGIC + struct.pack('>II', _index_count, len(_data)) + _region + b''.join(_index) + _data
+
+
+def _lead(spec: RpmSpec) -> bytes:
+    """
+    :param spec: Inhalt der spec-Datei
+    :return: Lead eines Binärpakets
+    """
+    _name = f'{spec.name()}-{spec.version()}-{spec.release()}'.encode('utf-8')[:65]
+    return struct.pack(RPM_LEAD_FORMAT, RPM_LEAD_MAGIC, 3, 0, 0, 0, _name, RPM_OS_LINUX, RPM_SIGTYPE_HEADERSIG)
+
+
+class _DigestWriter(io.RawIOBase):
+    """
+    Datei-Objekt, das Daten unverändert weiterreicht und dabei Größe und Hash ermittelt.
+    """
+    def __init__(self, file_obj, digest):
+        """
+        Konstruktor.
+        :param file_obj: Datei-Objekt, in das geschrieben wird
+        :param digest: Hash-Objekt aus hashlib
+        """
+        super().__init__()
+        self.__file = file_obj
+        self.__digest = digest
+        self.__pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__pos
+
+    def write(self, data) -> int:
+        self.__digest.update(data)
+        _n = self.__file.write(data)
+        self.__pos += _n
+        return _n
+
+    def hexdigest(self) -> str:
+        """
+        :return: Hash der geschriebenen Daten
+        """
+        return self.__digest.hexdigest()
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Liest die für ein noarch-Paket relevanten Teile einer rpm spec-Datei.
+Unterstützt werden die Tags der Präambel, %description, die Scriptlets und %files mit
+%dir, %attr, %defattr, %config, %doc und %license. Die Abschnitte %prep, %build, %install,
+%check, %clean und %changelog werden übergangen, der Inhalt des Pakets wird direkt aus dem
+vorbereiteten Verzeichnisbaum übernommen. Enthalten %prep, %build, %install oder %clean mehr als das
+übliche Entpacken und Kopieren, wird der Build abgebrochen, da diese Befehle nicht ausgeführt werden.
+"""
+
+import re
+
+from pybm import *
+
+
+# Flags für Dateien
+RPMFILE_CONFIG = 1 << 0
+RPMFILE_DOC = 1 << 1
+RPMFILE_MISSINGOK = 1 << 3
+RPMFILE_NOREPLACE = 1 << 4
+RPMFILE_LICENSE = 1 << 7
+
+# Flags für Abhängigkeiten
+RPMSENSE_LESS = 1 << 1
+RPMSENSE_GREATER = 1 << 2
+RPMSENSE_EQUAL = 1 << 3
+DEPENDENCY_OPERATORS = {'<': RPMSENSE_LESS, '>': RPMSENSE_GREATER, '=': RPMSENSE_EQUAL,
+                        '==': RPMSENSE_EQUAL, '<=': RPMSENSE_LESS | RPMSENSE_EQUAL,
+                        '>=': RPMSENSE_GREATER | RPMSENSE_EQUAL}
+
+# Tags mit Abhängigkeiten
+DEPENDENCY_TAGS = ('conflicts', 'obsoletes', 'provides', 'requires')
+
+# Scriptlets
+SCRIPTLETS = ('pre', 'post', 'preun', 'postun', 'pretrans', 'posttrans')
+
+# Abschnitte, deren Inhalt für das Paket nicht benötigt wird
+IGNORED_SECTIONS = ('prep', 'build', 'install', 'check', 'clean', 'changelog')
+
+# Befehle, die in übergangenen Abschnitten stehen dürfen, weil ihr Ergebnis dem vorbereiteten
+# Verzeichnisbaum entspricht; andere Befehle würden im Paket fehlen
+_BUILD_ROOT = r'(?:\$RPM_BUILD_ROOT|\$\{RPM_BUILD_ROOT}|%\{?buildroot}?|/\S+)/?'
+STANDARD_SECTION_COMMANDS = {
+    'prep': (re.compile(r'%(?:auto)?setup(?:\s.*)?'),),
+    'build': (),
+    'install': (re.compile(rf'(?:rm\s+-rf|mkdir\s+-p)\s+{_BUILD_ROOT}'),
+                re.compile(rf'cp\s+-(?:r|R|a|rp|pr|ar|ra)\s+(?:\*|\.|\./\*|\./\.)\s+{_BUILD_ROOT}')),
+    'clean': (re.compile(rf'rm\s+-rf\s+{_BUILD_ROOT}'),),
+}
+
+# Vordefinierte Makros für Verzeichnisse
+DEFAULT_MACROS = {'_prefix': '/usr', '_exec_prefix': '/usr', '_bindir': '/usr/bin', '_sbindir': '/usr/sbin',
+                  '_datadir': '/usr/share', '_docdir': '/usr/share/doc', '_mandir': '/usr/share/man',
+                  '_libdir': '/usr/lib', '_libexecdir': '/usr/libexec', '_sysconfdir': '/etc',
+                  '_localstatedir': '/var', '_sharedstatedir': '/var/lib', '_unitdir': '/usr/lib/systemd/system',
+                  '_tmppath': '/var/tmp', 'dist': ''}
+
+SECTION_PATTERN = re.compile(r'^%(\w+)(\s.*)?$')
+TAG_PATTERN = re.compile(r'^(\w+)(\(\w+\))?\s*:\s*(.*)$')
+DEFINE_PATTERN = re.compile(r'^%(?:define|global)\s+(\w+)\s+(.*)$')
+MACRO_PATTERN = re.compile(r'%%|%\{([?!]*)([\w.]+)(?::[^}]*)?}|%(\w+)')
+DIRECTIVE_PATTERN = re.compile(r'^%(dir|doc|license|config|attr|defattr|ghost|verify|docdir|lang|caps)'
+                               r'(?:\(([^)]*)\))?\s*')
+DEPENDENCY_PATTERN = re.compile(r'\s*([^\s,]+)(?:\s*(<=|>=|==|=|<|>)\s*([^\s,]+))?\s*,?')
+
+
+class RpmSpec:
+    """
+    Inhalt einer spec-Datei, soweit er für ein Binärpaket benötigt wird.
+    tags: Werte der Präambel-Tags, Namen in Kleinbuchstaben
+    dependencies: Abhängigkeiten je Tag (requires, provides, ...), Liste aus Tupeln mit Name, Flags und Version
+    description: Beschreibung des Pakets
+    scripts: Scriptlets je Name (pre, post, ...), Tupel aus Interpreter und Skript
+    files: Einträge aus %files, Tupel aus Pfad, Flags, Verzeichnis-Flag, Zugriffsrechten, Eigentümer und Gruppe;
+           Zugriffsrechte, Eigentümer und Gruppe sind None, falls nicht angegeben
+    """
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self.tags = {}
+        self.dependencies = {_t: [] for _t in DEPENDENCY_TAGS}
+        self.description = ''
+        self.scripts = {}
+        self.files = []
+
+    def name(self) -> str:
+        """
+        :return: Name des Pakets
+        """
+        return self.tags['name']
+
+    def version(self) -> str:
+        """
+        :return: Version des Pakets
+        """
+        return self.tags['version']
+
+    def release(self) -> str:
+        """
+        :return: Release des Pakets
+        """
+        return self.tags['release']
+
+
+def parse_spec(spec_file_path: str) -> RpmSpec:
+    """
+    Liest eine spec-Datei.
+    :param spec_file_path: Name und Pfad der spec-Datei
+    :return: Inhalt der spec-Datei
+    :raises RuntimeError: falls die spec-Datei Konstrukte enthält, die nicht unterstützt werden
+    """
+    with open(spec_file_path, 'r', encoding='utf-8') as _f:
+        _lines = _f.read().splitlines()
+    _spec = RpmSpec()
+    _macros = dict(DEFAULT_MACROS)
+    _section = None
+    _section_lines = []
+    _section_args = ''
+    for _line_nr, _line in enumerate(_lines, start=1):
+        _location = f'{spec_file_path}, Zeile {_line_nr}'
+        _sm = SECTION_PATTERN.match(_line)
+        _dm = DEFINE_PATTERN.match(_line)
+        if _dm:
+            _macros[_dm.group(1)] = _expand(_dm.group(2).strip(), _macros, _location)
+            continue
+        if _sm and _sm.group(1) in (SCRIPTLETS + IGNORED_SECTIONS + ('description', 'files', 'package')):
+            _finish_section(_spec, _section, _section_args, _section_lines, _macros, spec_file_path)
+            _section = _sm.group(1)
+            _section_args = (_sm.group(2) or '').strip()
+            _section_lines = []
+            if _section == 'package' or (_section_args.startswith('-n') and _section not in IGNORED_SECTIONS):
+                raise RuntimeError(f'{_location}: Unterpakete werden nicht unterstützt')
+            continue
+        if _sm and _sm.group(1) in ('if', 'ifarch', 'ifnarch', 'ifos', 'ifnos', 'include') \
+                and _section not in IGNORED_SECTIONS:
+            raise RuntimeError(f'{_location}: %{_sm.group(1)} wird nicht unterstützt')
+        if _section is None:
+            _parse_preamble_line(_spec, _line, _macros, _location)
+        else:
+            _section_lines.append((_line, _location))
+    _finish_section(_spec, _section, _section_args, _section_lines, _macros, spec_file_path)
+    for _tag in ('name', 'version', 'release', 'summary', 'license'):
+        if _tag not in _spec.tags:
+            raise RuntimeError(f'{spec_file_path}: Tag {_tag.capitalize()} fehlt')
+    _arch = _spec.tags.get('buildarch', 'noarch')
+    if _arch != 'noarch':
+        raise RuntimeError(f'{spec_file_path}: nur Pakete mit BuildArch noarch werden unterstützt')
+    return _spec
+
+
+def _parse_preamble_line(spec: RpmSpec, line: str, macros: dict, location: str):
+    """
+    Übernimmt eine Zeile der Präambel.
+    :param spec: Inhalt der spec-Datei
+    :param line: Zeile
+    :param macros: definierte Makros, wird um die Werte der Tags ergänzt
+    :param location: Datei und Zeile für Fehlermeldungen
+    :raises RuntimeError: falls die Zeile nicht unterstützt wird
+    """
+    _line = line.strip()
+    if len(_line) == 0 or _line.startswith('#'):
+        return
+    _tm = TAG_PATTERN.match(_line)
+    if not _tm:
+        raise RuntimeError(f'{location}: Zeile "{_line}" wird nicht unterstützt')
+    _tag = _tm.group(1).lower()
+    _value = _expand(_tm.group(3).strip(), macros, location)
+    if _tag in DEPENDENCY_TAGS:
+        spec.dependencies[_tag].extend(_parse_dependencies(_value, location))
+        return
+    if re.fullmatch(r'(source|patch)\d*', _tag):
+        return
+    spec.tags[_tag] = _value
+    if _tag in ('name', 'version', 'release', 'summary', 'license', 'url', 'group', 'epoch'):
+        macros[_tag] = _value
+
+
+def _parse_dependencies(value: str, location: str) -> list[tuple[str, int, str]]:
+    """
+    :param value: Wert eines Tags wie Requires, z.B. "python3 >= 3.10, bash"
+    :param location: Datei und Zeile für Fehlermeldungen
+    :return: Abhängigkeiten als Tupel aus Name, Flags und Version
+    :raises RuntimeError: falls der Wert nicht gelesen werden kann
+    """
+    _dependencies = []
+    _pos = 0
+    while _pos < len(value):
+        _dm = DEPENDENCY_PATTERN.match(value, _pos)
+        if not _dm or _dm.end() == _pos:
+            raise RuntimeError(f'{location}: Abhängigkeit "{value}" kann nicht gelesen werden')
+        _name, _operator, _version = _dm.groups()
+        if _name in DEPENDENCY_OPERATORS:
+            raise RuntimeError(f'{location}: Abhängigkeit "{value}" kann nicht gelesen werden')
+        _dependencies.append((_name, DEPENDENCY_OPERATORS[_operator] if _operator else 0, _version or ''))
+        _pos = _dm.end()
+    return _dependencies
+
+
+def _check_ignored_section(section: str, lines: list[tuple[str, str]]):
+    """
+    Prüft, ob ein übergangener Abschnitt nur Befehle enthält, deren Ergebnis der vorbereitete
+    Verzeichnisbaum bereits enthält.
+    :param section: Name des Abschnitts
+    :param lines: Zeilen des Abschnitts mit Datei und Zeile für Fehlermeldungen
+    :raises RuntimeError: falls der Abschnitt weitere Befehle enthält
+    """
+    _commands = STANDARD_SECTION_COMMANDS.get(section)
+    if _commands is None:
+        return
+    for _line, _location in lines:
+        _line = _line.strip()
+        if len(_line) == 0 or _line.startswith('#') or any(_c.fullmatch(_line) for _c in _commands):
+            continue
+        raise RuntimeError(f'{_location}: Befehl "{_line}" in %{section} wird beim Erzeugen des rpm-Pakets '
+                           f'durch pybm nicht ausgeführt, für diese spec-Datei {ENVA_RPM_BACKEND} auf '
+                           f'{RPM_BACKEND_RPMBUILD} setzen')
+
+
+def _finish_section(spec: RpmSpec, section: str | None, args: str, lines: list[tuple[str, str]],
+                    macros: dict, spec_file_path: str):
+    """
+    Übernimmt den Inhalt eines Abschnitts.
+    :param spec: Inhalt der spec-Datei
+    :param section: Name des Abschnitts oder None für die Präambel
+    :param args: Optionen des Abschnitts
+    :param lines: Zeilen des Abschnitts mit Datei und Zeile für Fehlermeldungen
+    :param macros: definierte Makros
+    :param spec_file_path: Name und Pfad der spec-Datei für Fehlermeldungen
+    :raises RuntimeError: falls der Abschnitt Konstrukte enthält, die nicht unterstützt werden
+    """
+    if section in IGNORED_SECTIONS:
+        _check_ignored_section(section, lines)
+        return
+    if section is None:
+        return
+    _location = f'{spec_file_path}, Abschnitt %{section}'
+    if section == 'description':
+        spec.description = '\n'.join(_expand(_l, macros, _loc) for _l, _loc in lines).strip('\n')
+        return
+    if section == 'files':
+        if len(args) > 0:
+            raise RuntimeError(f'{_location}: Optionen für %files werden nicht unterstützt')
+        _parse_files(spec, lines, macros)
+        return
+    _prog = '/bin/sh'
+    _args = args.split()
+    if len(_args) == 2 and _args[0] == '-p':
+        _prog = _args[1]
+    elif len(_args) > 0:
+        raise RuntimeError(f'{_location}: Optionen "{args}" werden nicht unterstützt')
+    _body = '\n'.join(_expand(_l, macros, _loc) for _l, _loc in lines).strip('\n')
+    if _prog.startswith('<'):
+        raise RuntimeError(f'{_location}: Interpreter {_prog} wird nicht unterstützt')
+    spec.scripts[section] = (_prog, _body)
+
+
+def _parse_files(spec: RpmSpec, lines: list[tuple[str, str]], macros: dict):
+    """
+    Übernimmt die Einträge des Abschnitts %files.
+    :param spec: Inhalt der spec-Datei
+    :param lines: Zeilen des Abschnitts mit Datei und Zeile für Fehlermeldungen
+    :param macros: definierte Makros
+    :raises RuntimeError: falls ein Eintrag nicht unterstützt wird
+    """
+    _default_attr = (None, None, None)
+    for _line, _location in lines:
+        _line = _line.strip()
+        if len(_line) == 0 or _line.startswith('#'):
+            continue
+        _flags = 0
+        _is_dir = False
+        _attr = _default_attr
+        while _dm := DIRECTIVE_PATTERN.match(_line):
+            if _dm.group(1) in ('ghost', 'verify', 'docdir', 'lang', 'caps'):
+                raise RuntimeError(f'{_location}: Eintrag "{_line}" wird nicht unterstützt')
+            _directive, _options = _dm.groups()
+            if _directive == 'dir':
+                _is_dir = True
+            elif _directive == 'doc':
+                _flags |= RPMFILE_DOC
+            elif _directive == 'license':
+                _flags |= RPMFILE_LICENSE
+            elif _directive == 'config':
+                _flags |= RPMFILE_CONFIG
+                for _option in (_options or '').replace(',', ' ').split():
+                    if _option == 'noreplace':
+                        _flags |= RPMFILE_NOREPLACE
+                    elif _option == 'missingok':
+                        _flags |= RPMFILE_MISSINGOK
+                    else:
+                        raise RuntimeError(f'{_location}: Option {_option} für %config wird nicht unterstützt')
+            else:
+                _attr = _parse_attr(_options, _default_attr if _directive == 'attr' else (None, None, None),
+                                    _location)
+                if _directive == 'defattr':
+                    _default_attr = _attr
+            _line = _line[_dm.end():]
+        _line = _expand(_line, macros, _location)
+        if len(_line) == 0:
+            continue
+        if _line.startswith('%'):
+            raise RuntimeError(f'{_location}: Eintrag "{_line}" wird nicht unterstützt')
+        for _path in _line.split():
+            if not _path.startswith('/'):
+                raise RuntimeError(f'{_location}: nur absolute Pfade werden unterstützt, nicht {_path}')
+            spec.files.append((_path, _flags, _is_dir) + _attr)
+
+
+def _parse_attr(options: str | None, defaults: tuple, location: str) -> tuple:
+    """
+    :param options: Optionen von %attr oder %defattr, z.B. "0644,root,root"
+    :param defaults: Werte für Optionen, die mit - angegeben sind
+    :param location: Datei und Zeile für Fehlermeldungen
+    :return: Tupel aus Zugriffsrechten, Eigentümer und Gruppe, jeweils None für Default
+    :raises RuntimeError: falls die Optionen ungültig sind
+    """
+    _values = [_v.strip() for _v in (options or '').split(',')]
+    if len(_values) < 3:
+        raise RuntimeError(f'{location}: ungültige Zugriffsrechte ({options})')
+    _mode = defaults[0] if _values[0] == '-' else None
+    if _values[0] != '-':
+        try:
+            _mode = int(_values[0], 8)
+        except ValueError:
+            raise RuntimeError(f'{location}: ungültige Zugriffsrechte {_values[0]}')
+    _user = defaults[1] if _values[1] == '-' else _values[1]
+    _group = defaults[2] if _values[2] == '-' else _values[2]
+    return _mode, _user, _group
+
+
+def _expand(text: str, macros: dict, location: str) -> str:
+    """
+    Ersetzt Makros in einem Text.
+    :param text: Text
+    :param macros: definierte Makros
+    :param location: Datei und Zeile für Fehlermeldungen
+    :return: Text mit ersetzten Makros
+    :raises RuntimeError: falls ein Makro in geschweiften Klammern nicht definiert ist
+    """
+    def _replacement(match: re.Match) -> str:
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(3) is not None:
+            return macros.get(match.group(3), match.group(0))
+        _conditional, _name = match.group(1), match.group(2)
+        if _conditional == '?':
+            return macros.get(_name, '')
+        if _conditional == '' and _name in macros:
+            return macros[_name]
+        raise RuntimeError(f'{location}: Makro {match.group(0)} wird nicht unterstützt')
+    return MACRO_PATTERN.sub(_replacement, text)
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Build-Server für wiederholte Aufrufe von pybm.
+Der Server läuft als langlebiger Prozess an einem Unix-Socket und führt die an ihn weitergeleiteten
+Aufrufe der Kommandozeile nacheinander aus. Module, kompilierte Muster für die Variablen-Ersetzung
+und die Build-Umgebungen der Projekte bleiben dabei zwischen den Aufrufen erhalten.
+"""
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+from pybm import *
+
+
+# Umgebungsvariablen, von denen die Build-Umgebung eines Projekts abhängt
+BUILD_ENV_VARIABLES = (ENVA_PROJECTS_ROOT, ENVA_TESTING_ROOT, ENVA_WHEEL_BACKEND, ENVA_RPM_BACKEND)
+
+# Auflösung der Zeitstempel von Dateien im ungünstigsten Fall (FAT)
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+# Schlüssel der Nachrichten zwischen Kommandozeile und Server, eine JSON-Nachricht je Zeile
+MSG_ARGS = 'args'
+MSG_CWD = 'cwd'
+MSG_ENV = 'env'
+MSG_ERR = 'err'
+MSG_EXIT = 'exit'
+MSG_OUT = 'out'
+MSG_UMASK = 'umask'
+MSG_VERSION = 'version'
+
+
+def server_socket_path() -> str:
+    """
+    :return: Name und Pfad des Unix-Sockets für den Build-Server; aus Umgebungsvariable PYBM_SERVER_SOCKET,
+             sonst im Laufzeit-Verzeichnis des Benutzers bzw. im temporären Verzeichnis
+    """
+    _path = os.getenv(ENVA_SERVER_SOCKET)
+    if _path is not None and len(_path) > 0:
+        return _path
+    _runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if _runtime_dir is not None and os.path.isdir(_runtime_dir):
+        return os.path.join(_runtime_dir, 'pybm.sock')
+    return os.path.join(tempfile.gettempdir(), f'pybm-{os.getuid()}.sock')
+
+
+def forward_command(args: list[str]) -> int | None:
+    """
+    Leitet einen Aufruf der Kommandozeile an den Build-Server weiter, falls er läuft.
+    Die Ausgaben des Servers werden laufend angezeigt.
+    :param args: Argumente der Kommandozeile ohne Programmname
+    :return: Exit-Code des Aufrufs; None, falls kein passender Build-Server läuft
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    _sock = _connect(server_socket_path())
+    if _sock is None:
+        return None
+    _umask = os.umask(0)
+    os.umask(_umask)
+    _request = {MSG_ARGS: args, MSG_CWD: os.getcwd(), MSG_ENV: dict(os.environ), MSG_UMASK: _umask,
+                MSG_VERSION: VERSION}
+    with _sock, _sock.makefile('r', encoding='utf-8') as _replies:
+        try:
+            _sock.sendall(json.dumps(_request).encode('utf-8') + b'\n')
+            for _line in _replies:
+                _reply = json.loads(_line)
+                if MSG_OUT in _reply:
+                    sys.stdout.write(_reply[MSG_OUT])
+                    sys.stdout.flush()
+                elif MSG_ERR in _reply:
+                    sys.stderr.write(_reply[MSG_ERR])
+                    sys.stderr.flush()
+                elif MSG_EXIT in _reply:
+                    return _reply[MSG_EXIT]
+        except OSError:
+            pass
+    print('Verbindung zum Build-Server unterbrochen')
+    return 1
+
+
+def serve(command_runner: Callable[[list[str], Callable[[str], dict]], int]):
+    """
+    Startet den Build-Server und bearbeitet Aufrufe, bis der Prozess beendet wird.
+    Die Aufrufe werden nacheinander ausgeführt, da Umgebungsvariablen, Arbeitsverzeichnis und
+    Ausgaben für jeden Aufruf prozessweit umgestellt werden.
+    :param command_runner: Funktion, die einen Aufruf mit Argumenten und Build-Umgebung ausführt
+                           und den Exit-Code liefert
+    :raises RuntimeError: falls Unix-Sockets nicht unterstützt werden oder bereits ein Server läuft
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise RuntimeError('Build-Server wird auf diesem System nicht unterstützt')
+    _socket_path = server_socket_path()
+    _running = _connect(_socket_path)
+    if _running is not None:
+        _running.close()
+        raise RuntimeError(f'Build-Server läuft bereits an {_socket_path}')
+    if os.path.exists(_socket_path):
+        # übrig gebliebener Socket eines beendeten Servers
+        os.unlink(_socket_path)
+    # Module für die Builds jetzt laden, nicht beim ersten Aufruf
+    import pybm.custom
+    import pybm.deb
+    import pybm.nsis
+    import pybm.rpm
+    import pybm.sign
+    import pybm.wheel
+    _env_cache = BuildEnvCache()
+    _server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    _umask = os.umask(0o077)
+    try:
+        _server.bind(_socket_path)
+    finally:
+        os.umask(_umask)
+    _stop_signals = []
+
+    def _terminate(signum, frame):
+        # ein laufender Build fängt die Ausnahme ab, der Server endet dann nach dem Aufruf
+        _stop_signals.append(signum)
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGINT, _terminate)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        _server.listen()
+        print(f'Build-Server läuft an {_socket_path}')
+        while len(_stop_signals) == 0:
+            _conn, _ = _server.accept()
+            with _conn:
+                _handle_connection(_conn, command_runner, _env_cache)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _server.close()
+        with contextlib.suppress(OSError):
+            os.unlink(_socket_path)
+        print('Build-Server beendet')
+
+
+class BuildEnvCache:
+    """
+    Hält die Build-Umgebungen der Projekte, solange sich die Dateien, aus denen sie ermittelt
+    wurden, und die relevanten Umgebungsvariablen nicht ändern. Die Daten der Feature-Sets werden
+    von allen Aufrufen gemeinsam verwendet, einmal gelesene Feature-Sets bleiben also erhalten.
+    """
+
+    def __init__(self):
+        """
+        Konstruktor.
+        """
+        self.__entries = {}
+
+    def build_env_for(self, project: str) -> dict:
+        """
+        :param project: Name des Projekts
+        :return: Kopie der Build-Umgebung für das Projekt, die Werte werden mit dem Cache geteilt
+        :raises RuntimeError: falls die Build-Umgebung nicht korrekt erstellt wurde
+        """
+        from pybm.util import build_env_for
+        _now = time.time_ns()
+        _key = (project,) + tuple(os.getenv(_v) for _v in BUILD_ENV_VARIABLES)
+        _entry = self.__entries.get(_key)
+        if _entry is not None and not self.__is_current(_entry):
+            _entry = None
+        if _entry is None:
+            _build_env = build_env_for(project)
+            _entry = [_sources_state(_build_env[PAR_SOURCE_FILES]), _build_env, _now]
+            self.__entries[_key] = _entry
+        _entry[2] = _now
+        return dict(_entry[1])
+
+    @staticmethod
+    def __is_current(entry: list) -> bool:
+        """
+        Prüft, ob eine Build-Umgebung noch aktuell ist. Dateien von Feature-Sets, die seit dem letzten
+        Aufruf gelesen wurden, werden in den Stand übernommen; wurden sie seit diesem Aufruf geändert,
+        ist unklar, ob vor oder nach dem Lesen, die Build-Umgebung gilt dann als veraltet.
+        :param entry: Stand der Dateien, Build-Umgebung und Zeitpunkt des letzten Aufrufs
+        :return: True, falls die Build-Umgebung weiter verwendet werden kann
+        """
+        _state, _build_env, _last_use = entry
+        _source_files = _build_env[PAR_SOURCE_FILES]
+        if _sources_state(_source_files[:len(_state)]) != _state:
+            return False
+        _added = _sources_state(_source_files[len(_state):])
+        if any(_s is None or _s[0] >= _last_use - MTIME_RESOLUTION_NS for _s in _added):
+            return False
+        _state.extend(_added)
+        return True
+
+
+class _ReplyWriter(io.TextIOBase):
+    """
+    Leitet Ausgaben zeilenweise als Nachrichten an die aufrufende Kommandozeile weiter.
+    Bricht die Verbindung ab, werden weitere Ausgaben verworfen, damit der Build vollständig läuft.
+    """
+
+    def __init__(self, conn: socket.socket, key: str):
+        """
+        Konstruktor.
+        :param conn: Verbindung zur Kommandozeile
+        :param key: Schlüssel der Nachricht, MSG_OUT oder MSG_ERR
+        """
+        super().__init__()
+        self.__conn = conn
+        self.__key = key
+        self.__buffer = ''
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.__buffer += s
+        if '\n' in self.__buffer:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if len(self.__buffer) > 0:
+            _send_reply(self.__conn, {self.__key: self.__buffer})
+            self.__buffer = ''
+
+
+def _handle_connection(conn: socket.socket, command_runner: Callable, env_cache: BuildEnvCache):
+    """
+    Führt einen weitergeleiteten Aufruf aus.
+    Umgebungsvariablen, Arbeitsverzeichnis und umask der Kommandozeile gelten während des Aufrufs.
+    :param conn: Verbindung zur Kommandozeile
+    :param command_runner: Funktion, die einen Aufruf ausführt
+    :param env_cache: Cache für die Build-Umgebungen
+    """
+    with conn.makefile('r', encoding='utf-8') as _f:
+        try:
+            _request = json.loads(_f.readline())
+        except (OSError, ValueError):
+            return
+    if _request.get(MSG_VERSION) != VERSION:
+        # Kommandozeile mit anderer pybm-Version, der Aufruf wird von ihr selbst ausgeführt
+        _send_reply(conn, {MSG_EXIT: None})
+        return
+    _start = time.perf_counter()
+    _saved_env = dict(os.environ)
+    _saved_cwd = os.getcwd()
+    _saved_umask = os.umask(_request[MSG_UMASK])
+    _out = _ReplyWriter(conn, MSG_OUT)
+    _err = _ReplyWriter(conn, MSG_ERR)
+    try:
+        os.environ.clear()
+        os.environ.update(_request[MSG_ENV])
+        os.chdir(_request[MSG_CWD])
+        with contextlib.redirect_stdout(_out), contextlib.redirect_stderr(_err):
+            _rc = command_runner(_request[MSG_ARGS], env_cache.build_env_for)
+    except OSError as _e:
+        _out.write(f'{_e}\n')
+        _rc = 1
+    finally:
+        _out.flush()
+        _err.flush()
+        os.environ.clear()
+        os.environ.update(_saved_env)
+        os.chdir(_saved_cwd)
+        os.umask(_saved_umask)
+    _send_reply(conn, {MSG_EXIT: _rc})
+    print(f'{" ".join(_request[MSG_ARGS])}: Exit-Code {_rc} nach {time.perf_counter() - _start:.3f}s')
+
+
+def _send_reply(conn: socket.socket, reply: dict):
+    """
+    Sendet eine Nachricht an die Kommandozeile, Fehler bei abgebrochener Verbindung werden ignoriert.
+    :param conn: Verbindung zur Kommandozeile
+    :param reply: Nachricht
+    """
+    with contextlib.suppress(OSError):
+        conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+def _connect(socket_path: str) -> socket.socket | None:
+    """
+    :param socket_path: Name und Pfad des Unix-Sockets
+    :return: Verbindung zum Build-Server; None, falls keiner läuft oder der Socket einem anderen
+             Benutzer gehört
+    """
+    try:
+        if os.stat(socket_path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    _sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        _sock.connect(socket_path)
+    except OSError:
+        _sock.close()
+        return None
+    return _sock
+
+
+def _sources_state(source_files: list[str]) -> list:
+    """
+    :param source_files: Dateien und Verzeichnisse
+    :return: Zeitstempel, Größe und inode je Datei, None für nicht vorhandene Dateien
+    """
+    _state = []
+    for _path in source_files:
+        try:
+            _st = os.stat(_path)
+            _state.append((_st.st_mtime_ns, _st.st_size, _st.st_ino))
+        except OSError:
+            _state.append(None)
+    return _state
+
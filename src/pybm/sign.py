@@ -35,42 +35,339 @@
 """
 Erzeugt eine Datei mit den SHA512-Hashes aller Dateien im dist-Verzeichnis eines Projekts.
 Zur Datei wird eine PGP-Signatur erstellt.
+Optional werden in einem Lesedurchgang weitere Hash-Dateien (SHA256SUMS, B2SUMS) erzeugt.
+Hashes unveränderter Dateien werden aus dem Cache unter dist/.pybm-cache übernommen.
+Optional wird zu jeder Datei eine eigene Signatur <Datei>.asc erstellt, sobald ihr Hash feststeht,
+also noch während der Berechnung der übrigen Hashes, und nur dann, wenn sich die Datei seit der
+letzten Signatur geändert hat.
 """
 
+import contextvars
 import hashlib
+import json
 import os
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 from pybm import *
+from pybm.trace import trace_span, traced
 from pybm.util import shell_cmd
 
 
 SHA512_FILE_NAME = 'SHA512SUMS'
 SHA512_SIG_FILE_NAME = f'{SHA512_FILE_NAME}.sign'
 
+# Hash-Verfahren und Name der zugehörigen Hash-Datei
+DIGEST_FILE_NAMES = {'sha512': SHA512_FILE_NAME, 'sha256': 'SHA256SUMS', 'blake2b': 'B2SUMS'}
+DEFAULT_DIGESTS = ['sha512']
+HASH_CACHE_FILE_NAME = 'hashes.json'
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Endung der Signaturen einzelner Dateien und Cache-Datei mit dem Stand der signierten Dateien
+ARTIFACT_SIG_SUFFIX = '.asc'
+SIGNATURE_CACHE_FILE_NAME = 'signatures.json'
+
+# maximale Anzahl gleichzeitig laufender gpg-Prozesse, falls in der Konfiguration nicht angegeben
+DEFAULT_SIGN_JOBS = 4
+
 
 def build_sign(build_environment: dict, _project: str, _feature_set: str = None):
     """
     Erzeugt Datei SHA512SUMS mit den Hashes aller Dateien im dist-Verzeichnis des Projekts,
-    je eine Zeile <Hash> <Dateiname>.
+    je eine Zeile <Hash> <Dateiname>, sortiert nach Dateiname. Weitere in der pybm-Konfiguration
+    unter [sign] digests angegebene Hash-Dateien werden ebenso erzeugt und signiert.
     :param build_environment: Build-Environment
     :param _project: Name des Projekts
     :param _feature_set: optional Name des Feature-Sets
+    :raises RuntimeError: falls die Einstellungen ungültig sind oder eine Datei nicht signiert werden konnte
     """
     _project_root = build_environment[PAR_PROJECT_ROOT]
     _dist_path = os.path.join(_project_root, 'dist')
-    _hashes = []
-    for _file_name in os.listdir(_dist_path):
-        if _file_name == SHA512_FILE_NAME or _file_name == SHA512_SIG_FILE_NAME:
-            continue
-        with open(os.path.join(_dist_path, _file_name), 'rb') as _f:
-            _hash = hashlib.file_digest(_f, 'sha512')
-            _hashes.append(f'{_hash.hexdigest()} {_file_name}{os.linesep}')
-    _sha512_file_path = os.path.join(_dist_path, SHA512_FILE_NAME)
-    _sha512_sig_file_path = os.path.join(_dist_path, SHA512_SIG_FILE_NAME)
-    with open(_sha512_file_path, 'w') as _f:
-        _f.writelines(_hashes)
-    _cmd = ['gpg', '--armor', '--output', _sha512_sig_file_path, '--detach-sign', _sha512_file_path]
-    _rc = shell_cmd(_cmd)
-    if _rc != 0:
-        raise RuntimeError(f'Konnte Datei {SHA512_FILE_NAME} nicht signieren')
-    print(f'Datei {SHA512_FILE_NAME} mit Signatur erstellt.')
+    _settings = build_environment.get(PAR_PYBM_CONFIG, {}).get(TARGET_SIGN, {})
+    _digests, _threads = sign_settings(_settings)
+    _sign_artifacts, _jobs = signer_settings(_settings)
+    _hash_files = set(DIGEST_FILE_NAMES.values())
+    _file_names = sorted(_f for _f in os.listdir(_dist_path)
+                         if _f not in _hash_files and _f.removesuffix('.sign') not in _hash_files
+                         and os.path.isfile(os.path.join(_dist_path, _f)))
+    _sums_file_names = [DIGEST_FILE_NAMES[_digest] for _digest in _digests]
+    with trace_span('gpg', 'sign'), SignerPool(_jobs) as _signer:
+        _artifacts = ArtifactSignatures(_dist_path, _signer) if _sign_artifacts else None
+        if _artifacts is not None:
+            _file_names = _artifacts.artifact_file_names(_file_names)
+        _hashes = file_hashes(_dist_path, _file_names, _digests, _threads,
+                              None if _artifacts is None else _artifacts.hashed)
+        _sums_futures = []
+        for _digest, _sums_file_name in zip(_digests, _sums_file_names):
+            _sums_file_path = os.path.join(_dist_path, _sums_file_name)
+            with open(_sums_file_path, 'w') as _f:
+                _f.writelines(f'{_hashes[_fn][_digest]} {_fn}{os.linesep}' for _fn in _file_names)
+            _sums_futures.append(_signer.submit(_sums_file_path, f'{_sums_file_path}.sign',
+                                                f'{TARGET_SIGN} {_sums_file_name}'))
+        _failed = [_n for _n, _future in zip(_sums_file_names, _sums_futures) if not _future.result()]
+        if _artifacts is not None:
+            _failed.extend(_artifacts.finish(_file_names))
+    if len(_failed) > 0:
+        raise RuntimeError(f'Konnte Datei(en) {", ".join(_failed)} nicht signieren')
+    for _sums_file_name in _sums_file_names:
+        print(f'Datei {_sums_file_name} mit Signatur erstellt.')
+
+
+def sign_settings(settings: dict) -> tuple[list[str], int]:
+    """
+    :param settings: Abschnitt [sign] der pybm-Konfigurationsdatei
+    :return: zu erzeugende Hash-Verfahren, SHA512 immer zuerst; Anzahl Threads zur Berechnung
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _digests = list(DEFAULT_DIGESTS)
+    for _digest in settings.get(CFG_DIGESTS, []):
+        _digest = str(_digest).lower()
+        if _digest not in DIGEST_FILE_NAMES:
+            raise RuntimeError(f'Ungültiges Hash-Verfahren {_digest}, erlaubt sind {", ".join(DIGEST_FILE_NAMES)}')
+        if _digest not in _digests:
+            _digests.append(_digest)
+    _threads = settings.get(CFG_THREADS, 0)
+    if not isinstance(_threads, int) or _threads < 0:
+        raise RuntimeError(f'Ungültige Anzahl Threads {_threads} für Hash-Berechnung')
+    return _digests, _threads or min(32, os.cpu_count() or 1)
+
+
+def signer_settings(settings: dict) -> tuple[bool, int]:
+    """
+    :param settings: Abschnitt [sign] der pybm-Konfigurationsdatei
+    :return: True, falls jede Datei eine eigene Signatur erhält; maximale Anzahl gleichzeitiger gpg-Prozesse
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _artifacts = settings.get(CFG_ARTIFACTS, False)
+    if not isinstance(_artifacts, bool):
+        raise RuntimeError(f'Ungültiger Wert {_artifacts} für Signatur aller Dateien, erlaubt sind true und false')
+    _jobs = settings.get(CFG_JOBS, 0)
+    if not isinstance(_jobs, int) or _jobs < 0:
+        raise RuntimeError(f'Ungültige Anzahl {_jobs} gleichzeitiger Signaturen')
+    return _artifacts, _jobs or min(DEFAULT_SIGN_JOBS, os.cpu_count() or 1)
+
+
+class SignerPool:
+    """
+    Erstellt PGP-Signaturen mit gpg in mehreren gleichzeitig laufenden Prozessen, die alle den
+    Schlüssel über denselben gpg-agent verwenden. Die erste Signatur wird allein erstellt, damit
+    der Agent die Passphrase höchstens einmal abfragt; alle weiteren laufen mit --batch und
+    verwenden den entsperrten Schlüssel aus seinem Cache.
+    """
+    def __init__(self, jobs: int):
+        """
+        Konstruktor.
+        :param jobs: maximale Anzahl gleichzeitiger gpg-Prozesse
+        """
+        self.__executor = ThreadPoolExecutor(max_workers=jobs)
+        self.__first = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__executor.shutdown(wait=True)
+
+    def submit(self, file_path: str, sig_file_path: str, prefix: str) -> Future:
+        """
+        Beauftragt die Signatur einer Datei, eine vorhandene Signatur wird ersetzt.
+        :param file_path: Name und Pfad der zu signierenden Datei
+        :param sig_file_path: Name und Pfad der Signatur-Datei
+        :param prefix: Präfix für die Ausgaben von gpg
+        :return: Future mit Ergebnis True, falls die Signatur erstellt wurde
+        """
+        _cmd = ['gpg', '--armor', '--output', sig_file_path, '--detach-sign', file_path]
+        # Kontext übernehmen, damit die Ausgaben von gpg beim Aufrufer ankommen
+        _context = contextvars.copy_context()
+        if self.__first is None:
+            self.__first = self.__executor.submit(_context.run, self.__sign, _cmd, sig_file_path, prefix, None)
+            return self.__first
+        _cmd.insert(1, '--batch')
+        return self.__executor.submit(_context.run, self.__sign, _cmd, sig_file_path, prefix, self.__first)
+
+    @staticmethod
+    def __sign(cmd: list[str], sig_file_path: str, prefix: str, first: Future | None) -> bool:
+        """
+        Erstellt eine Signatur, nachdem die erste Signatur fertig ist.
+        :param cmd: gpg-Befehl
+        :param sig_file_path: Name und Pfad der Signatur-Datei
+        :param prefix: Präfix für die Ausgaben von gpg
+        :param first: Future der ersten Signatur, None für die erste Signatur selbst
+        :return: True, falls die Signatur erstellt wurde
+        """
+        if os.path.exists(sig_file_path):
+            os.remove(sig_file_path)
+        if first is not None and not first.result():
+            # ohne entsperrten Schlüssel würde jede weitere Signatur erneut nach der Passphrase fragen
+            return False
+        return shell_cmd(cmd, prefix=prefix) == 0
+
+
+class ArtifactSignatures:
+    """
+    Signiert die Dateien im dist-Verzeichnis einzeln. Eine Datei wird nur signiert, falls sich ihr
+    SHA512-Hash seit der letzten Signatur geändert hat oder die Signatur fehlt bzw. verändert wurde.
+    Der Stand der signierten Dateien wird im Cache unter dist/.pybm-cache gespeichert.
+    """
+    def __init__(self, dist_path: str, signer: SignerPool):
+        """
+        Konstruktor.
+        :param dist_path: dist-Verzeichnis des Projekts
+        :param signer: Pool für die gpg-Prozesse
+        """
+        self.__dist_path = dist_path
+        self.__signer = signer
+        self.__cache_file_path = os.path.join(dist_path, CACHE_DIR_NAME, SIGNATURE_CACHE_FILE_NAME)
+        self.__cache = _load_json_cache(self.__cache_file_path)
+        self.__pending = {}
+
+    def artifact_file_names(self, file_names: list[str]) -> list[str]:
+        """
+        :param file_names: Namen der Dateien im dist-Verzeichnis
+        :return: Namen der Dateien ohne die Signaturen, die pybm zu anderen Dateien erstellt oder
+                 zuletzt erstellt hat; andere Dateien mit Endung .asc bleiben erhalten
+        """
+        _names = set(file_names)
+        return [_fn for _fn in file_names
+                if not _fn.endswith(ARTIFACT_SIG_SUFFIX)
+                or (_fn.removesuffix(ARTIFACT_SIG_SUFFIX) not in _names
+                    and _fn.removesuffix(ARTIFACT_SIG_SUFFIX) not in self.__cache)]
+
+    def hashed(self, file_name: str, hashes: dict):
+        """
+        Beauftragt die Signatur einer Datei, sobald ihre Hashes feststehen, falls sie sich geändert hat.
+        :param file_name: Name der Datei im dist-Verzeichnis
+        :param hashes: Hashes der Datei je Verfahren
+        """
+        _sig_file_path = os.path.join(self.__dist_path, f'{file_name}{ARTIFACT_SIG_SUFFIX}')
+        _hash = hashes[DEFAULT_DIGESTS[0]]
+        _cached = self.__cache.get(file_name)
+        if _cached is not None and _cached[0] == _hash and _cached[1:] == _sig_file_state(_sig_file_path):
+            return
+        self.__cache.pop(file_name, None)
+        _future = self.__signer.submit(os.path.join(self.__dist_path, file_name), _sig_file_path,
+                                       f'{TARGET_SIGN} {file_name}')
+        self.__pending[file_name] = (_hash, _future)
+
+    def finish(self, file_names: list[str]) -> list[str]:
+        """
+        Wartet auf die beauftragten Signaturen, entfernt Signaturen nicht mehr vorhandener Dateien
+        und speichert den Stand im Cache.
+        :param file_names: Namen aller Dateien im dist-Verzeichnis
+        :return: Namen der Dateien, die nicht signiert werden konnten
+        """
+        _failed = []
+        for _file_name, (_hash, _future) in self.__pending.items():
+            if _future.result():
+                _sig_file_path = os.path.join(self.__dist_path, f'{_file_name}{ARTIFACT_SIG_SUFFIX}')
+                self.__cache[_file_name] = [_hash] + _sig_file_state(_sig_file_path)
+            else:
+                _failed.append(_file_name)
+        for _file_name in set(self.__cache) - set(file_names):
+            # Signaturen werden nur entfernt, wenn pybm sie erstellt hat
+            _sig_file_path = os.path.join(self.__dist_path, f'{_file_name}{ARTIFACT_SIG_SUFFIX}')
+            if os.path.exists(_sig_file_path):
+                os.remove(_sig_file_path)
+            del self.__cache[_file_name]
+        _save_json_cache(self.__cache_file_path, self.__cache)
+        _count = len(self.__pending) - len(_failed)
+        print(f'{_count} von {len(file_names)} Dateien mit eigener Signatur {ARTIFACT_SIG_SUFFIX} signiert, '
+              f'{len(file_names) - len(self.__pending)} unverändert')
+        return _failed
+
+
+def _sig_file_state(sig_file_path: str) -> list[int]:
+    """
+    :param sig_file_path: Name und Pfad einer Signatur-Datei
+    :return: Größe und Zeitstempel der Datei, leer falls sie nicht existiert
+    """
+    try:
+        _stat = os.stat(sig_file_path)
+    except FileNotFoundError:
+        return []
+    return [_stat.st_size, _stat.st_mtime_ns]
+
+
+@traced('hash')
+def file_hashes(dist_path: str, file_names: list[str], digests: list[str], threads: int,
+                hashed: Callable[[str, dict], None] = None) -> dict:
+    """
+    Ermittelt die Hashes der angegebenen Dateien. Für Dateien, deren Pfad, Größe, Zeitstempel
+    und Inode seit der letzten Berechnung unverändert sind, werden die Hashes aus dem Cache
+    übernommen, alle übrigen werden parallel in je einem Lesedurchgang berechnet.
+    :param dist_path: dist-Verzeichnis des Projekts
+    :param file_names: Namen der Dateien im dist-Verzeichnis
+    :param digests: Hash-Verfahren
+    :param threads: maximale Anzahl Threads
+    :param hashed: optional Funktion, die für jede Datei aufgerufen wird, sobald ihre Hashes feststehen
+    :return: Hashes je Dateiname und Verfahren
+    """
+    _cache_file_path = os.path.join(dist_path, CACHE_DIR_NAME, HASH_CACHE_FILE_NAME)
+    _cache = _load_json_cache(_cache_file_path)
+    _entries = {}
+    _missing = []
+    for _file_name in file_names:
+        _stat = os.stat(os.path.join(dist_path, _file_name))
+        _key = [_stat.st_size, _stat.st_mtime_ns, _stat.st_ino]
+        _cached = _cache.get(_file_name)
+        if _cached is not None and _cached[:3] == _key and all(_d in _cached[3] for _d in digests):
+            _entries[_file_name] = _cached
+            if hashed is not None:
+                hashed(_file_name, _cached[3])
+        else:
+            _entries[_file_name] = _key + [{}]
+            _missing.append(_file_name)
+    if len(_missing) > 0:
+        with ThreadPoolExecutor(max_workers=min(threads, len(_missing))) as _executor:
+            _futures = {_executor.submit(_hash_file, os.path.join(dist_path, _fn), digests): _fn for _fn in _missing}
+            for _future in as_completed(_futures):
+                _file_name = _futures[_future]
+                _entries[_file_name][3] = _future.result()
+                if hashed is not None:
+                    hashed(_file_name, _entries[_file_name][3])
+    if _entries != _cache:
+        _save_json_cache(_cache_file_path, _entries)
+    return {_fn: _entry[3] for _fn, _entry in _entries.items()}
+
+
+def _hash_file(file_path: str, digests: list[str]) -> dict:
+    """
+    Berechnet alle Hashes einer Datei in einem Lesedurchgang.
+    :param file_path: Name und Pfad der Datei
+    :param digests: Hash-Verfahren
+    :return: Hash je Verfahren
+    """
+    _hashers = {_d: hashlib.new(_d) for _d in digests}
+    _buffer = bytearray(READ_BUFFER_SIZE)
+    _view = memoryview(_buffer)
+    with open(file_path, 'rb', buffering=0) as _f:
+        while (_count := _f.readinto(_buffer)) > 0:
+            for _hasher in _hashers.values():
+                _hasher.update(_view[:_count])
+    return {_d: _h.hexdigest() for _d, _h in _hashers.items()}
+
+
+def _load_json_cache(cache_file_path: str) -> dict:
+    """
+    :param cache_file_path: Name und Pfad der Cache-Datei
+    :return: Inhalt der Cache-Datei, leer falls sie nicht existiert oder unlesbar ist
+    """
+    try:
+        with open(cache_file_path, 'r') as _f:
+            return json.load(_f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json_cache(cache_file_path: str, data: dict):
+    """
+    Ersetzt eine Cache-Datei, ohne dass ein gleichzeitiger Leser eine halb geschriebene Datei sieht.
+    :param cache_file_path: Name und Pfad der Cache-Datei
+    :param data: Inhalt der Cache-Datei
+    """
+    os.makedirs(os.path.dirname(cache_file_path), mode=0o755, exist_ok=True)
+    _fd, _temp_file_path = tempfile.mkstemp(prefix='.', dir=os.path.dirname(cache_file_path))
+    with os.fdopen(_fd, 'w') as _f:
+        json.dump(data, _f, indent=1, sort_keys=True)
+    os.replace(_temp_file_path, cache_file_path)
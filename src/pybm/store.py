@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Inhaltsadressierter Speicher für Build-Ergebnisse.
+Dateien werden unter ihrem SHA512-Hash im Store abgelegt, das dist-Verzeichnis und die
+Staging-Verzeichnisse erhalten Hardlinks bzw. Reflinks auf die Dateien im Store. Gleiche
+wheels und Pakete mehrerer Projekte belegen dadurch nur einmal Platz.
+Der Store liegt unter PYBM_STORE_PATH, Default <PYBM_PROJECTS_ROOT>/.pybm-store. Dateien im Store
+werden nie verändert, Build-Ergebnisse dürfen deshalb nur durch Ersetzen und nicht durch
+Überschreiben aktualisiert werden.
+"""
+
+import errno
+import hashlib
+import os
+import secrets
+import shutil
+import stat
+import time
+
+from pybm import *
+from pybm.trace import traced
+
+
+STORE_DIR_NAME = '.pybm-store'
+STORE_TEMP_PREFIX = '.tmp-'
+
+# ioctl zum Anlegen eines Reflinks unter Linux (FICLONE)
+FICLONE = 0x40049409
+
+# temporäre Dateien im Store, die älter sind, stammen von abgebrochenen Builds
+STALE_TEMP_FILE_AGE = 24 * 3600
+
+
+def store_path() -> str | None:
+    """
+    :return: Verzeichnis des Stores, None falls der Store mit leerer Umgebungsvariable
+             PYBM_STORE_PATH abgeschaltet ist oder PYBM_PROJECTS_ROOT nicht gesetzt ist
+    """
+    _store_path = os.getenv(ENVA_STORE_PATH)
+    if _store_path is not None:
+        return _store_path if len(_store_path.strip()) > 0 else None
+    _projects_root = os.getenv(ENVA_PROJECTS_ROOT)
+    return None if _projects_root is None else os.path.join(_projects_root, STORE_DIR_NAME)
+
+
+@traced('store')
+def store_file(file_path: str) -> str | None:
+    """
+    Übernimmt eine Datei in den Store. Ist eine Datei mit gleichem Inhalt und gleichen Zugriffsrechten
+    bereits vorhanden, wird die Datei durch einen Link auf sie ersetzt, sonst wird die Datei selbst im
+    Store verlinkt. Liegen Datei und Store in unterschiedlichen Dateisystemen, bleibt die Datei unverändert.
+    :param file_path: Name und Pfad der Datei
+    :return: SHA512-Hash der Datei, None falls sie nicht im Store abgelegt wurde
+    """
+    _store_path = store_path()
+    if _store_path is None:
+        return None
+    with open(file_path, 'rb') as _f:
+        _digest = hashlib.file_digest(_f, 'sha512').hexdigest()
+    _blob_path = blob_path(_store_path, _digest)
+    try:
+        if os.path.samefile(file_path, _blob_path):
+            return _digest
+        # Links teilen die Zugriffsrechte, eine Datei mit anderen Rechten ersetzt daher die im Store
+        if _same_mode(_blob_path, file_path) and _replace_with_link(_blob_path, file_path):
+            return _digest
+    except FileNotFoundError:
+        # noch nicht im Store oder gerade von collect_garbage entfernt
+        pass
+    os.makedirs(os.path.dirname(_blob_path), mode=0o755, exist_ok=True)
+    # neue Datei unter temporärem Namen verlinken, damit parallele Builds keine halbe Datei sehen
+    _temp_path = _temp_file_path(os.path.dirname(_blob_path))
+    try:
+        os.link(file_path, _temp_path)
+    except OSError:
+        return None
+    os.replace(_temp_path, _blob_path)
+    return _digest
+
+
+def blob_path(store_root: str, digest: str) -> str:
+    """
+    :param store_root: Verzeichnis des Stores
+    :param digest: SHA512-Hash einer Datei
+    :return: Name und Pfad der Datei im Store
+    """
+    return os.path.join(store_root, digest[:2], digest)
+
+
+def clone_file(source_file_path: str, target_file_path: str) -> bool:
+    """
+    Legt einen Hardlink an, falls das nicht möglich ist einen Reflink.
+    :param source_file_path: Name und Pfad der Quelldatei
+    :param target_file_path: Name und Pfad der Zieldatei, darf nicht existieren
+    :return: True, falls die Zieldatei angelegt wurde
+    """
+    try:
+        os.link(source_file_path, target_file_path)
+        return True
+    except OSError:
+        pass
+    try:
+        # fcntl gibt es nur unter Unix, unter Windows werden keine Reflinks angelegt
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(source_file_path, 'rb') as _source, open(target_file_path, 'xb') as _target:
+            fcntl.ioctl(_target.fileno(), FICLONE, _source.fileno())
+        shutil.copystat(source_file_path, target_file_path)
+        return True
+    except OSError:
+        if os.path.exists(target_file_path):
+            os.remove(target_file_path)
+        return False
+
+
+def collect_garbage(max_age: float | None, max_size: int | None) -> tuple[int, int, int]:
+    """
+    Entfernt Dateien aus dem Store, die in keinem dist- oder Staging-Verzeichnis mehr verlinkt sind.
+    Zuerst werden alle nicht verlinkten Dateien entfernt, die seit max_age Sekunden nicht mehr
+    verlinkt wurden. Belegt der Store danach mehr als max_size Bytes, werden weitere nicht verlinkte
+    Dateien entfernt, die am längsten nicht verlinkten zuerst. Verlinkte Dateien bleiben immer
+    erhalten, da ihr Entfernen keinen Platz freigibt.
+    :param max_age: maximales Alter nicht verlinkter Dateien in Sekunden oder None
+    :param max_size: maximale Größe des Stores in Bytes oder None
+    :return: Anzahl entfernter Dateien, freigegebene Bytes, verbleibende Größe des Stores in Bytes
+    :raises RuntimeError: falls der Store abgeschaltet ist
+    """
+    _store_path = store_path()
+    if _store_path is None:
+        raise RuntimeError(f'Store ist abgeschaltet, Umgebungsvariablen {ENVA_STORE_PATH} bzw. '
+                           f'{ENVA_PROJECTS_ROOT} prüfen')
+    _now = time.time()
+    _total_size = 0
+    _candidates = []
+    _removed_count = _removed_size = 0
+    for _dir_entry in _scandir(_store_path):
+        for _entry in _scandir(_dir_entry.path):
+            _stat = _entry.stat(follow_symlinks=False)
+            if _entry.name.startswith(STORE_TEMP_PREFIX):
+                if _now - _stat.st_mtime > STALE_TEMP_FILE_AGE:
+                    _remove_quietly(_entry.path)
+                continue
+            _total_size += _stat.st_size
+            # der Zeitpunkt der letzten Änderung der Link-Anzahl steht in st_ctime
+            if _stat.st_nlink == 1:
+                _candidates.append((_stat.st_ctime, _stat.st_size, _entry.path))
+    _candidates.sort()
+    for _ctime, _size, _path in _candidates:
+        _expired = max_age is not None and _now - _ctime > max_age
+        _too_large = max_size is not None and _total_size > max_size
+        if not (_expired or _too_large):
+            continue
+        if _remove_quietly(_path):
+            _removed_count += 1
+            _removed_size += _size
+            _total_size -= _size
+    return _removed_count, _removed_size, _total_size
+
+
+def _same_mode(blob_file_path: str, file_path: str) -> bool:
+    """
+    :param blob_file_path: Name und Pfad der Datei im Store
+    :param file_path: Name und Pfad einer Datei gleichen Inhalts
+    :return: True, falls beide Dateien dieselben Zugriffsrechte haben
+    """
+    return stat.S_IMODE(os.stat(blob_file_path).st_mode) == stat.S_IMODE(os.stat(file_path).st_mode)
+
+
+def _replace_with_link(blob_file_path: str, file_path: str) -> bool:
+    """
+    Ersetzt eine Datei durch einen Link auf die Datei gleichen Inhalts im Store.
+    :param blob_file_path: Name und Pfad der Datei im Store
+    :param file_path: Name und Pfad der zu ersetzenden Datei
+    :return: True, falls die Datei ersetzt wurde
+    """
+    _temp_path = _temp_file_path(os.path.dirname(file_path))
+    if not clone_file(blob_file_path, _temp_path):
+        return False
+    os.replace(_temp_path, file_path)
+    return True
+
+
+def _temp_file_path(dir_path: str) -> str:
+    """
+    :param dir_path: Verzeichnis
+    :return: Name und Pfad für eine noch nicht existierende temporäre Datei im Verzeichnis
+    """
+    return os.path.join(dir_path, f'{STORE_TEMP_PREFIX}{os.getpid()}-{secrets.token_hex(8)}')
+
+
+def _scandir(dir_path: str) -> list[os.DirEntry]:
+    """
+    :param dir_path: Verzeichnis
+    :return: Einträge des Verzeichnisses, leer falls es nicht existiert
+    """
+    try:
+        with os.scandir(dir_path) as _it:
+            return list(_it)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _remove_quietly(file_path: str) -> bool:
+    """
+    :param file_path: Name und Pfad einer Datei
+    :return: True, falls die Datei entfernt wurde
+    """
+    try:
+        os.remove(file_path)
+        return True
+    except OSError as _e:
+        if _e.errno != errno.ENOENT:
+            print(f'Konnte {file_path} nicht aus dem Store entfernen: {_e}')
+        return False
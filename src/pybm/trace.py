@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Zeitmessung für die Phasen eines Builds.
+Mit der Option --trace zeichnet jeder beteiligte Prozess für jede Phase Laufzeit, CPU-Zeit,
+gelesene und geschriebene Bytes sowie die Anzahl gestarteter Prozesse auf. Die Ereignisse werden
+je Prozess in einem temporären Verzeichnis gesammelt, das über die Umgebungsvariable PYBM_TRACE_DIR
+auch an Worker-Prozesse weitergegeben wird, und am Ende als Chrome-Trace in eine JSON-Datei
+geschrieben. Ohne --trace kostet eine Phase nur die Abfrage der Umgebungsvariable.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from pybm import *
+
+
+# Datei mit den I/O-Zählern des Prozesses, nur unter Linux vorhanden
+PROC_IO_FILE_PATH = '/proc/self/io'
+
+# Anzahl der in diesem Prozess gestarteten Prozesse
+_subprocess_count = 0
+
+# Aufzeichnung des laufenden Prozesses
+_tracer = None
+
+# schützt Prozesszähler und Aufzeichnung, Builds und Befehle laufen auch in mehreren Threads
+_state_lock = threading.Lock()
+
+
+class _Tracer:
+    """
+    Schreibt die Ereignisse eines Prozesses zeilenweise in eine eigene Datei im Trace-Verzeichnis.
+    """
+
+    def __init__(self, trace_dir: str):
+        """
+        Konstruktor.
+        :param trace_dir: Verzeichnis für die Ereignisse aller Prozesse
+        """
+        self.trace_dir = trace_dir
+        self.pid = os.getpid()
+        self.__lock = threading.Lock()
+        self.__file_path = os.path.join(trace_dir, f'{self.pid}.jsonl')
+
+    def write(self, event: dict):
+        """
+        Hängt ein Ereignis an die Datei des Prozesses an.
+        :param event: Ereignis im Chrome-Trace-Format
+        """
+        with self.__lock, open(self.__file_path, 'a') as _f:
+            _f.write(json.dumps(event) + '\n')
+
+
+class _Span:
+    """
+    Misst eine Phase und schreibt sie beim Verlassen als Ereignis.
+    """
+
+    def __init__(self, tracer: _Tracer, name: str, category: str, args: dict):
+        """
+        Konstruktor.
+        :param tracer: Aufzeichnung des Prozesses
+        :param name: Name der Phase
+        :param category: Kategorie der Phase, z.B. staging
+        :param args: zusätzliche Angaben zur Phase
+        """
+        self.__tracer = tracer
+        self.__name = name
+        self.__category = category
+        self.__args = args
+
+    def set(self, **args):
+        """
+        Ergänzt Angaben zur Phase, z.B. Anzahl bearbeiteter Dateien.
+        """
+        self.__args.update(args)
+
+    def __enter__(self):
+        self.__ts = time.time_ns() // 1000
+        self.__start = time.perf_counter_ns()
+        self.__cpu = time.process_time_ns()
+        self.__children_cpu = _children_cpu_time()
+        self.__io = _io_counters()
+        self.__subprocesses = _subprocess_count
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _args = dict(self.__args)
+        _args['cpu_ms'] = round((time.process_time_ns() - self.__cpu) / 1e6, 3)
+        _args['children_cpu_ms'] = round((_children_cpu_time() - self.__children_cpu) * 1e3, 3)
+        _io = _io_counters()
+        if _io is not None and self.__io is not None:
+            _args['read_bytes'] = _io[0] - self.__io[0]
+            _args['write_bytes'] = _io[1] - self.__io[1]
+        _args['subprocesses'] = _subprocess_count - self.__subprocesses
+        if exc_type is not None:
+            _args['error'] = str(exc_val)
+        self.__tracer.write({'name': self.__name, 'cat': self.__category, 'ph': 'X', 'ts': self.__ts,
+                             'dur': (time.perf_counter_ns() - self.__start) // 1000, 'pid': self.__tracer.pid,
+                             'tid': threading.get_native_id(), 'args': _args})
+        return False
+
+
+class _NoSpan:
+    """
+    Ersatz für _Span, wenn nicht aufgezeichnet wird.
+    """
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def trace_span(name: str, category: str, **args) -> _Span | _NoSpan:
+    """
+    Liefert einen Context-Manager, der die umschlossene Phase misst, falls aufgezeichnet wird.
+    :param name: Name der Phase
+    :param category: Kategorie der Phase, z.B. staging
+    :param args: zusätzliche Angaben zur Phase
+    :return: Context-Manager für die Phase
+    """
+    _tracer = _current_tracer()
+    if _tracer is None:
+        return _NO_SPAN
+    return _Span(_tracer, name, category, args)
+
+
+def traced(category: str):
+    """
+    Decorator, der jeden Aufruf der Funktion als Phase mit dem Namen der Funktion misst.
+    :param category: Kategorie der Phase, z.B. archive
+    """
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            with trace_span(func.__name__, category):
+                return func(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+def count_subprocess():
+    """
+    Zählt einen gestarteten Prozess für die Aufzeichnung.
+    """
+    global _subprocess_count
+    with _state_lock:
+        _subprocess_count += 1
+
+
+@contextlib.contextmanager
+def trace_run(trace_file_path: str | None, args: list[str]):
+    """
+    Zeichnet alle Phasen des umschlossenen Aufrufs auf und schreibt sie am Ende als Chrome-Trace.
+    :param trace_file_path: Name und Pfad der Trace-Datei, None um nicht aufzuzeichnen
+    :param args: Argumente der Kommandozeile, werden in der Trace-Datei vermerkt
+    """
+    if trace_file_path is None:
+        yield
+        return
+    _trace_dir = tempfile.mkdtemp(prefix='pybm-trace-')
+    _saved_trace_dir = os.environ.get(ENVA_TRACE_DIR)
+    os.environ[ENVA_TRACE_DIR] = _trace_dir
+    try:
+        with trace_span(' '.join(['pybm'] + args), 'run'):
+            yield
+    finally:
+        if _saved_trace_dir is None:
+            del os.environ[ENVA_TRACE_DIR]
+        else:
+            os.environ[ENVA_TRACE_DIR] = _saved_trace_dir
+        try:
+            write_trace(trace_file_path, _trace_dir, args)
+        finally:
+            shutil.rmtree(_trace_dir, ignore_errors=True)
+
+
+def write_trace(trace_file_path: str, trace_dir: str, args: list[str]):
+    """
+    Fasst die Ereignisse aller Prozesse in einer Datei im Chrome-Trace-Format zusammen.
+    Unter otherData stehen zusätzlich die Summen je Kategorie.
+    :param trace_file_path: Name und Pfad der Trace-Datei
+    :param trace_dir: Verzeichnis mit den Ereignissen der Prozesse
+    :param args: Argumente der Kommandozeile
+    """
+    _events = []
+    for _entry in sorted(os.listdir(trace_dir)):
+        with open(os.path.join(trace_dir, _entry), 'r') as _f:
+            _events.extend(json.loads(_line) for _line in _f if len(_line.strip()) > 0)
+    _events.sort(key=lambda _e: _e['ts'])
+    _summary = {}
+    for _event in _events:
+        _totals = _summary.setdefault(_event['cat'], {'count': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0,
+                                                      'children_cpu_ms': 0.0, 'read_bytes': 0,
+                                                      'write_bytes': 0, 'subprocesses': 0})
+        _totals['count'] += 1
+        _totals['wall_ms'] = round(_totals['wall_ms'] + _event['dur'] / 1000, 3)
+        for _key in ('cpu_ms', 'children_cpu_ms', 'read_bytes', 'write_bytes', 'subprocesses'):
+            _totals[_key] = round(_totals[_key] + _event['args'].get(_key, 0), 3)
+    _trace = {'traceEvents': _events, 'displayTimeUnit': 'ms',
+              'otherData': {'pybm': VERSION, 'command': args, 'summary': _summary}}
+    with open(trace_file_path, 'w') as _f:
+        json.dump(_trace, _f, indent=1)
+    print(f'Trace mit {len(_events)} Ereignissen in {trace_file_path} geschrieben')
+
+
+def _current_tracer() -> _Tracer | None:
+    """
+    :return: Aufzeichnung für den laufenden Prozess, None falls nicht aufgezeichnet wird
+    """
+    global _tracer
+    _trace_dir = os.environ.get(ENVA_TRACE_DIR)
+    if _trace_dir is None:
+        return None
+    with _state_lock:
+        if _tracer is None or _tracer.pid != os.getpid() or _tracer.trace_dir != _trace_dir:
+            _tracer = _Tracer(_trace_dir)
+        return _tracer
+
+
+def _children_cpu_time() -> float:
+    """
+    :return: CPU-Zeit aller beendeten Kind-Prozesse in Sekunden
+    """
+    _times = os.times()
+    return _times.children_user + _times.children_system
+
+
+def _io_counters() -> tuple[int, int] | None:
+    """
+    :return: vom Prozess gelesene und geschriebene Bytes, None falls nicht ermittelbar
+    """
+    try:
+        with open(PROC_IO_FILE_PATH, 'r') as _f:
+            _counters = dict(_line.split(':', 1) for _line in _f if ':' in _line)
+        return int(_counters['rchar']), int(_counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
@@ -36,76 +36,646 @@
 Funktionen für Python build tools.
 """
 
+import contextlib
+import contextvars
+import fnmatch
+import functools
+import json
 import os
 import re
 import shutil
-import subprocess
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 import tomli
 
 from pybm import *
+from pybm.archive import compression_settings
+from pybm.manifest import file_state
+from pybm.store import clone_file
+from pybm.trace import count_subprocess, trace_span, traced
 
 PROJECT_VERSION_PATTERN = re.compile(r'^\s*VERSION\s*=\s*(.*)$')
 
+# Anzahl Bytes am Dateianfang, die auf Null-Bytes geprüft werden, um Binärdateien zu erkennen
+BINARY_SNIFF_SIZE = 8192
 
-def shell_cmd(cmd: list[str]) -> int:
+# Default-Komprimierung je Ziel, entspricht den früher verwendeten Aufrufen von tar
+DEFAULT_COMPRESSION = {TARGET_DEB: {CFG_ALGORITHM: COMPRESSION_XZ},
+                       TARGET_RPM: {CFG_ALGORITHM: COMPRESSION_GZIP}}
+
+# Datei im Cache-Verzeichnis mit den Daten der hatchling-Konfigurationsdateien aller Feature-Sets
+FEATURE_SET_CACHE_FILE_NAME = 'featuresets.json'
+
+# Schlüssel in der Cache-Datei für die Feature-Sets
+KEY_SOURCES = 'sources'
+
+# Blockgröße beim Lesen der Ausgaben gestarteter Prozesse, längere Zeilen werden in Teilen angezeigt
+CMD_READ_SIZE = 65536
+
+# Unterverzeichnis des Cache-Verzeichnisses für Staging-Verzeichnisse, die im Watch-Modus wiederverwendet werden
+STAGING_CACHE_SUBDIR = 'staging'
+
+# Endung der Datei neben einem wiederverwendeten Verzeichnisbaum, die den Stand der kopierten Dateien festhält
+STAGING_STATE_SUFFIX = '.state.json'
+
+# Name des Staging-Verzeichnisses für Projekte ohne Feature-Sets
+STAGING_PROJECT_DIR_NAME = '-'
+
+# Default-Komprimierung für das ZIP-Archiv, die Dateien werden wie bisher unkomprimiert abgelegt
+DEFAULT_CUSTOM_COMPRESSION = {CFG_ALGORITHM: COMPRESSION_NONE, CFG_THREADS: 0}
+
+
+def shell_cmd(cmd: list[str], cwd: str = None, prefix: str = None, timeout: float = None,
+              env: dict = None) -> int:
     """
-    Führt den übergebenen Befehl in der Shell aus.
+    Führt den übergebenen Befehl aus und zeigt seine Ausgaben zeilenweise an, während er läuft.
     :param cmd: auszuführender Befehl
+    :param cwd: optional Arbeitsverzeichnis für den Befehl, Default aktuelles Verzeichnis
+    :param prefix: optional Präfix für jede Ausgabezeile, z.B. das Ziel des Builds
+    :param timeout: optional maximale Laufzeit in Sekunden, Default aus Umgebungsvariable PYBM_CMD_TIMEOUT
+    :param env: optional Umgebungsvariablen, die nur für den Befehl gesetzt oder mit Wert None entfernt werden
     :return: return code.
-    :raises subprocess.TimeoutException: falls bei der Kommunikation zum gestarteten Prozess ein Timeout auftritt
+    :raises RuntimeError: falls der Befehl die maximale Laufzeit überschreitet
+    """
+    return shell_cmds([cmd], cwd, [prefix], timeout, env)[0]
+
+
+def shell_cmds(cmds: list[list[str]], cwd: str = None, prefixes: list[str | None] = None,
+               timeout: float = None, env: dict = None, jobs: int = None) -> list[int]:
+    """
+    Führt mehrere Befehle gleichzeitig aus und zeigt ihre Ausgaben zeilenweise an, während sie laufen.
+    :param cmds: auszuführende Befehle
+    :param cwd: optional Arbeitsverzeichnis für die Befehle, Default aktuelles Verzeichnis
+    :param prefixes: optional Präfix je Befehl für jede Ausgabezeile
+    :param timeout: optional maximale Laufzeit je Befehl in Sekunden, Default aus Umgebungsvariable
+                    PYBM_CMD_TIMEOUT
+    :param env: optional Umgebungsvariablen, die nur für die Befehle gesetzt oder mit Wert None entfernt werden
+    :param jobs: optional maximale Anzahl gleichzeitig laufender Befehle, Default alle
+    :return: return codes in der Reihenfolge der Befehle
+    :raises RuntimeError: falls ein Befehl die maximale Laufzeit überschreitet
+    """
+    # asyncio wird erst hier importiert, weil der Import den Start von pybm spürbar verlangsamt
+    import asyncio
+    _prefixes = prefixes or [None] * len(cmds)
+    _timeout = timeout if timeout is not None else cmd_timeout()
+    _env = command_env(env)
+
+    async def _run_all():
+        _semaphore = asyncio.Semaphore(jobs or len(cmds) or 1)
+
+        async def _run(_cmd, _prefix):
+            async with _semaphore:
+                return await run_cmd_async(_cmd, cwd, _prefix, _timeout, _env)
+        return await asyncio.gather(*(_run(_cmd, _prefix) for _cmd, _prefix in zip(cmds, _prefixes)))
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run_all())
+    # Aufruf aus einer laufenden Event-Loop, z.B. bei Einbettung in einen asynchronen Aufrufer; der Kontext
+    # wird übernommen, damit die Ausgaben des Befehls beim Aufrufer ankommen
+    with ThreadPoolExecutor(max_workers=1) as _executor:
+        return _executor.submit(contextvars.copy_context().run, asyncio.run, _run_all()).result()
+
+
+async def run_cmd_async(cmd: list[str], cwd: str = None, prefix: str = None, timeout: float = None,
+                        env: dict = None) -> int:
+    """
+    Führt den übergebenen Befehl aus und zeigt seine Ausgaben zeilenweise an, während er läuft.
+    Die Ausgaben werden blockweise gelesen und nicht vollständig im Speicher gehalten.
+    :param cmd: auszuführender Befehl
+    :param cwd: optional Arbeitsverzeichnis für den Befehl, Default aktuelles Verzeichnis
+    :param prefix: optional Präfix für jede Ausgabezeile
+    :param timeout: optional maximale Laufzeit in Sekunden
+    :param env: optional vollständige Umgebung für den Befehl, Default Umgebung des laufenden Prozesses
+    :return: return code.
+    :raises RuntimeError: falls der Befehl die maximale Laufzeit überschreitet
+    """
+    import asyncio
+    count_subprocess()
+    with trace_span(os.path.basename(cmd[0]), 'subprocess', cmd=cmd):
+        _process = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, env=env, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+        _line_prefix = '' if prefix is None else f'[{prefix}] '
+        try:
+            await asyncio.wait_for(asyncio.gather(_print_stream(_process.stdout, _line_prefix),
+                                                  _print_stream(_process.stderr, _line_prefix),
+                                                  _process.wait()), timeout)
+        except asyncio.TimeoutError:
+            _process.kill()
+            await _process.wait()
+            raise RuntimeError(f'Befehl {cmd[0]} nach {timeout}s abgebrochen')
+    return _process.returncode
+
+
+def cmd_timeout() -> float | None:
+    """
+    :return: maximale Laufzeit für Befehle aus Umgebungsvariable PYBM_CMD_TIMEOUT, None falls nicht gesetzt
+    :raises RuntimeError: falls die Umgebungsvariable keine gültige Laufzeit enthält
+    """
+    _value = os.getenv(ENVA_CMD_TIMEOUT)
+    if _value is None or len(_value.strip()) == 0:
+        return None
+    try:
+        _timeout = float(_value)
+    except ValueError:
+        _timeout = 0
+    if _timeout <= 0:
+        raise RuntimeError(f'Umgebungsvariable {ENVA_CMD_TIMEOUT} enthält keine gültige Laufzeit')
+    return _timeout
+
+
+def command_env(env: dict | None) -> dict | None:
+    """
+    :param env: Umgebungsvariablen, die gesetzt oder mit Wert None entfernt werden sollen
+    :return: Kopie der Umgebung des laufenden Prozesses mit den Änderungen, None falls keine angegeben sind
+    """
+    if env is None:
+        return None
+    _env = dict(os.environ)
+    for _name, _value in env.items():
+        if _value is None:
+            _env.pop(_name, None)
+        else:
+            _env[_name] = _value
+    return _env
+
+
+async def _print_stream(stream, prefix: str):
+    """
+    Zeigt die Ausgaben eines Prozesses zeilenweise an. Überlange Zeilen werden in Teilen angezeigt.
+    :param stream: asyncio.StreamReader für stdout oder stderr des Prozesses
+    :param prefix: Präfix für jede Zeile
+    """
+    _pending = b''
+    while True:
+        _chunk = await stream.read(CMD_READ_SIZE)
+        if len(_chunk) == 0:
+            break
+        _lines = (_pending + _chunk).split(b'\n')
+        _pending = _lines.pop()
+        if len(_pending) >= CMD_READ_SIZE:
+            _lines.append(_pending)
+            _pending = b''
+        for _line in _lines:
+            print(f'{prefix}{_line.decode("utf-8", errors="replace").rstrip()}')
+    if len(_pending) > 0:
+        print(f'{prefix}{_pending.decode("utf-8", errors="replace").rstrip()}')
+
+
+def source_date_epoch() -> int | None:
+    """
+    :return: Zeitstempel aus Umgebungsvariable SOURCE_DATE_EPOCH, None falls nicht gesetzt
+    :raises RuntimeError: falls die Umgebungsvariable keinen gültigen Zeitstempel enthält
+    """
+    _value = os.getenv(ENVA_SOURCE_DATE_EPOCH)
+    if _value is None or len(_value.strip()) == 0:
+        return None
+    try:
+        return int(_value)
+    except ValueError:
+        raise RuntimeError(f'Umgebungsvariable {ENVA_SOURCE_DATE_EPOCH} enthält keinen gültigen Zeitstempel')
+
+
+def reproducible_build(build_environment: dict) -> bool:
+    """
+    Reproduzierbare Builds sind aktiv, falls in der pybm-Konfigurationsdatei reproducible = true
+    eingestellt oder die Umgebungsvariable SOURCE_DATE_EPOCH gesetzt ist.
+    :param build_environment: Build-Umgebung
+    :return: True, falls Pakete und Archive reproduzierbar erzeugt werden sollen
+    """
+    return build_environment[PAR_REPRODUCIBLE] or source_date_epoch() is not None
+
+
+def archive_mtime(build_environment: dict) -> int | None:
     """
-    _res = subprocess.run(cmd, capture_output=True, encoding='utf-8')
-    if len(_res.stderr) > 0: print(_res.stderr)
-    if len(_res.stdout) > 0: print(_res.stdout)
-    return _res.returncode
+    :param build_environment: Build-Umgebung
+    :return: Zeitstempel für alle Elemente von Paketen und Archiven aus SOURCE_DATE_EPOCH, bei
+             reproduzierbaren Builds ohne SOURCE_DATE_EPOCH 1980-01-01, sonst None für die
+             Zeitstempel der Dateien
+    """
+    _mtime = source_date_epoch()
+    if _mtime is None and build_environment[PAR_REPRODUCIBLE]:
+        return REPRODUCIBLE_TIMESTAMP
+    return _mtime
+
+
+def archive_compression(build_environment: dict, target: str) -> dict:
+    """
+    Liefert die Einstellungen für die Komprimierung eines Ziels. Bei reproduzierbaren Builds wird
+    immer mit einem Thread komprimiert, da xz und zstd mit mehreren Threads andere Daten erzeugen
+    und die Anzahl Threads sonst von der Anzahl CPUs abhängen kann. Dasselbe gilt für Ziele mit
+    Delta-Paketen, deren Archive beim Zusammensetzen mit einem Thread erneut komprimiert werden.
+    :param build_environment: Build-Umgebung
+    :param target: Ziel
+    :return: Einstellungen für die Komprimierung
+    """
+    _compression = build_environment[PAR_COMPRESSION][target]
+    if target in build_environment[PAR_DELTA][CFG_TARGETS]:
+        return dict(_compression, **{CFG_THREADS: 1})
+    if reproducible_build(build_environment) and target != TARGET_CUSTOM:
+        return dict(_compression, **{CFG_THREADS: 1})
+    return _compression
 
 
-def copy_customizable_file(source_path: str, file_name: str, target_path: str, replacements: dict):
+def link_or_copy_file(source_file_path: str, target_path: str) -> str:
+    """
+    Legt eine Datei per Hardlink oder Reflink im Zielverzeichnis ab, falls das Dateisystem dies
+    nicht unterstützt, wird die Datei kopiert. Eine vorhandene Zieldatei wird vorher entfernt und
+    nie überschrieben, da sie mit einer Datei im Store verlinkt sein kann.
+    :param source_file_path: Name und Pfad der Quelldatei
+    :param target_path: Zielverzeichnis
+    :return: Name und Pfad der Zieldatei.
+    """
+    return link_or_copy(source_file_path, os.path.join(target_path, os.path.basename(source_file_path)))
+
+
+def link_or_copy(source_file_path: str, target_file_path: str) -> str:
+    """
+    Legt eine Datei per Hardlink oder Reflink an, falls das Dateisystem dies nicht unterstützt,
+    wird die Datei kopiert. Eine vorhandene Zieldatei wird vorher entfernt und nie überschrieben.
+    Kann als copy_function für shutil.copytree verwendet werden.
+    :param source_file_path: Name und Pfad der Quelldatei
+    :param target_file_path: Name und Pfad der Zieldatei
+    :return: Name und Pfad der Zieldatei.
+    """
+    if os.path.lexists(target_file_path):
+        os.remove(target_file_path)
+    if not clone_file(source_file_path, target_file_path):
+        shutil.copy2(source_file_path, target_file_path)
+    return target_file_path
+
+
+def replacement_pattern(replacements: dict) -> re.Pattern | None:
+    """
+    :param replacements: Daten für die Variablen-Ersetzungen
+    :return: regulärer Ausdruck, der alle Variablen in einem Durchgang findet; None, falls es keine gibt
+    """
+    if len(replacements) == 0:
+        return None
+    return _compiled_replacement_pattern(tuple(sorted(replacements)))
+
+
+def replacement_values(replacements: dict) -> dict[bytes, bytes]:
+    """
+    :param replacements: Daten für die Variablen-Ersetzungen
+    :return: UTF-8-codierter Wert je UTF-8-codierter Variable, passend zu replacement_pattern
+    """
+    return {_v.encode('utf-8'): _r.encode('utf-8') for _v, _r in replacements.items()}
+
+
+@functools.lru_cache(maxsize=32)
+def _compiled_replacement_pattern(variables: tuple) -> re.Pattern:
+    """
+    :param variables: Namen der Variablen
+    :return: regulärer Ausdruck für die Variablen, längere Namen haben Vorrang
+    """
+    _alternatives = sorted(variables, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(_v) for _v in _alternatives).encode('utf-8'))
+
+
+def template_settings(settings: dict) -> dict:
+    """
+    :param settings: Abschnitt [templates] der pybm-Konfigurationsdatei
+    :return: Muster für Dateien, in denen Variablen ersetzt werden bzw. die unverändert kopiert werden
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _templates = {}
+    for _key in (CFG_INCLUDE, CFG_EXCLUDE):
+        _patterns = settings.get(_key, [])
+        if not isinstance(_patterns, list) or not all(isinstance(_p, str) for _p in _patterns):
+            raise RuntimeError(f'Ungültige Dateimuster für Einstellung {_key}')
+        _templates[_key] = _patterns
+    return _templates
+
+
+def is_template(rel_file_path: str, templates: dict | None) -> bool:
+    """
+    :param rel_file_path: Name und Pfad der Datei relativ zum kopierten Verzeichnisbaum
+    :param templates: Muster für Dateien, in denen Variablen ersetzt werden bzw. die unverändert kopiert werden
+    :return: True, falls in der Datei Variablen ersetzt werden sollen
+    """
+    if templates is None:
+        return True
+    _rel_path = rel_file_path.replace(os.sep, '/')
+    if _matches_any(_rel_path, templates.get(CFG_EXCLUDE, [])):
+        return False
+    _include = templates.get(CFG_INCLUDE, [])
+    return len(_include) == 0 or _matches_any(_rel_path, _include)
+
+
+def _matches_any(rel_file_path: str, patterns: list[str]) -> bool:
+    """
+    :param rel_file_path: Name und Pfad der Datei relativ zum kopierten Verzeichnisbaum, Trenner /
+    :param patterns: Dateimuster; Muster ohne / beziehen sich nur auf den Dateinamen
+    :return: True, falls die Datei auf eines der Muster passt
+    """
+    _file_name = rel_file_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(rel_file_path if '/' in _p else _file_name, _p) for _p in patterns)
+
+
+def copy_customizable_file(source_path: str, file_name: str, target_path: str, replacements: dict,
+                           template: bool = True):
     """
     Kopiert eine Datei ins Build-Verzeichnis und ersetzt ggf. Variablen.
+    Alle Variablen werden in einem Durchgang ersetzt. Dateien mit Null-Bytes am Anfang gelten als
+    Binärdateien und werden ebenso wie Dateien, die kein UTF-8 enthalten, unverändert kopiert.
     :param source_path: Verzeichnis, in dem die Datei liegt
     :param file_name: Name der Datei
     :param target_path: Zielverzeichnis
     :param replacements: Daten für die Variablen-Ersetzungen
+    :param template: False, falls die Datei ohne Prüfung auf Variablen kopiert werden soll
+    """
+    _pattern = replacement_pattern(replacements) if template else None
+    _copy_replacing(os.path.join(source_path, file_name), os.path.join(target_path, file_name), _pattern,
+                    replacement_values(replacements) if _pattern is not None else {})
+
+
+def _copy_replacing(source_file_path: str, target_file_path: str, pattern: re.Pattern | None,
+                    values: dict[bytes, bytes]):
+    """
+    Kopiert eine Datei und ersetzt ggf. Variablen. Dateien ohne Variablen werden ebenso wie
+    Binärdateien und Dateien, die kein UTF-8 enthalten, unverändert mit shutil.copy2 kopiert.
+    :param source_file_path: Name und Pfad der Quelldatei
+    :param target_file_path: Name und Pfad der Zieldatei
+    :param pattern: regulärer Ausdruck für die Variablen, None für eine unveränderte Kopie
+    :param values: UTF-8-codierter Wert je UTF-8-codierter Variable
+    """
+    if pattern is not None:
+        with open(source_file_path, 'rb') as _f:
+            _contents = _f.read(BINARY_SNIFF_SIZE)
+            if b'\0' not in _contents:
+                _contents += _f.read()
+                _result, _count = pattern.subn(lambda _m: values[_m.group(0)], _contents)
+                if _count > 0 and _is_utf8(_contents):
+                    with open(target_file_path, 'wb') as _target_file:
+                        _target_file.write(_result)
+                    shutil.copymode(source_file_path, target_file_path)
+                    return
+    shutil.copy2(source_file_path, target_file_path)
+
+
+def _is_utf8(contents: bytes) -> bool:
+    """
+    :param contents: Inhalt einer Datei
+    :return: True, falls der Inhalt gültiges UTF-8 ist
     """
-    _source_fn = os.path.join(source_path, file_name)
-    _target_fn = os.path.join(target_path, file_name)
-    _contents = ''
     try:
-        with open(_source_fn, 'r') as _f:
-            _contents = _f.read()
+        contents.decode('utf-8')
     except UnicodeDecodeError:
-        shutil.copy2(_source_fn, _target_fn)
-        return
-    _stat = os.stat(_source_fn)
-    for _var, _value in replacements.items():
-        _contents = _contents.replace(_var, _value)
-    with open(_target_fn, 'w') as _f:
-        _f.write(_contents)
-    os.chmod(_target_fn, _stat.st_mode)
+        return False
+    return True
 
 
-def copy_customizable_file_tree(source_path: str, target_path: str, replacements: dict):
+@traced('staging')
+def copy_customizable_file_tree(source_path: str, target_path: str, replacements: dict,
+                                templates: dict = None, threads: int = 1):
     """
     Kopiert einen Verzeichnisbaum ins Build-Verzeichnis und ersetzt ggf. Variablen
-    in den kopierten Dateien.
+    in den kopierten Dateien. Zunächst werden alle Verzeichnisse angelegt, danach die Dateien
+    ggf. parallel kopiert.
     :param source_path: Verzeichnis, in dem die Datei liegt
     :param target_path: Zielverzeichnis
     :param replacements: Daten für die Variablen-Ersetzungen
+    :param templates: optional Muster für Dateien, in denen Variablen ersetzt werden bzw. die
+                      unverändert kopiert werden
+    :param threads: maximale Anzahl Threads zum Kopieren der Dateien
     """
-    for _dir, _sub_dirs, _files in os.walk(source_path):
-        _source_dir = _dir[len(source_path):].lstrip(os.sep)
-        _target_dir = os.path.join(target_path, _source_dir)
-        os.makedirs(_target_dir, mode=0o755, exist_ok=True)
+    _start = time.perf_counter()
+    _dirs, _files = _scan_tree(source_path)
+    for _dir in _dirs:
+        os.makedirs(os.path.join(target_path, _dir), mode=0o755, exist_ok=True)
+    _pattern = replacement_pattern(replacements)
+    _copy = functools.partial(_copy_tree_file, source_path, target_path, _pattern,
+                              replacement_values(replacements) if _pattern is not None else {}, templates)
+    if threads > 1 and len(_files) > 1:
+        with ThreadPoolExecutor(max_workers=min(threads, len(_files))) as _executor:
+            for _ in _executor.map(_copy, _files):
+                pass
+    else:
         for _f in _files:
-            copy_customizable_file(_dir, _f, _target_dir, replacements)
+            _copy(_f)
+    if len(_files) > 0:
+        print(f'{len(_files)} Dateien aus {source_path} in {time.perf_counter() - _start:.3f}s bereitgestellt')
 
 
-def py_config_info(project_root: str, file_path: str) -> dict:
+@traced('staging')
+def sync_customizable_file_tree(source_path: str, target_path: str, replacements: dict,
+                                templates: dict = None, threads: int = 1):
+    """
+    Gleicht einen Verzeichnisbaum aus einem früheren Build mit dem Quellbaum ab. Wie bei
+    copy_customizable_file_tree werden ggf. Variablen ersetzt, kopiert werden aber nur Dateien, deren
+    Größe, Zeitstempel oder Zugriffsrechte sich seit dem letzten Abgleich geändert haben. Dateien und
+    Verzeichnisse, die es im Quellbaum nicht mehr gibt, werden entfernt, andere Dateien im Zielbaum
+    bleiben erhalten. Der Stand wird in <Zielverzeichnis>.state.json festgehalten; ändern sich die
+    Variablen-Ersetzungen oder Muster, werden alle Dateien neu kopiert.
+    :param source_path: Verzeichnis, in dem die Datei liegt
+    :param target_path: Zielverzeichnis
+    :param replacements: Daten für die Variablen-Ersetzungen
+    :param templates: optional Muster für Dateien, in denen Variablen ersetzt werden bzw. die
+                      unverändert kopiert werden
+    :param threads: maximale Anzahl Threads zum Kopieren der Dateien
+    """
+    _start = time.perf_counter()
+    _state_file_path = f'{target_path}{STAGING_STATE_SUFFIX}'
+    _settings = json.loads(json.dumps({'replacements': replacements, 'templates': templates}))
+    try:
+        with open(_state_file_path, 'r', encoding='utf-8') as _f:
+            _state = json.load(_f)
+    except (OSError, ValueError):
+        _state = {}
+    _previous_files = _state.get('files', {})
+    _unchanged_candidates = _previous_files if _state.get('settings') == _settings else {}
+    _dirs, _files = _scan_tree(source_path)
+    _current_files = {}
+    _changed = []
+    for _f in _files:
+        try:
+            _stat = os.stat(os.path.join(source_path, _f))
+            _current_files[_f] = [_stat.st_size, _stat.st_mtime_ns, _stat.st_mode]
+        except OSError:
+            # Fehler beim Kopieren melden
+            _current_files[_f] = None
+        if _current_files[_f] is None or _unchanged_candidates.get(_f) != _current_files[_f] or \
+                not os.path.isfile(os.path.join(target_path, _f)):
+            _changed.append(_f)
+    for _f in _previous_files:
+        if _f not in _current_files and os.path.lexists(os.path.join(target_path, _f)):
+            os.remove(os.path.join(target_path, _f))
+    for _dir in sorted(set(_state.get('dirs', [])) - set(_dirs), key=len, reverse=True):
+        with contextlib.suppress(OSError):
+            os.rmdir(os.path.join(target_path, _dir))
+    # Stand vor dem Kopieren entfernen, damit ein abgebrochener Abgleich beim nächsten Mal alles kopiert
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(_state_file_path)
+    for _dir in _dirs:
+        os.makedirs(os.path.join(target_path, _dir), mode=0o755, exist_ok=True)
+    _pattern = replacement_pattern(replacements)
+    _copy = functools.partial(_copy_tree_file, source_path, target_path, _pattern,
+                              replacement_values(replacements) if _pattern is not None else {}, templates)
+    if threads > 1 and len(_changed) > 1:
+        with ThreadPoolExecutor(max_workers=min(threads, len(_changed))) as _executor:
+            for _ in _executor.map(_copy, _changed):
+                pass
+    else:
+        for _f in _changed:
+            _copy(_f)
+    with open(_state_file_path, 'w', encoding='utf-8') as _f:
+        json.dump({'settings': _settings, 'files': _current_files, 'dirs': _dirs}, _f)
+    if len(_files) > 0:
+        print(f'{len(_changed)} von {len(_files)} Dateien aus {source_path} in {time.perf_counter() - _start:.3f}s '
+              f'aktualisiert')
+
+
+@contextlib.contextmanager
+def staging_path(build_environment: dict, target: str, feature_set: str | None, prefix: str = None):
+    """
+    Liefert das Verzeichnis, in dem die Dateien eines Pakets zusammengestellt werden. Normalerweise
+    ist das ein temporäres Verzeichnis; im Watch-Modus (PAR_STAGING_CACHE) bleibt es in
+    dist/.pybm-cache/staging/<Ziel>/<Feature-Set> erhalten und wird beim nächsten Build mit
+    sync_customizable_file_tree abgeglichen.
+    :param build_environment: Build-Umgebung
+    :param target: Ziel
+    :param feature_set: Name des Feature-Sets oder None
+    :param prefix: optional Präfix für den Namen des temporären Verzeichnisses
+    :return: Context-Manager mit Name und Pfad des Verzeichnisses
+    """
+    if not build_environment[PAR_STAGING_CACHE]:
+        with tempfile.TemporaryDirectory(prefix=prefix) as _temp_path:
+            yield _temp_path
+        return
+    _path = os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist', CACHE_DIR_NAME, STAGING_CACHE_SUBDIR,
+                         target, feature_set or STAGING_PROJECT_DIR_NAME)
+    os.makedirs(_path, mode=0o755, exist_ok=True)
+    yield _path
+
+
+def stage_customizable_file_tree(build_environment: dict, source_path: str, target_path: str, replacements: dict):
+    """
+    Stellt einen Verzeichnisbaum im Staging-Verzeichnis bereit, im Watch-Modus durch Abgleich mit
+    dem Stand des letzten Builds, sonst durch Kopieren.
+    :param build_environment: Build-Umgebung
+    :param source_path: Verzeichnis, in dem die Datei liegt
+    :param target_path: Zielverzeichnis
+    :param replacements: Daten für die Variablen-Ersetzungen
+    """
+    if build_environment[PAR_STAGING_CACHE]:
+        sync_customizable_file_tree(source_path, target_path, replacements, build_environment[PAR_TEMPLATES],
+                                    build_environment[PAR_STAGING_THREADS])
+    else:
+        copy_customizable_file_tree(source_path, target_path, replacements, build_environment[PAR_TEMPLATES],
+                                    build_environment[PAR_STAGING_THREADS])
+
+
+def reset_directory(path: str):
+    """
+    Leert ein Verzeichnis bzw. legt es an.
+    :param path: Name und Pfad des Verzeichnisses
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path, mode=0o755)
+
+
+def _scan_tree(source_path: str) -> tuple[list[str], list[str]]:
+    """
+    Ermittelt alle Verzeichnisse und Dateien eines Verzeichnisbaums wie os.walk, d.h. symbolische
+    Links auf Verzeichnisse und nicht lesbare Verzeichnisse werden übergangen.
+    :param source_path: Root-Verzeichnis des Baums
+    :return: Verzeichnisse und Dateien, jeweils relativ zum Root-Verzeichnis
+    """
+    _dirs = []
+    _files = []
+    _pending = ['']
+    while len(_pending) > 0:
+        _dir = _pending.pop()
+        try:
+            with os.scandir(os.path.join(source_path, _dir)) as _entries:
+                _dirs.append(_dir)
+                for _entry in _entries:
+                    _rel_path = os.path.join(_dir, _entry.name)
+                    try:
+                        _is_dir = _entry.is_dir()
+                    except OSError:
+                        _is_dir = False
+                    if not _is_dir:
+                        _files.append(_rel_path)
+                    elif not _entry.is_symlink():
+                        _pending.append(_rel_path)
+        except OSError:
+            continue
+    return _dirs, _files
+
+
+def _copy_tree_file(source_path: str, target_path: str, pattern: re.Pattern | None, values: dict[bytes, bytes],
+                    templates: dict | None, rel_file_path: str):
+    """
+    Kopiert eine Datei eines Verzeichnisbaums und ersetzt ggf. Variablen.
+    :param source_path: Root-Verzeichnis des Quellbaums
+    :param target_path: Root-Verzeichnis des Zielbaums
+    :param pattern: regulärer Ausdruck für die Variablen, None falls es keine gibt
+    :param values: UTF-8-codierter Wert je UTF-8-codierter Variable
+    :param templates: Muster für Dateien, in denen Variablen ersetzt werden bzw. die unverändert kopiert werden
+    :param rel_file_path: Name und Pfad der Datei relativ zum Root-Verzeichnis
+    """
+    _copy_replacing(os.path.join(source_path, rel_file_path), os.path.join(target_path, rel_file_path),
+                    pattern if is_template(rel_file_path, templates) else None, values)
+
+
+def staging_threads(settings: dict) -> int:
+    """
+    :param settings: Abschnitt [staging] der pybm-Konfigurationsdatei
+    :return: maximale Anzahl Threads zum Kopieren von Verzeichnisbäumen, Default 1; 0 steht für
+             eine an die Anzahl der CPUs angepasste Anzahl
+    :raises RuntimeError: falls die Einstellung ungültig ist
+    """
+    _threads = settings.get(CFG_THREADS, 1)
+    if not isinstance(_threads, int) or _threads < 0:
+        raise RuntimeError(f'Ungültige Anzahl Threads {_threads} für das Kopieren von Dateien')
+    return _threads or min(32, (os.cpu_count() or 1) + 4)
+
+
+def reproducible_setting(config: dict) -> bool:
+    """
+    :param config: Inhalt der pybm-Konfigurationsdatei
+    :return: Einstellung reproducible, Default False
+    :raises RuntimeError: falls die Einstellung ungültig ist
+    """
+    _reproducible = config.get(CFG_REPRODUCIBLE, False)
+    if not isinstance(_reproducible, bool):
+        raise RuntimeError(f'Ungültiger Wert {_reproducible} für Einstellung {CFG_REPRODUCIBLE}')
+    return _reproducible
+
+
+def delta_settings(settings: dict, project_root: str) -> dict:
+    """
+    :param settings: Abschnitt [delta] der pybm-Konfigurationsdatei
+    :param project_root: Root-Verzeichnis des Projekts, Bezug für ein relatives Archiv-Verzeichnis
+    :return: Ziele, für die Delta-Pakete erzeugt werden, Default keine, und absoluter Pfad des
+             Archiv-Verzeichnisses mit früheren Versionen oder None
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _targets = settings.get(CFG_TARGETS, [])
+    if not isinstance(_targets, list) or any(_t not in (TARGET_DEB, TARGET_RPM) for _t in _targets):
+        raise RuntimeError(f'Ungültige Ziele {_targets} für Delta-Pakete, möglich sind {TARGET_DEB} '
+                           f'und {TARGET_RPM}')
+    _archive = settings.get(CFG_ARCHIVE)
+    if _archive is not None and (not isinstance(_archive, str) or len(_archive) == 0):
+        raise RuntimeError(f'Ungültiges Archiv-Verzeichnis {_archive} für Delta-Pakete')
+    if _archive is not None:
+        _archive = os.path.join(project_root, os.path.expanduser(_archive))
+    return {CFG_TARGETS: _targets, CFG_ARCHIVE: _archive}
+
+
+def py_config_info(project_root: str, file_path: str, source_files: list[str] = None) -> dict:
     """
     :param project_root: Root-Verzeichnis des Projekts
     :param file_path: Name und Pfad der hatchling-Konfigurationsdatei
+    :param source_files: optional Liste, an die alle gelesenen Dateien angehängt werden
     :returns: relevante Daten der hatchling-Konfigurationsdatei
     """
     if not os.path.isfile(file_path):
@@ -116,9 +686,11 @@ def py_config_info(project_root: str, file_path: str) -> dict:
         _py_package_name = _toml_data['project']['name']
         _version_fn = _toml_data['tool']['hatch']['version']['path']
         _version_file_path = os.path.join(project_root, _version_fn)
+        if source_files is not None:
+            source_files.extend((file_path, _version_file_path))
+        # die Datei wird nur bis zur Zeile mit der Version gelesen
         with open(_version_file_path, 'r') as _src_file:
-            _lines = _src_file.readlines()
-            for _line in _lines:
+            for _line in _src_file:
                 _vm = PROJECT_VERSION_PATTERN.match(_line.strip())
                 if _vm:
                     _version = _vm.group(1).strip('"').strip("'")
@@ -128,34 +700,253 @@ def py_config_info(project_root: str, file_path: str) -> dict:
     return {PAR_PACKAGE_NAME: _py_package_name, PAR_PROJECT_VERSION: _version}
 
 
-def build_env_for(project: str) -> dict:
+class FeatureSets(Mapping):
+    """
+    Daten der Feature-Sets eines Projekts nach Namen des Feature-Sets. Die Namen stehen sofort fest,
+    die Daten eines Feature-Sets werden erst beim ersten Zugriff ermittelt. Sie werden in
+    dist/.pybm-cache zwischengespeichert und nur neu gelesen, wenn sich die hatchling-Konfigurationsdatei
+    oder die Datei mit der Version geändert hat. Zugriffe aus mehreren Threads sind möglich.
+    """
+
+    def __init__(self, project_root: str, cfg_file_paths: dict[str, str], source_files: list[str]):
+        """
+        Konstruktor.
+        :param project_root: Root-Verzeichnis des Projekts
+        :param cfg_file_paths: Name und Pfad der hatchling-Konfigurationsdatei je Feature-Set
+        :param source_files: Liste, an die die gelesenen Dateien eines Feature-Sets beim ersten Zugriff
+                             angehängt werden
+        """
+        self.__project_root = project_root
+        self.__cfg_file_paths = cfg_file_paths
+        self.__source_files = source_files
+        self.__cache = None
+        self.__data = {}
+        self.__lock = threading.Lock()
+
+    def __getitem__(self, feature_set: str) -> dict:
+        """
+        :param feature_set: Name des Feature-Sets, leer für Projekte ohne Feature-Sets
+        :return: relevante Daten der hatchling-Konfigurationsdatei des Feature-Sets
+        :raises KeyError: falls das Feature-Set nicht existiert
+        :raises RuntimeError: falls die Konfigurationsdatei nicht gelesen werden kann
+        """
+        _data = self.__data.get(feature_set)
+        if _data is None:
+            _cfg_file_path = self.__cfg_file_paths[feature_set]
+            with self.__lock:
+                _data = self.__data.get(feature_set)
+                if _data is None:
+                    if self.__cache is None:
+                        self.__cache = load_feature_set_cache(self.__project_root)
+                    _data = cached_config_info(self.__project_root, feature_set, _cfg_file_path,
+                                               self.__source_files, self.__cache)
+                    self.__data[feature_set] = _data
+        return _data
+
+    def __getstate__(self) -> dict:
+        """
+        :return: Zustand ohne Lock, z.B. für die Übergabe an andere Prozesse
+        """
+        _state = self.__dict__.copy()
+        del _state['_FeatureSets__lock']
+        return _state
+
+    def __setstate__(self, state: dict):
+        """
+        :param state: Zustand ohne Lock
+        """
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __contains__(self, feature_set) -> bool:
+        return feature_set in self.__cfg_file_paths
+
+    def __iter__(self):
+        return iter(self.__cfg_file_paths)
+
+    def __len__(self) -> int:
+        return len(self.__cfg_file_paths)
+
+
+def cached_config_info(project_root: str, feature_set: str, cfg_file_path: str, source_files: list[str],
+                       cache: dict) -> dict:
+    """
+    Liefert die Daten der hatchling-Konfigurationsdatei eines Feature-Sets aus dem Cache, falls
+    Konfigurationsdatei und Datei mit der Version nach Größe und Zeitstempel oder Hash unverändert sind.
+    Andernfalls wird die Konfigurationsdatei gelesen und der Cache aktualisiert.
+    :param project_root: Root-Verzeichnis des Projekts
+    :param feature_set: Name des Feature-Sets, leer für Projekte ohne Feature-Sets
+    :param cfg_file_path: Name und Pfad der hatchling-Konfigurationsdatei
+    :param source_files: Liste, an die die gelesenen Dateien angehängt werden
+    :param cache: zwischengespeicherte Daten je Feature-Set, wird bei Änderungen aktualisiert und geschrieben
+    :return: relevante Daten der hatchling-Konfigurationsdatei
+    :raises RuntimeError: falls die Konfigurationsdatei nicht gelesen werden kann
+    """
+    _entry = cache.get(feature_set)
+    _rel_cfg_path = os.path.relpath(cfg_file_path, project_root)
+    if _entry is not None and _rel_cfg_path in _entry[KEY_SOURCES]:
+        try:
+            _states = {_p: file_state(os.path.join(project_root, _p), _s) for _p, _s in _entry[KEY_SOURCES].items()}
+        except OSError:
+            _states = None
+        if _states is not None and all(_states[_p][2] == _s[2] for _p, _s in _entry[KEY_SOURCES].items()):
+            source_files.extend(os.path.join(project_root, _p) for _p in _states)
+            if _states != _entry[KEY_SOURCES]:
+                # Inhalt unverändert, nur Zeitstempel neu festhalten
+                _entry[KEY_SOURCES] = _states
+                _store_feature_set_cache(project_root, cache)
+            return {PAR_PACKAGE_NAME: _entry[PAR_PACKAGE_NAME], PAR_PROJECT_VERSION: _entry[PAR_PROJECT_VERSION]}
+    _files = []
+    _info = py_config_info(project_root, cfg_file_path, _files)
+    source_files.extend(_files)
+    cache[feature_set] = dict(_info)
+    cache[feature_set][KEY_SOURCES] = {os.path.relpath(_f, project_root): file_state(_f, None) for _f in _files}
+    _store_feature_set_cache(project_root, cache)
+    return _info
+
+
+def load_feature_set_cache(project_root: str) -> dict:
+    """
+    :param project_root: Root-Verzeichnis des Projekts
+    :return: zwischengespeicherte Daten je Feature-Set, leer falls keine existieren oder die Datei unlesbar ist
+    """
+    try:
+        with open(_feature_set_cache_file_path(project_root), 'r') as _f:
+            _cache = json.load(_f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(_cache, dict) or _cache.get('pybm') != VERSION:
+        return {}
+    return _cache.get(PAR_FEATURE_SETS, {})
+
+
+def _store_feature_set_cache(project_root: str, cache: dict):
     """
-    Erzeugt ein Python wheel für das angegebenes Projekt und ggf. Feature-Set.
+    Schreibt die Cache-Datei für die Feature-Sets. Fehler werden ignoriert, der Cache ist nur eine Optimierung.
+    :param project_root: Root-Verzeichnis des Projekts
+    :param cache: zwischengespeicherte Daten je Feature-Set
+    """
+    _cache_file_path = _feature_set_cache_file_path(project_root)
+    _cache_dir = os.path.dirname(_cache_file_path)
+    try:
+        os.makedirs(_cache_dir, mode=0o755, exist_ok=True)
+        _fd, _temp_file_path = tempfile.mkstemp(prefix='.featuresets-', dir=_cache_dir)
+        try:
+            with os.fdopen(_fd, 'w') as _f:
+                json.dump({'pybm': VERSION, PAR_FEATURE_SETS: cache}, _f, indent=1, sort_keys=True)
+            os.replace(_temp_file_path, _cache_file_path)
+        except BaseException:
+            os.unlink(_temp_file_path)
+            raise
+    except OSError:
+        pass
+
+
+def _feature_set_cache_file_path(project_root: str) -> str:
+    """
+    :param project_root: Root-Verzeichnis des Projekts
+    :return: Name und Pfad der Cache-Datei für die Feature-Sets
+    """
+    return os.path.join(project_root, 'dist', CACHE_DIR_NAME, FEATURE_SET_CACHE_FILE_NAME)
+
+
+def pybm_config(project_root: str) -> dict:
+    """
+    :param project_root: Root-Verzeichnis des Projekts
+    :return: Inhalt der pybm-Konfigurationsdatei build/pybm.toml, leer falls nicht vorhanden
+    :raises RuntimeError: falls die Konfigurationsdatei fehlerhaft ist
+    """
+    _cfg_file_path = os.path.join(project_root, 'build', PYBM_CFG_FILE_NAME)
+    if not os.path.isfile(_cfg_file_path):
+        return {}
+    with open(_cfg_file_path, 'rb') as _cfg_file:
+        try:
+            return tomli.load(_cfg_file)
+        except tomli.TOMLDecodeError as _e:
+            raise RuntimeError(f'Konfigurationsdatei {_cfg_file_path} fehlerhaft: {_e}')
+
+
+def compression_config(config: dict) -> dict:
+    """
+    Ermittelt die Einstellungen für die Komprimierung je Ziel. Einstellungen im Abschnitt
+    [<Ziel>.compression] haben Vorrang vor denen im Abschnitt [compression] für alle Ziele.
+    Das ZIP-Archiv für manuelle Installation wird nur über [custom.compression] eingestellt.
+    :param config: Inhalt der pybm-Konfigurationsdatei
+    :return: Einstellungen für die Komprimierung je Ziel
+    :raises RuntimeError: falls die Einstellungen ungültig sind
+    """
+    _project_settings = config.get(CFG_COMPRESSION, {})
+    _compression = {}
+    for _target, _defaults in DEFAULT_COMPRESSION.items():
+        _target_settings = config.get(_target, {}).get(CFG_COMPRESSION, {})
+        _compression[_target] = compression_settings(_target_settings,
+                                                      compression_settings(_project_settings, _defaults))
+    _custom_settings = config.get(TARGET_CUSTOM, {}).get(CFG_COMPRESSION, {})
+    _compression[TARGET_CUSTOM] = compression_settings(_custom_settings, DEFAULT_CUSTOM_COMPRESSION)
+    return _compression
+
+
+def build_env_for(project: str, projects_root: str = None) -> dict:
+    """
+    Ermittelt die Build-Umgebung für das angegebene Projekt. Alle Pfade darin sind absolut, die
+    Builds hängen deshalb nicht vom aktuellen Verzeichnis ab.
     :param project: Name des Projekts
+    :param projects_root: optional Root-Verzeichnis für Projekte, Default aus Umgebungsvariable PYBM_PROJECTS_ROOT
     :return: Build-Umgebung.
     :raises RuntimeException: falls die Build-Umgebung nicht korrekt erstellt wurde
     """
-    _projects_root = os.getenv(ENVA_PROJECTS_ROOT)
+    _projects_root = projects_root if projects_root is not None else os.getenv(ENVA_PROJECTS_ROOT)
     if _projects_root is None or not os.path.isdir(_projects_root):
+        if projects_root is not None:
+            raise RuntimeError(f'Root-Verzeichnis für Projekte {projects_root} existiert nicht')
         raise RuntimeError(f'Umgebungsvariable {ENVA_PROJECTS_ROOT} nicht gesetzt oder kein Verzeichnis')
-    _project_root = os.path.join(_projects_root, project)
+    _project_root = os.path.join(os.path.abspath(_projects_root), project)
     if not os.path.isdir(_project_root):
         raise RuntimeError(f'Projektverzeichnis {_project_root} existiert nicht')
     _testing_root = os.getenv(ENVA_TESTING_ROOT)
-    _feature_sets = {}
+    _wheel_backend = os.getenv(ENVA_WHEEL_BACKEND, WHEEL_BACKEND_NATIVE).lower()
+    if _wheel_backend not in (WHEEL_BACKEND_CLI, WHEEL_BACKEND_NATIVE):
+        raise RuntimeError(f'Ungültiger Wert {_wheel_backend} für Umgebungsvariable {ENVA_WHEEL_BACKEND}')
+    _rpm_backend = os.getenv(ENVA_RPM_BACKEND, RPM_BACKEND_NATIVE).lower()
+    if _rpm_backend not in (RPM_BACKEND_NATIVE, RPM_BACKEND_RPMBUILD):
+        raise RuntimeError(f'Ungültiger Wert {_rpm_backend} für Umgebungsvariable {ENVA_RPM_BACKEND}')
+    _cfg_file_paths = {}
     _feature_sets_path = os.path.join(_project_root, 'build', 'featuresets')
+    # alle Dateien und Verzeichnisse, aus denen die Build-Umgebung ermittelt wird; die Konfigurationsdateien
+    # der Feature-Sets werden beim ersten Zugriff auf das jeweilige Feature-Set ergänzt
+    _source_files = [_feature_sets_path, os.path.join(_project_root, 'build', PYBM_CFG_FILE_NAME)]
     if os.path.isdir(_feature_sets_path):
         for _feature_set in os.listdir(_feature_sets_path):
-            _cfg_fn = os.path.join(_feature_sets_path, _feature_set, 'wheel', WHEEL_CFG_FILE_NAME)
-            _feature_sets[_feature_set] = py_config_info(_project_root, _cfg_fn)
+            _cfg_file_paths[_feature_set] = os.path.join(_feature_sets_path, _feature_set, 'wheel',
+                                                         WHEEL_CFG_FILE_NAME)
     else:
-        _cfg_fn = os.path.join(_project_root, WHEEL_CFG_FILE_NAME)
-        _feature_sets[''] = py_config_info(_project_root, _cfg_fn)
+        _cfg_file_paths[''] = os.path.join(_project_root, WHEEL_CFG_FILE_NAME)
+    _feature_sets = FeatureSets(_project_root, _cfg_file_paths, _source_files)
+    _pybm_config = pybm_config(_project_root)
     _build_env = {PAR_FEATURE_SETS: _feature_sets, PAR_PROJECT_ROOT: _project_root,
-                  PAR_TESTING_ROOT: _testing_root}
+                  PAR_TESTING_ROOT: _testing_root, PAR_WHEEL_BACKEND: _wheel_backend,
+                  PAR_RPM_BACKEND: _rpm_backend,
+                  PAR_PYBM_CONFIG: _pybm_config, PAR_COMPRESSION: compression_config(_pybm_config),
+                  PAR_TEMPLATES: template_settings(_pybm_config.get(CFG_TEMPLATES, {})),
+                  PAR_STAGING_THREADS: staging_threads(_pybm_config.get(CFG_STAGING, {})),
+                  PAR_REPRODUCIBLE: reproducible_setting(_pybm_config),
+                  PAR_DELTA: delta_settings(_pybm_config.get(CFG_DELTA, {}), _project_root),
+                  PAR_STAGING_CACHE: False,
+                  PAR_SOURCE_FILES: _source_files}
     return _build_env
 
 
+def remove_stale_wheels(target_path: str, wheel_file_name: str):
+    """
+    Entfernt wheels früherer Versionen aus einem wiederverwendeten Staging-Verzeichnis.
+    :param target_path: Verzeichnis, in dem das wheel bereitgestellt wird
+    :param wheel_file_name: Name des aktuellen wheels
+    """
+    for _entry in os.scandir(target_path):
+        if _entry.name.endswith('.whl') and _entry.name != wheel_file_name and not _entry.is_dir():
+            os.remove(_entry.path)
+
+
 def wheel_file_name(build_environment: dict, feature: str = None) -> str:
     """
     :param build_environment: Build-Umgebung
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------------------------
+# pybm - Tools für die Entwicklung von Python-Projekten.
+#
+# Copyright (c) 2025, Frank Sommer.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# -----------------------------------------------------------------------------------------------
+
+"""
+Watch-Modus: überwacht die Quellen eines Projekts und baut nach jeder Änderung nur die betroffenen
+Ziele und Feature-Sets neu.
+Überwacht werden src, build mit den Feature-Sets und die Dateien im Projekt-Rootverzeichnis, unter
+Linux per inotify, sonst durch regelmäßiges Vergleichen der Zeitstempel. Änderungen, die kurz
+aufeinander folgen, werden zu einem Durchlauf zusammengefasst. Die Staging-Verzeichnisse der Pakete
+bleiben zwischen den Durchläufen erhalten, es werden nur geänderte Dateien neu kopiert.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import time
+from collections.abc import Callable
+
+from pybm import *
+from pybm.release import FEATURE_SET_TARGETS, TARGET_BUILD_TYPES, WHEEL_TARGETS
+
+
+# Ziele, die im Watch-Modus gebaut werden können, in der Reihenfolge der Ausführung
+WATCH_TARGETS = (TARGET_WHEEL, TARGET_DEB, TARGET_RPM, TARGET_CUSTOM, TARGET_NSIS)
+
+# Ziele, falls keine angegeben werden
+DEFAULT_WATCH_TARGETS = (TARGET_WHEEL,)
+
+# Verzeichnisse des Projekts, die mit allen Unterverzeichnissen überwacht werden
+WATCHED_DIRS = ('src', 'build')
+
+# Wartezeit in Sekunden ohne weitere Änderung, bevor gebaut wird
+DEBOUNCE_DELAY = 0.3
+
+# Intervall in Sekunden für den Vergleich der Zeitstempel, falls inotify nicht verfügbar ist
+POLL_INTERVAL = 1.0
+
+# Dateien und Verzeichnisse, deren Änderungen keinen Build auslösen (Editoren, Python-Cache)
+IGNORED_NAME_PATTERNS = ('*~', '.#*', '*.swp', '*.swx', '4913', '*.pyc', '__pycache__', '.git')
+
+# Konstanten aus <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                 IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT_FORMAT = 'iIII'
+INOTIFY_READ_SIZE = 65536
+
+
+def watch_project(build_env_provider: Callable[[str], dict], project: str, targets: list[str] | None,
+                  force: bool = False):
+    """
+    Baut die angegebenen Ziele eines Projekts und danach bei jeder Änderung die betroffenen Ziele
+    und Feature-Sets neu, bis der Prozess mit Strg+C beendet wird. Fehlgeschlagene Builds beenden
+    den Watch-Modus nicht.
+    :param build_env_provider: Funktion, die die Build-Umgebung für ein Projekt liefert
+    :param project: Name des Projekts
+    :param targets: Ziele, None für die Default-Ziele
+    :param force: True, um beim ersten Durchlauf auch unveränderte Ziele zu bauen
+    :raises RuntimeError: falls ein Ziel unbekannt ist oder die Build-Umgebung nicht erstellt werden kann
+    """
+    _targets = watch_targets(targets)
+    _project_root = build_env_provider(project)[PAR_PROJECT_ROOT]
+    _watcher = create_watcher(_project_root)
+    try:
+        print(f'Überwache Projekt {project} für {", ".join(_targets)}, Ende mit Strg+C')
+        _run_pass(build_env_provider, project, _targets, None, force)
+        while True:
+            _changes = _watcher.wait(None)
+            while len(_changes) > 0:
+                _more = _watcher.wait(DEBOUNCE_DELAY)
+                if len(_more) == 0:
+                    break
+                _changes |= _more
+            if len(_changes) > 0:
+                _run_pass(build_env_provider, project, _targets, _changes, False)
+    except KeyboardInterrupt:
+        print('Watch-Modus beendet')
+    finally:
+        _watcher.close()
+
+
+def watch_targets(targets: list[str] | None) -> list[str]:
+    """
+    :param targets: Ziele aus der Kommandozeile, None für die Default-Ziele
+    :return: gültige Ziele ohne Duplikate in der Reihenfolge der Ausführung
+    :raises RuntimeError: falls ein Ziel unbekannt ist
+    """
+    if targets is None:
+        return list(DEFAULT_WATCH_TARGETS)
+    for _target in targets:
+        if _target not in WATCH_TARGETS:
+            raise RuntimeError(f'Unbekanntes Ziel {_target} für den Watch-Modus, möglich sind '
+                               f'{", ".join(WATCH_TARGETS)}')
+    return [_t for _t in WATCH_TARGETS if _t in targets]
+
+
+def affected_builds(project_root: str, feature_sets: list[str], targets: list[str],
+                    changed_paths: set[str] | None) -> list[tuple[str, str | None]]:
+    """
+    Ermittelt die Builds, die von geänderten Dateien betroffen sind. Änderungen in src und im
+    Projekt-Rootverzeichnis und an der wheel-Konfiguration eines Feature-Sets betreffen das wheel
+    und damit alle Pakete, die es enthalten; Änderungen in den Verzeichnissen eines Ziels nur dieses
+    Ziel. Die Daten für Debian-Pakete werden auch in das ZIP-Archiv übernommen. Alle anderen
+    Änderungen, z.B. an pybm.toml oder neue Feature-Sets, betreffen alle Builds.
+    :param project_root: Root-Verzeichnis des Projekts
+    :param feature_sets: Namen der Feature-Sets, '' für Projekte ohne Feature-Sets
+    :param targets: Ziele im Watch-Modus
+    :param changed_paths: geänderte Dateien und Verzeichnisse, None für alle Builds
+    :return: Ziel und Feature-Set je Build in der Reihenfolge der Ausführung, Feature-Set None für
+             Ziele, die alle Feature-Sets umfassen
+    """
+    _all = changed_paths is None
+    _wheels = set()
+    _changed = set()
+    for _path in changed_paths or []:
+        _parts = os.path.relpath(_path, project_root).split(os.sep)
+        if _parts[0] == 'src' or len(_parts) == 1:
+            _wheels.update(feature_sets)
+            continue
+        if _parts[0] != 'build' or len(_parts) < 3:
+            _all = True
+            continue
+        if _parts[1] == 'featuresets':
+            if len(_parts) < 4 or _parts[2] not in feature_sets:
+                _all = True
+                continue
+            _feature_set, _target_dir = _parts[2], _parts[3]
+        elif '' in feature_sets:
+            _feature_set, _target_dir = '', _parts[1]
+        else:
+            _all = True
+            continue
+        if _target_dir == TARGET_WHEEL:
+            _wheels.add(_feature_set)
+        elif _target_dir in (TARGET_DEB, TARGET_RPM):
+            _changed.add((_target_dir, _feature_set))
+            if _target_dir == TARGET_DEB:
+                _changed.add((TARGET_CUSTOM, None))
+        elif _target_dir in (TARGET_CUSTOM, TARGET_NSIS):
+            _changed.add((_target_dir, None))
+        else:
+            _all = True
+    _builds = []
+    for _target in targets:
+        if _target in FEATURE_SET_TARGETS:
+            _builds.extend((_target, _fs or None) for _fs in feature_sets
+                           if _all or _fs in _wheels or (_target, _fs) in _changed)
+        elif _all or (_target in WHEEL_TARGETS and len(_wheels) > 0) or (_target, None) in _changed:
+            _builds.append((_target, None))
+    return _builds
+
+
+def _run_pass(build_env_provider: Callable[[str], dict], project: str, targets: list[str],
+              changed_paths: set[str] | None, force: bool):
+    """
+    Führt einen Durchlauf des Watch-Modus aus. Die Build-Umgebung wird jedes Mal neu ermittelt,
+    damit geänderte Konfigurationsdateien berücksichtigt werden.
+    :param build_env_provider: Funktion, die die Build-Umgebung für ein Projekt liefert
+    :param project: Name des Projekts
+    :param targets: Ziele im Watch-Modus
+    :param changed_paths: geänderte Dateien und Verzeichnisse, None für den ersten Durchlauf
+    :param force: True, um auch unveränderte Ziele zu bauen
+    """
+    from pybm.cli import run_build
+    _start = time.perf_counter()
+    try:
+        _build_env = build_env_provider(project)
+    except RuntimeError as _e:
+        print(str(_e))
+        return
+    _build_env[PAR_FORCE_BUILD] = force
+    _build_env[PAR_STAGING_CACHE] = True
+    _builds = affected_builds(_build_env[PAR_PROJECT_ROOT], list(_build_env[PAR_FEATURE_SETS]), targets,
+                              changed_paths)
+    if changed_paths is not None:
+        _names = [_t if _fs is None else f'{_t}:{_fs}' for _t, _fs in _builds]
+        print(f'{len(changed_paths)} Änderung(en), baue {", ".join(_names) if len(_names) > 0 else "nichts"}')
+    _failed = 0
+    for _target, _feature_set in _builds:
+        try:
+            run_build(TARGET_BUILD_TYPES[_target], _build_env, project,
+                      FEATURE_SET_ALL if _target not in FEATURE_SET_TARGETS else _feature_set)
+        except Exception as _e:
+            print(str(_e))
+            _failed += 1
+    _status = 'fehlerfrei' if _failed == 0 else f'mit {_failed} fehlgeschlagenen Build(s)'
+    print(f'Durchlauf {_status} in {time.perf_counter() - _start:.1f}s beendet, warte auf Änderungen')
+
+
+def create_watcher(project_root: str):
+    """
+    :param project_root: Root-Verzeichnis des Projekts
+    :return: Überwachung der Projektdateien per inotify, falls verfügbar, sonst per Polling
+    """
+    try:
+        return InotifyWatcher(project_root)
+    except OSError as _e:
+        print(f'inotify nicht verfügbar ({_e}), prüfe Änderungen alle {POLL_INTERVAL:.0f}s')
+        return PollingWatcher(project_root)
+
+
+def is_ignored(name: str) -> bool:
+    """
+    :param name: Name einer Datei oder eines Verzeichnisses
+    :return: True, falls Änderungen daran keinen Build auslösen
+    """
+    return any(fnmatch.fnmatchcase(name, _p) for _p in IGNORED_NAME_PATTERNS)
+
+
+class InotifyWatcher:
+    """
+    Überwacht die Projektdateien mit inotify über ctypes. Neue Verzeichnisse werden automatisch
+    in die Überwachung aufgenommen.
+    """
+    def __init__(self, project_root: str):
+        """
+        Konstruktor, richtet die Überwachung ein.
+        :param project_root: Root-Verzeichnis des Projekts
+        :raises OSError: falls inotify nicht verfügbar ist oder nicht genügend Watches erlaubt sind
+        """
+        _libc_name = ctypes.util.find_library('c')
+        if _libc_name is None:
+            raise OSError(errno.ENOSYS, 'C-Bibliothek nicht gefunden')
+        self.__libc = ctypes.CDLL(_libc_name, use_errno=True)
+        if not hasattr(self.__libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify_init1 nicht vorhanden')
+        self.__libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.__fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.__fd < 0:
+            _errno = ctypes.get_errno()
+            raise OSError(_errno, os.strerror(_errno))
+        self.__project_root = project_root
+        self.__paths = {}
+        try:
+            self.__add_watch(project_root)
+            for _dir in WATCHED_DIRS:
+                self.__add_tree(os.path.join(project_root, _dir))
+        except OSError:
+            os.close(self.__fd)
+            raise
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """
+        Wartet auf Änderungen.
+        :param timeout: maximale Wartezeit in Sekunden, None für unbegrenzt
+        :return: geänderte Dateien und Verzeichnisse, leer falls es innerhalb der Wartezeit keine gab
+        """
+        _ready, _, _ = select.select([self.__fd], [], [], timeout)
+        if len(_ready) == 0:
+            return set()
+        _changes = set()
+        _header_size = struct.calcsize(INOTIFY_EVENT_FORMAT)
+        while True:
+            try:
+                _data = os.read(self.__fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                break
+            _pos = 0
+            while _pos + _header_size <= len(_data):
+                _wd, _mask, _cookie, _length = struct.unpack_from(INOTIFY_EVENT_FORMAT, _data, _pos)
+                _name = _data[_pos + _header_size:_pos + _header_size + _length].rstrip(b'\0')
+                _pos += _header_size + _length
+                _path = self.__event_path(_wd, _mask, os.fsdecode(_name))
+                if _path is not None:
+                    _changes.add(_path)
+        return _changes
+
+    def close(self):
+        """
+        Beendet die Überwachung.
+        """
+        os.close(self.__fd)
+
+    def __event_path(self, wd: int, mask: int, name: str) -> str | None:
+        """
+        Wertet ein Ereignis aus und nimmt neue Verzeichnisse in die Überwachung auf.
+        :param wd: Watch-Deskriptor
+        :param mask: Art des Ereignisses
+        :param name: Name der Datei bzw. des Verzeichnisses im überwachten Verzeichnis
+        :return: Name und Pfad der geänderten Datei bzw. des Verzeichnisses oder None, falls das
+                 Ereignis keinen Build auslöst
+        """
+        if mask & IN_Q_OVERFLOW:
+            # Ereignisse verloren, alle Builds ausführen
+            return os.path.join(self.__project_root, 'build')
+        if mask & IN_IGNORED:
+            self.__paths.pop(wd, None)
+            return None
+        _dir_path = self.__paths.get(wd)
+        if _dir_path is None or is_ignored(name):
+            return None
+        _path = os.path.join(_dir_path, name) if name else _dir_path
+        if _dir_path == self.__project_root and mask & IN_ISDIR:
+            # im Projekt-Rootverzeichnis zählen nur Dateien und die überwachten Verzeichnisse
+            if name not in WATCHED_DIRS:
+                return None
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            self.__add_tree(_path)
+        return _path
+
+    def __add_tree(self, path: str):
+        """
+        Nimmt ein Verzeichnis mit allen Unterverzeichnissen in die Überwachung auf.
+        :param path: Name und Pfad des Verzeichnisses
+        :raises OSError: falls nicht genügend Watches erlaubt sind
+        """
+        for _dir_path, _dir_names, _ in os.walk(path):
+            _dir_names[:] = [_d for _d in _dir_names if not is_ignored(_d)]
+            self.__add_watch(_dir_path)
+
+    def __add_watch(self, path: str):
+        """
+        Nimmt ein Verzeichnis in die Überwachung auf, nicht mehr vorhandene Verzeichnisse werden übergangen.
+        :param path: Name und Pfad des Verzeichnisses
+        :raises OSError: falls nicht genügend Watches erlaubt sind
+        """
+        _wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), IN_WATCH_MASK)
+        if _wd < 0:
+            _errno = ctypes.get_errno()
+            if _errno in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(_errno, f'{os.strerror(_errno)}: {path}')
+        self.__paths[_wd] = path
+
+
+class PollingWatcher:
+    """
+    Überwacht die Projektdateien durch regelmäßigen Vergleich von Größe, Zeitstempel und
+    Zugriffsrechten aller Dateien.
+    """
+    def __init__(self, project_root: str):
+        """
+        Konstruktor, ermittelt den aktuellen Stand.
+        :param project_root: Root-Verzeichnis des Projekts
+        """
+        self.__project_root = project_root
+        self.__state = self.__scan()
+
+    def wait(self, timeout: float | None) -> set[str]:
+        """
+        Wartet auf Änderungen.
+        :param timeout: maximale Wartezeit in Sekunden, None für unbegrenzt
+        :return: geänderte Dateien, leer falls es innerhalb der Wartezeit keine gab
+        """
+        _deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            _delay = POLL_INTERVAL if _deadline is None else max(0.0, min(POLL_INTERVAL, _deadline - time.monotonic()))
+            time.sleep(_delay)
+            _state = self.__scan()
+            _changes = {_p for _p in _state.keys() | self.__state.keys() if _state.get(_p) != self.__state.get(_p)}
+            self.__state = _state
+            if len(_changes) > 0 or (_deadline is not None and time.monotonic() >= _deadline):
+                return _changes
+
+    def close(self):
+        """
+        Beendet die Überwachung.
+        """
+        self.__state = {}
+
+    def __scan(self) -> dict[str, tuple]:
+        """
+        :return: Größe, Zeitstempel und Zugriffsrechte je überwachter Datei
+        """
+        _state = {}
+        _pending = [(self.__project_root, False)] + [(os.path.join(self.__project_root, _d), True)
+                                                      for _d in WATCHED_DIRS]
+        while len(_pending) > 0:
+            _dir_path, _recursive = _pending.pop()
+            try:
+                with os.scandir(_dir_path) as _entries:
+                    for _entry in _entries:
+                        if is_ignored(_entry.name):
+                            continue
+                        if _entry.is_dir(follow_symlinks=False):
+                            if _recursive:
+                                _pending.append((_entry.path, True))
+                            continue
+                        _stat = _entry.stat()
+                        _state[_entry.path] = (_stat.st_size, _stat.st_mtime_ns, _stat.st_mode)
+            except OSError:
+                continue
+        return _state
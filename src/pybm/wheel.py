@@ -33,14 +33,32 @@
 # -----------------------------------------------------------------------------------------------
 
 """
-Erzeugt Python wheels per hatchling.
+Erzeugt Python wheels per hatchling, wahlweise über die Kommandozeile von hatchling oder
+direkt im laufenden Prozess (Default).
+Gebaute wheels werden in einem Cache im dist-Verzeichnis des Projekts abgelegt, der Schlüssel
+wird aus den Quelldateien, der hatchling-Konfiguration und der hatchling-Version gebildet.
+Die Paket-Builder holen sich die wheels aus dem Cache, statt sie jedes Mal neu zu erzeugen.
 """
 
+import hashlib
+import importlib.metadata
 import os
 import shutil
+import tempfile
+
+import tomli
 
 from pybm import *
-from pybm.util import shell_cmd
+from pybm.manifest import input_fingerprint, is_up_to_date, record_build
+from pybm.store import store_file
+from pybm.trace import traced
+from pybm.util import link_or_copy, link_or_copy_file, shell_cmd, wheel_file_name
+
+
+CACHE_TEMP_PREFIX = '.tmp-'
+STAGING_EXCLUDES = {'.git', '.idea', '.pytest_cache', '.venv', '__pycache__', 'dist', 'venv'}
+WHEEL_CACHE_SUBDIR = 'wheels'
+WHEEL_FILE_SUFFIX = '-py3-none-any.whl'
 
 
 def build_wheel(build_environment: dict, project: str, feature_set: str = None):
@@ -50,26 +68,262 @@ def build_wheel(build_environment: dict, project: str, feature_set: str = None):
     :param project: Name des Projekts
     :param feature_set: optional Name des Feature-Sets
     """
-    _cfg_file_path = os.path.join(build_environment[PAR_PROJECT_ROOT], WHEEL_CFG_FILE_NAME)
-    _rm_cfg_file = False
-    try:
-        if feature_set is not None:
-            print(f'Erzeuge Python wheel für Projekt {project}, Feature-Set {feature_set}')
-            # Konfigurationsdatei des Feature-Sets ins Projekt-Rootverzeichnis kopieren
-            _f_cfg_file_path = os.path.join(build_environment[PAR_PROJECT_ROOT], 'build',
-                                            'featuresets', feature_set, 'wheel', WHEEL_CFG_FILE_NAME)
-            if not os.path.isfile(_f_cfg_file_path):
-                raise RuntimeError(f'Konfigurationsdatei {_f_cfg_file_path} nicht gefunden')
-            shutil.copy(str(_f_cfg_file_path), str(_cfg_file_path))
-            _rm_cfg_file = True
+    _dist_path = os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist')
+    _wheel_file_name = wheel_file_name(build_environment, feature_set)
+    _wheel_file_path = os.path.join(_dist_path, _wheel_file_name)
+    _sdist_file_path = os.path.join(_dist_path, _wheel_file_name.removesuffix(WHEEL_FILE_SUFFIX) + '.tar.gz')
+    _fingerprint = input_fingerprint(build_environment, TARGET_WHEEL, feature_set,
+                                     wheel_input_paths(build_environment, feature_set),
+                                     {'hatchling': _hatchling_version()})
+    if is_up_to_date(build_environment, TARGET_WHEEL, feature_set, _fingerprint):
+        print(f'Python wheel {_wheel_file_name} ist aktuell, Build übersprungen')
+        return
+    if feature_set is not None:
+        print(f'Erzeuge Python wheel für Projekt {project}, Feature-Set {feature_set}')
+    else:
+        print(f'Erzeuge Python wheel für Projekt {project}')
+    _run_hatchling(build_environment, feature_set, _dist_path)
+    # wheel in den Cache übernehmen, damit die Paket-Builder es nicht erneut erzeugen
+    if os.path.isfile(_wheel_file_path):
+        _store_wheel(build_environment, feature_set, _wheel_file_path)
+    record_build(build_environment, TARGET_WHEEL, feature_set, _fingerprint,
+                 [_p for _p in (_wheel_file_path, _sdist_file_path) if os.path.isfile(_p)])
+
+
+def provide_wheel(build_environment: dict, project: str, feature_set: str, target_path: str = None) -> str:
+    """
+    Stellt das Python wheel für angegebenes Projekt und Feature-Set im Zielverzeichnis bereit.
+    Das wheel wird aus dem Cache geholt und nur erzeugt, falls es dort noch nicht vorhanden ist.
+    :param build_environment: Build-Environment
+    :param project: Name des Projekts
+    :param feature_set: Name des Feature-Sets, None oder leer für Projekte ohne Feature-Sets
+    :param target_path: Zielverzeichnis, None um das wheel nur im Cache bereitzustellen
+    :return: Name und Pfad des bereitgestellten wheels.
+    """
+    _feature_set = feature_set if feature_set else None
+    _cached_wheel_path = cached_wheel_path(build_environment, _feature_set)
+    if os.path.isfile(_cached_wheel_path):
+        print(f'Verwende Python wheel {os.path.basename(_cached_wheel_path)} aus dem Cache')
+    else:
+        if _feature_set is not None:
+            print(f'Erzeuge Python wheel für Projekt {project}, Feature-Set {_feature_set}')
         else:
             print(f'Erzeuge Python wheel für Projekt {project}')
-        if not os.path.isfile(_cfg_file_path):
-            raise RuntimeError(f'Konfigurationsdatei {_cfg_file_path} nicht gefunden')
-        os.chdir(build_environment[PAR_PROJECT_ROOT])
-        _cmd = ['hatchling', 'build']
-        if shell_cmd(_cmd) != 0:
-            raise RuntimeError('Build fehlgeschlagen')
+        _cache_path = os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist', CACHE_DIR_NAME,
+                                   WHEEL_CACHE_SUBDIR)
+        os.makedirs(_cache_path, mode=0o755, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix=CACHE_TEMP_PREFIX, dir=_cache_path) as _temp_path:
+            _run_hatchling(build_environment, _feature_set, _temp_path, 'wheel')
+            _wheel_file_path = os.path.join(_temp_path, os.path.basename(_cached_wheel_path))
+            if not os.path.isfile(_wheel_file_path):
+                raise RuntimeError(f'Python wheel {_wheel_file_path} wurde nicht erzeugt')
+            _store_wheel(build_environment, _feature_set, _wheel_file_path)
+    if target_path is None:
+        return _cached_wheel_path
+    return link_or_copy_file(_cached_wheel_path, target_path)
+
+
+def cached_wheel_path(build_environment: dict, feature_set: str = None) -> str:
+    """
+    :param build_environment: Build-Environment
+    :param feature_set: optional Name des Feature-Sets
+    :return: Name und Pfad des wheels im Cache für den aktuellen Stand der Quelldateien.
+    """
+    return os.path.join(build_environment[PAR_PROJECT_ROOT], 'dist', CACHE_DIR_NAME,
+                        WHEEL_CACHE_SUBDIR, wheel_cache_key(build_environment, feature_set),
+                        wheel_file_name(build_environment, feature_set))
+
+
+def wheel_cache_key(build_environment: dict, feature_set: str = None) -> str:
+    """
+    Ermittelt den Cache-Schlüssel für ein wheel. Er umfasst alle Eingabedateien des wheels
+    und die hatchling-Version.
+    :param build_environment: Build-Environment
+    :param feature_set: optional Name des Feature-Sets
+    :return: Cache-Schlüssel
+    """
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    _hash = hashlib.sha256()
+    _hash.update(_hatchling_version().encode('utf-8'))
+    _source_files = []
+    for _path in wheel_input_paths(build_environment, feature_set):
+        if os.path.isfile(_path):
+            _source_files.append(_path)
+            continue
+        for _dir, _sub_dirs, _files in os.walk(_path):
+            _sub_dirs[:] = [_d for _d in _sub_dirs if _d != '__pycache__']
+            _source_files.extend(os.path.join(_dir, _f) for _f in _files)
+    for _file_path in sorted(_source_files):
+        _rel_path = os.path.relpath(_file_path, _project_root)
+        with open(_file_path, 'rb') as _f:
+            _hash.update(_rel_path.replace(os.sep, '/').encode('utf-8') + b'\0')
+            _hash.update(hashlib.file_digest(_f, 'sha256').digest())
+    return _hash.hexdigest()
+
+
+def wheel_input_paths(build_environment: dict, feature_set: str = None) -> list[str]:
+    """
+    :param build_environment: Build-Environment
+    :param feature_set: optional Name des Feature-Sets
+    :return: Dateien und Verzeichnisse, aus denen das wheel erzeugt wird: die hatchling-Konfiguration
+             des Feature-Sets, die Dateien im Projekt-Rootverzeichnis und das Verzeichnis src
+    """
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    _input_paths = [_wheel_cfg_file_path(build_environment, feature_set)]
+    for _entry in sorted(os.listdir(_project_root)):
+        _entry_path = os.path.join(_project_root, _entry)
+        if os.path.isfile(_entry_path) and _entry_path not in _input_paths:
+            _input_paths.append(_entry_path)
+    _input_paths.append(os.path.join(_project_root, 'src'))
+    return _input_paths
+
+
+def _store_wheel(build_environment: dict, feature_set: str | None, wheel_file_path: str):
+    """
+    Übernimmt ein gebautes wheel in Cache und Store und entfernt veraltete Einträge desselben wheels.
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :param wheel_file_path: Name und Pfad des gebauten wheels
+    """
+    _cached_wheel_path = cached_wheel_path(build_environment, feature_set)
+    _entry_path = os.path.dirname(_cached_wheel_path)
+    _cache_path = os.path.dirname(_entry_path)
+    _wheel_file_name = os.path.basename(_cached_wheel_path)
+    os.makedirs(_entry_path, mode=0o755, exist_ok=True)
+    _temp_path = tempfile.mkdtemp(prefix=CACHE_TEMP_PREFIX, dir=_cache_path)
+    try:
+        os.replace(link_or_copy_file(wheel_file_path, _temp_path), _cached_wheel_path)
     finally:
-        if _rm_cfg_file and os.path.exists(_cfg_file_path):
-            os.remove(_cfg_file_path)
+        shutil.rmtree(_temp_path, ignore_errors=True)
+    store_file(_cached_wheel_path)
+    # veraltete Einträge desselben wheels entfernen
+    for _entry in os.listdir(_cache_path):
+        _old_entry_path = os.path.join(_cache_path, _entry)
+        if _entry.startswith(CACHE_TEMP_PREFIX) or _old_entry_path == _entry_path:
+            continue
+        if os.path.isfile(os.path.join(_old_entry_path, _wheel_file_name)):
+            shutil.rmtree(_old_entry_path, ignore_errors=True)
+
+
+@traced('wheel')
+def _run_hatchling(build_environment: dict, feature_set: str | None, output_path: str,
+                   target: str = None):
+    """
+    Erzeugt wheel und/oder sdist für angegebenes Feature-Set mit dem in der Build-Umgebung
+    eingestellten Backend.
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :param output_path: Verzeichnis, in dem die Build-Ergebnisse abgelegt werden
+    :param target: optional hatchling-Target (wheel oder sdist), Default beide
+    """
+    if build_environment.get(PAR_WHEEL_BACKEND, WHEEL_BACKEND_NATIVE) == WHEEL_BACKEND_CLI:
+        _run_hatchling_cli(build_environment, feature_set, output_path, target)
+    else:
+        _run_hatchling_native(build_environment, feature_set, output_path, target)
+
+
+def _run_hatchling_cli(build_environment: dict, feature_set: str | None, output_path: str,
+                       target: str = None):
+    """
+    Ruft die Kommandozeile von hatchling für angegebenes Feature-Set auf.
+    hatchling läuft in einer eigenen Staging-Kopie des Projekts, die Konfigurationsdatei des
+    Feature-Sets wird nur dort abgelegt. Dadurch können mehrere Feature-Sets gleichzeitig
+    gebaut werden.
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :param output_path: Verzeichnis, in dem hatchling die Build-Ergebnisse ablegt
+    :param target: optional hatchling-Target (wheel oder sdist), Default beide
+    """
+    with tempfile.TemporaryDirectory() as _staging_path:
+        _stage_project(build_environment, feature_set, _staging_path)
+        _cmd = ['hatchling', 'build', '-d', os.path.abspath(output_path)]
+        if target is not None:
+            _cmd.extend(['-t', target])
+        if shell_cmd(_cmd, cwd=_staging_path, prefix=TARGET_WHEEL) != 0:
+            raise RuntimeError('Build fehlgeschlagen')
+
+
+def _run_hatchling_native(build_environment: dict, feature_set: str | None, output_path: str,
+                          target: str = None):
+    """
+    Ruft die Builder von hatchling im laufenden Prozess auf, wie es der PEP 517-Hook build_wheel
+    tut. Das wheel wird direkt aus dem Projekt-Rootverzeichnis mit der Konfiguration des
+    Feature-Sets erzeugt, nur das sdist benötigt eine Staging-Kopie, weil es die
+    Konfigurationsdatei enthalten muss.
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :param output_path: Verzeichnis, in dem die Build-Ergebnisse abgelegt werden
+    :param target: optional hatchling-Target (wheel oder sdist), Default beide
+    """
+    try:
+        from hatchling.builders.sdist import SdistBuilder
+        from hatchling.builders.wheel import WheelBuilder
+    except ImportError:
+        raise RuntimeError('hatchling ist nicht installiert')
+    with open(_wheel_cfg_file_path(build_environment, feature_set), 'rb') as _f:
+        _config = tomli.load(_f)
+    _output_path = os.path.abspath(output_path)
+    os.makedirs(_output_path, mode=0o755, exist_ok=True)
+    try:
+        if target is None or target == 'sdist':
+            with tempfile.TemporaryDirectory() as _staging_path:
+                _stage_project(build_environment, feature_set, _staging_path)
+                _builder = SdistBuilder(_staging_path, config=_config)
+                for _artifact in _builder.build(directory=_output_path, versions=['standard']):
+                    print(f'[sdist]{os.linesep}{_artifact}{os.linesep}')
+        if target is None or target == 'wheel':
+            _builder = WheelBuilder(build_environment[PAR_PROJECT_ROOT], config=_config)
+            for _artifact in _builder.build(directory=_output_path, versions=['standard']):
+                print(f'[wheel]{os.linesep}{_artifact}{os.linesep}')
+    except Exception as _e:
+        raise RuntimeError(f'Build fehlgeschlagen: {_e}')
+
+
+def _stage_project(build_environment: dict, feature_set: str | None, staging_path: str):
+    """
+    Erzeugt eine Staging-Kopie des Projekts mit Hardlinks auf die Projektdateien und der
+    Konfigurationsdatei des Feature-Sets als pyproject.toml.
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :param staging_path: Verzeichnis für die Staging-Kopie
+    """
+    _project_root = build_environment[PAR_PROJECT_ROOT]
+    _cfg_file_path = _wheel_cfg_file_path(build_environment, feature_set)
+    for _entry in os.listdir(_project_root):
+        if _entry in STAGING_EXCLUDES or _entry == WHEEL_CFG_FILE_NAME:
+            continue
+        _entry_path = os.path.join(_project_root, _entry)
+        if os.path.isdir(_entry_path):
+            shutil.copytree(_entry_path, os.path.join(staging_path, _entry),
+                            ignore=shutil.ignore_patterns(*STAGING_EXCLUDES),
+                            copy_function=link_or_copy)
+        else:
+            link_or_copy(_entry_path, os.path.join(staging_path, _entry))
+    shutil.copy(_cfg_file_path, os.path.join(staging_path, WHEEL_CFG_FILE_NAME))
+
+
+def _wheel_cfg_file_path(build_environment: dict, feature_set: str | None) -> str:
+    """
+    :param build_environment: Build-Environment
+    :param feature_set: Name des Feature-Sets oder None
+    :return: Name und Pfad der hatchling-Konfigurationsdatei des Feature-Sets
+    :raises RuntimeError: falls die Konfigurationsdatei nicht existiert
+    """
+    if feature_set is None:
+        _cfg_file_path = os.path.join(build_environment[PAR_PROJECT_ROOT], WHEEL_CFG_FILE_NAME)
+    else:
+        _cfg_file_path = os.path.join(build_environment[PAR_PROJECT_ROOT], 'build', 'featuresets',
+                                      feature_set, 'wheel', WHEEL_CFG_FILE_NAME)
+    if not os.path.isfile(_cfg_file_path):
+        raise RuntimeError(f'Konfigurationsdatei {_cfg_file_path} nicht gefunden')
+    return _cfg_file_path
+
+
+def _hatchling_version() -> str:
+    """
+    :return: Version des installierten hatchling
+    """
+    try:
+        return importlib.metadata.version('hatchling')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'